@@ -0,0 +1,117 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import ast
+import json
+import time
+import zlib
+import random
+import threading
+from typing import Iterator, NamedTuple, Optional
+
+# Characters per token used to convert text length into simulated tokens
+CHARS_PER_TOKEN = 4
+
+_NUM_RECORDS = re.compile(r'Generate (\d+) records')
+_FORMAT = re.compile(r'^Fields: (.+)$', re.MULTILINE)
+
+
+class FakeMessage(NamedTuple):
+    '''Response or stream chunk shaped like a LangChain message'''
+    content: str
+    usage_metadata: Optional[dict] = None
+
+
+class InjectedFailure(Exception):
+    '''Error raised by FakeChatModel when a failure is injected'''
+
+
+class FakeChatModel:
+    '''Deterministic stand-in for ChatGoogleGenerativeAI. Responses are built from
+    the record count and schema in the prompt, so identical prompts always get
+    identical records. Each call waits latency seconds plus the time to emit its
+    tokens at tokens_per_second. failure_rate of calls raise failure_error, and
+    truncate_rate of calls return output cut off mid-record'''
+
+    def __init__(self, latency:float = 0.05, tokens_per_second:float = 20000.0,
+                 failure_rate:float = 0.0, truncate_rate:float = 0.0,
+                 failure_error:str = 'Injected failure', chunk_tokens:int = 32, seed:int = 0):
+        if tokens_per_second <= 0:
+            raise ValueError("Token rate must be positive")
+
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.truncate_rate = truncate_rate
+        self.failure_error = failure_error
+        self.chunk_tokens = chunk_tokens
+        self.seed = seed
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _next_call(self) -> random.Random:
+        '''Counts a call and returns the random source for its fault injection'''
+        with self._lock:
+            self.calls += 1
+            return random.Random(self.seed * 1_000_003 + self.calls)
+
+    def _content(self, prompt:str, faults:random.Random) -> str:
+        '''Builds the response text for a prompt, raising or truncating as configured'''
+        if faults.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            time.sleep(self.latency)
+            raise InjectedFailure(self.failure_error)
+
+        num_match = _NUM_RECORDS.search(prompt)
+        format_match = _FORMAT.search(prompt)
+        num_records = int(num_match.group(1)) if num_match else 1
+        fields = list(ast.literal_eval(format_match.group(1))) if format_match else ['value']
+
+        rng = random.Random(zlib.crc32(prompt.encode('utf-8')) ^ self.seed)
+        lines = []
+        for i in range(num_records):
+            record = {field: f"{field}-{rng.randrange(1_000_000)}" if j % 2 == 0 else rng.randrange(1_000_000)
+                      for j, field in enumerate(fields)}
+            lines.append(json.dumps(record))
+        content = '\n'.join(lines)
+
+        if faults.random() < self.truncate_rate:
+            content = content[:len(content) * 3 // 4]
+
+        return content
+
+    def _usage(self, prompt:str, content:str) -> dict:
+        input_tokens = len(prompt) // CHARS_PER_TOKEN
+        output_tokens = len(content) // CHARS_PER_TOKEN
+        return {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                'total_tokens': input_tokens + output_tokens}
+
+    def invoke(self, prompt:str) -> FakeMessage:
+        '''Returns the whole response after the simulated generation time'''
+        content = self._content(prompt, self._next_call())
+        time.sleep(self.latency + len(content) / CHARS_PER_TOKEN / self.tokens_per_second)
+        return FakeMessage(content, self._usage(prompt, content))
+
+    def stream(self, prompt:str) -> Iterator[FakeMessage]:
+        '''Yields the response in chunks of chunk_tokens at the simulated token rate'''
+        content = self._content(prompt, self._next_call())
+        time.sleep(self.latency)
+
+        step = self.chunk_tokens * CHARS_PER_TOKEN
+        for start in range(0, len(content), step):
+            time.sleep(self.chunk_tokens / self.tokens_per_second)
+            yield FakeMessage(content[start:start + step])
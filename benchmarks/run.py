@@ -0,0 +1,402 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Measures throughput, time to first row and peak memory of the generation
+pipeline against FakeChatModel, with no network access.
+
+    python benchmarks/run.py --quick -o results.json
+    python benchmarks/run.py -o new.json --baseline results.json
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from functools import partial
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# Measure the generation path itself, not the Gemini quota or the disk cache
+os.environ['GEMINI_REQUESTS_PER_MINUTE'] = '1000000000'
+os.environ['GEMINI_TOKENS_PER_MINUTE'] = '1000000000000'
+os.environ.pop('DATA_GENERATOR_CACHE_DIR', None)
+
+import utils
+from inference.engine import generate_records, stream_dataset
+from inference.generator import format_user_input, generate_data_sample, stream_data_sample
+from inference.parser import iter_records, parse_records
+from inference.store import RecordStore
+from fake_llm import FakeChatModel
+
+PRESETS = {
+    'quick': {
+        'format_sizes': [10, 100],
+        'format_repeat': 200,
+        'records': 200,
+        'batch_sizes': [50],
+        'concurrency': [1, 4],
+        'rows': 10_000,
+        'import_repeat': 3,
+    },
+    'full': {
+        'format_sizes': [10, 100, 1000],
+        'format_repeat': 1000,
+        'records': 2000,
+        'batch_sizes': [25, 50, 100],
+        'concurrency': [1, 4, 8],
+        'rows': 200_000,
+        'import_repeat': 10,
+    },
+}
+
+SCENARIOS = ('format', 'generation', 'failures', 'parsing', 'writers', 'results', 'startup')
+
+# Entry points whose cold import time is tracked. None of them should load
+# LangChain or the Google SDK before the first generation
+STARTUP_MODULES = ('inference.generator', 'inference.batch', 'inference.cli')
+HEAVY_MODULES = ('langchain_google_genai', 'langchain_core', 'google.generativeai')
+
+# Metrics where a larger value is better; every other metric is a cost
+HIGHER_IS_BETTER = {'rows_per_second', 'calls_per_second', 'megabytes_per_second'}
+
+SCHEMA_FIELDS = [
+    {'col1': 'customer_id', 'col2': 'unique id like CUST-0001'},
+    {'col1': 'name', 'col2': 'full name'},
+    {'col1': 'email', 'col2': 'email address'},
+    {'col1': 'age', 'col2': 'integer 18-90'},
+    {'col1': 'city', 'col2': 'US city'},
+    {'col1': 'signup_date', 'col2': 'date in 2024'},
+    {'col1': 'plan', 'col2': 'free, pro or team'},
+    {'col1': 'balance', 'col2': 'float 0-1000'},
+]
+
+
+def _measure(fn:Callable, memory:bool) -> tuple:
+    '''Runs fn for timing, then again under tracemalloc for its peak memory so
+    tracing does not skew the timing'''
+    start = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return value, seconds, peak
+
+
+def _result(scenario:str, params:dict, seconds:float, peak:Optional[int], **metrics) -> dict:
+    metrics = {'seconds': round(seconds, 6), **{k: round(v, 6) for k, v in metrics.items()}}
+    if peak is not None:
+        metrics['peak_memory_bytes'] = peak
+    return {'scenario': scenario, 'params': params, 'metrics': metrics}
+
+
+def _sample_records(count:int) -> list[dict]:
+    '''Returns deterministic records shaped like generated output'''
+    fields = [field['col1'] for field in SCHEMA_FIELDS]
+    return [{field: f"{field}-{i}" if j % 2 == 0 else i * (j + 1) for j, field in enumerate(fields)}
+            for i in range(count)]
+
+
+def bench_format(sizes:list[int], repeat:int, memory:bool) -> list[dict]:
+    '''Times format_user_input on schemas of increasing width'''
+    results = []
+    for size in sizes:
+        fields = [{'col1': f"field_{i}", 'col2': f"description of field {i}"} for i in range(size)]
+
+        def run():
+            for _ in range(repeat):
+                format_user_input(fields)
+
+        _, seconds, peak = _measure(run, memory)
+        results.append(_result('format_user_input', {'fields': size, 'repeat': repeat}, seconds, peak,
+                               calls_per_second=repeat / seconds))
+    return results
+
+
+def bench_generation(num_records:int, batch_sizes:list[int], concurrency:list[int], llm_options:dict,
+                     memory:bool, scenario:str = 'generation') -> list[dict]:
+    '''Times batched and streamed generation for each batch size and
+    concurrency level'''
+    schema = format_user_input(SCHEMA_FIELDS)
+    results = []
+
+    for batch_size in batch_sizes:
+        for workers in concurrency:
+            params = {'records': num_records, 'batch_size': batch_size, 'concurrency': workers, **llm_options}
+
+            # Each pass gets a fresh model so fault injection repeats exactly
+            models = []
+
+            def run_batch():
+                models.append(FakeChatModel(**llm_options))
+                return generate_records(num_records, schema, batch_size=batch_size, max_workers=workers,
+                                        retry_delay=0, generate_fn=partial(generate_data_sample, llm=models[-1]))
+
+            records, seconds, peak = _measure(run_batch, memory)
+            results.append(_result(scenario, {**params, 'path': 'batch'}, seconds, peak,
+                                   rows_per_second=len(records) / seconds, model_calls=models[0].calls,
+                                   injected_failures=models[0].failures))
+
+            models = []
+            first_row = []
+
+            def run_stream():
+                models.append(FakeChatModel(**llm_options))
+                stream_fn = partial(stream_data_sample, llm=models[-1])
+                start = time.perf_counter()
+                count = 0
+                for _ in stream_dataset(num_records, schema, batch_size=batch_size, max_workers=workers,
+                                        retry_delay=0, stream_fn=stream_fn):
+                    if count == 0:
+                        first_row.append(time.perf_counter() - start)
+                    count += 1
+                return count
+
+            count, seconds, peak = _measure(run_stream, memory)
+            results.append(_result(scenario, {**params, 'path': 'stream'}, seconds, peak,
+                                   rows_per_second=count / seconds, time_to_first_row=first_row[0],
+                                   model_calls=models[0].calls, injected_failures=models[0].failures))
+    return results
+
+
+def bench_parsing(rows:int, memory:bool) -> list[dict]:
+    '''Times record parsing of a whole response and of a chunked stream'''
+    content = '\n'.join(json.dumps(record) for record in _sample_records(rows))
+    fields = [field['col1'] for field in SCHEMA_FIELDS]
+    megabytes = len(content.encode('utf-8')) / 1_000_000
+    chunks = [content[i:i + 128] for i in range(0, len(content), 128)]
+
+    results = []
+    for name, run in (('whole', lambda: parse_records(content, fields).records),
+                      ('chunked', lambda: list(iter_records(chunks, fields)))):
+        records, seconds, peak = _measure(run, memory)
+        results.append(_result('parsing', {'rows': rows, 'input': name}, seconds, peak,
+                               rows_per_second=len(records) / seconds, megabytes_per_second=megabytes / seconds))
+    return results
+
+
+def bench_writers(rows:int, memory:bool) -> list[dict]:
+    '''Times every registered output format, skipping formats whose optional
+    dependency is missing'''
+    records = _sample_records(rows)
+    directory = tempfile.mkdtemp(prefix='data-generator-bench-')
+    results = []
+
+    try:
+        for fmt in sorted(utils.RECORD_WRITERS):
+            path = os.path.join(directory, f"output.{fmt}")
+            try:
+                count, seconds, peak = _measure(lambda: utils.write_records(iter(records), path, fmt), memory)
+            except ValueError as e:
+                print(f"Skipping {fmt} writer: {e}", file=sys.stderr)
+                continue
+
+            results.append(_result('writer', {'rows': rows, 'format': fmt}, seconds, peak,
+                                   rows_per_second=count / seconds, output_bytes=os.path.getsize(path)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def _retained(fn:Callable) -> tuple:
+    '''Returns fn's result and the memory still allocated once it returns'''
+    tracemalloc.start()
+    try:
+        value = fn()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, current
+
+
+def bench_results(rows:int) -> list[dict]:
+    '''Compares the memory a session holds for a result as record dicts, as
+    one NDJSON string and as a RecordStore, for values that are all distinct
+    and for values repeated the way categorical fields are'''
+    results = []
+
+    for values in ('distinct', 'repeated'):
+        if values == 'distinct':
+            records = _sample_records(rows)
+        else:
+            categories = _sample_records(50)
+            records = [categories[i % 50] for i in range(rows)]
+
+        ndjson, ndjson_bytes = _retained(lambda: '\n'.join(json.dumps(record) for record in records))
+        # Records parsed from model output hold their own value objects
+        _, records_bytes = _retained(lambda: [json.loads(line) for line in ndjson.splitlines()])
+        store, store_bytes = _retained(lambda: RecordStore.from_records(records))
+
+        start = time.perf_counter()
+        for _ in store.iter_chunks():
+            pass
+        seconds = time.perf_counter() - start
+        results.append(_result('session_result', {'rows': rows, 'values': values}, seconds, None,
+                               records_bytes=records_bytes, ndjson_bytes=ndjson_bytes, store_bytes=store_bytes,
+                               download_rows_per_second=rows / seconds))
+    return results
+
+
+def bench_startup(repeat:int) -> list[dict]:
+    '''Times a cold import of each entry point in a new interpreter, keeping
+    the fastest of repeat runs'''
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    results = []
+
+    for module in STARTUP_MODULES:
+        code = (f"import sys, time, json; start = time.perf_counter(); import {module}; "
+                f"print(json.dumps([time.perf_counter() - start, len(sys.modules), "
+                f"sum(name in sys.modules for name in {HEAVY_MODULES!r})]))")
+        runs = [json.loads(subprocess.run([sys.executable, '-c', code], cwd=src, capture_output=True, text=True,
+                                          check=True).stdout) for _ in range(repeat)]
+        seconds, modules, heavy = min(runs)
+        results.append(_result('startup', {'module': module}, seconds, None, modules_loaded=modules,
+                               heavy_modules_loaded=heavy))
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(preset:str = 'full', memory:bool = True, llm_options:Optional[dict] = None,
+                   scenarios:Optional[list[str]] = None) -> dict:
+    '''Runs the selected scenarios and returns the report'''
+    config = PRESETS[preset]
+    llm_options = llm_options or {}
+    scenarios = scenarios or list(SCENARIOS)
+    results = []
+
+    if 'format' in scenarios:
+        results += bench_format(config['format_sizes'], config['format_repeat'], memory)
+    if 'generation' in scenarios:
+        results += bench_generation(config['records'], config['batch_sizes'], config['concurrency'],
+                                    llm_options, memory)
+    if 'failures' in scenarios:
+        failure_options = {'failure_rate': 0.2, 'truncate_rate': 0.2, **llm_options}
+        results += bench_generation(config['records'], config['batch_sizes'][-1:], config['concurrency'][-1:],
+                                    failure_options, memory, scenario='generation_with_failures')
+    if 'parsing' in scenarios:
+        results += bench_parsing(config['rows'], memory)
+    if 'writers' in scenarios:
+        results += bench_writers(config['rows'], memory)
+    if 'results' in scenarios:
+        results += bench_results(config['rows'])
+    if 'startup' in scenarios:
+        results += bench_startup(config['import_repeat'])
+
+    return {
+        'metadata': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'preset': preset,
+            'memory': memory,
+            'llm': llm_options,
+        },
+        'results': results,
+    }
+
+
+def compare(report:dict, baseline:dict, threshold:float) -> list[str]:
+    '''Returns a line for each metric that got worse than the baseline by more
+    than threshold (a fraction)'''
+    def key(result):
+        return result['scenario'], json.dumps(result['params'], sort_keys=True)
+
+    previous = {key(result): result['metrics'] for result in baseline['results']}
+    regressions = []
+
+    for result in report['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+
+        for metric, value in result['metrics'].items():
+            before = old.get(metric)
+            if not before or metric in ('model_calls', 'injected_failures'):
+                continue
+
+            change = (value - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append(f"{result['scenario']} {result['params']}: {metric} {before} -> {value} "
+                                   f"({change:+.1%})")
+
+    return regressions
+
+
+def main(argv:Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the data generator against a local fake model')
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--quick', action='store_true', help='Run the small preset')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Scenario to run, may be repeated (default: all)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory pass')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake model latency per call in seconds')
+    parser.add_argument('--token-rate', type=float, default=20000.0, help='Fake model tokens per second')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of fake model calls that fail')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change reported as a regression (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    llm_options = {'latency': args.latency, 'tokens_per_second': args.token_rate}
+    if args.failure_rate:
+        llm_options['failure_rate'] = args.failure_rate
+
+    report = run_benchmarks('quick' if args.quick else 'full', not args.no_memory, llm_options, args.scenario)
+    text = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if not regressions:
+            print("No regressions against baseline", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
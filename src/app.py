@@ -12,16 +12,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import time
+import hashlib
 import streamlit as st
 import utils
+from functools import partial
+from typing import Optional
 
 import inference.generator as ig
+import inference.engine as ie
+import inference.result_cache as rc
+import inference.backends as ib
+import inference.parser as ip
+import inference.compiler as icomp
+import inference.hybrid as ih
+import inference.scheduler as isch
+import inference.metrics as im
+import inference.jobs as ij
+import inference.workers as iw
 
 st.set_page_config(
     page_title="Data Generator",
     layout="wide"
 )
 
+# Time between refreshes of a generation running in the background
+POLL_INTERVAL_SECONDS = 0.5
+
+# Records shown per page of the results table
+PREVIEW_PAGE_ROWS = 500
+
+GENERATION_MODES = {
+    "Model": "model",
+    "Fast (bulk)": "compiled",
+    "Hybrid (pool)": "hybrid",
+}
+
 def render_header():
     '''Manages the streamlit app title and description'''
 
@@ -35,7 +62,7 @@ def render_num_record_input() -> int:
         col1, col2, col3 = st.columns([2, 2, 1])
 
         with col1:
-            num_records = st.number_input("Enter number of records to generate:", min_value=1, max_value=100, step=1)
+            num_records = st.number_input("Enter number of records to generate:", min_value=1, max_value=ie.MAX_TOTAL_RECORDS, step=1)
 
     return num_records
 
@@ -44,7 +71,9 @@ def render_clear_data_button():
 
     # Clear all data button
     if st.button("Clear All Data", type="secondary"):
-        st.session_state.table_data = [{'col1': '', 'col2': ''}]
+        st.session_state.field_rows = [{'col1': '', 'col2': '', 'unique': False}]
+        # A new editor key discards the edits made to the old table
+        st.session_state.field_editor_version += 1
         st.rerun()
 
 def render_action_buttons() -> tuple[bool, bool]:
@@ -62,93 +91,414 @@ def render_action_buttons() -> tuple[bool, bool]:
 
     return submit, download
 
+def render_mode_select() -> str:
+    '''Manages the choice between calling the model for every record, the
+    fast bulk mode that compiles the schema once and samples locally, and the
+    hybrid mode that recombines a pool of model-written values'''
+
+    label = st.radio("Generation mode", list(GENERATION_MODES), horizontal=True,
+                     help="Fast (bulk) asks the model once for a generator spec, then creates records locally. "
+                          "Hybrid (pool) asks the model for a pool of example records, then recombines their values")
+
+    return GENERATION_MODES[label]
+
+def render_stream_toggle() -> bool:
+    '''Manages the checkbox that switches generation to streaming mode'''
+
+    return st.checkbox("Stream results", help="Show records in a live table as they are generated")
+
+def get_field_list_hash(fields:list[dict]) -> str:
+    '''Returns a hash of the field definitions'''
+
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
 def get_formatted_schema():
-    '''Returns a formatted schema based on the streamlit field and value definitions'''
+    '''Returns a formatted schema based on the streamlit field and value
+    definitions. The result is kept with a hash of the fields, so it is only
+    formatted again once they change'''
 
-    try:
-        return ig.format_user_input(st.session_state.table_data)
-    except ValueError as e:
-        st.error(e)
+    digest = get_field_list_hash(st.session_state.table_data)
+    formatted = st.session_state.get('formatted_schema')
+
+    if not formatted or formatted['hash'] != digest:
+        try:
+            formatted = {'hash': digest, 'schema': ig.format_user_input(st.session_state.table_data), 'error': None}
+        except ValueError as e:
+            formatted = {'hash': digest, 'schema': None, 'error': e}
+        st.session_state.formatted_schema = formatted
+
+    if formatted['error']:
+        st.error(formatted['error'])
+    return formatted['schema']
+
+@st.cache_resource
+def get_llm_client():
+    '''Returns the model shared by all sessions and reruns: the Gemini client,
+    or a router over the backends in DATA_GENERATOR_BACKENDS'''
+
+    return ib.get_default_llm()
+
+@st.cache_resource
+def get_worker_pool():
+    '''Returns the background worker pool shared by all sessions and reruns'''
+
+    return iw.WorkerPool(iw.DEFAULT_WORKERS)
+
+def iter_model_records(num_records:int, formatted_schema:str, llm, unique_fields:Optional[list[str]] = None,
+                       stream:bool = False):
+    '''Yields records from the batched generation engine. Streaming yields
+    records as each response arrives; otherwise each batch arrives whole'''
 
-def render_data_box(submit:bool, num_records:int):
-    '''Calls the data sample generator and prints it to a streamlit container'''
+    if stream:
+        stream_fn = partial(ig.stream_data_sample, llm=llm, priority=isch.PRIORITY_INTERACTIVE)
+        yield from ie.stream_dataset(num_records, formatted_schema, stream_fn=stream_fn, unique_fields=unique_fields)
+        return
+
+    generate_fn = partial(ig.generate_data_sample, llm=llm, priority=isch.PRIORITY_INTERACTIVE)
+    batches = ie.generate_batches(num_records, formatted_schema, generate_fn=generate_fn, unique_fields=unique_fields)
+    try:
+        for _, records in batches:
+            yield from records
+    finally:
+        batches.close()
+
+@st.cache_data(show_spinner=False)
+def get_compiled_spec(formatted_schema:str) -> dict:
+    '''Returns the generator spec for a schema, compiling it on first use'''
+
+    return icomp.compile_schema(formatted_schema)
+
+def iter_compiled_generation(num_records:int, formatted_schema:str, unique_fields:Optional[list[str]] = None):
+    '''Compiles the schema and yields records sampled from its spec. Runs on
+    the worker pool, so a spec the model gets wrong fails the task and is
+    reported like any other generation error'''
+
+    spec = get_compiled_spec(formatted_schema)
+    yield from icomp.iter_compiled_records(spec, num_records, unique_fields=unique_fields)
+
+@st.cache_resource
+def get_shared_result_cache():
+    '''Returns the result cache shared by all sessions, or None when sharing is disabled'''
+
+    if rc.SHARED_CACHE_SIZE < 1:
+        return None
+
+    return rc.ResultCache(max_entries=rc.SHARED_CACHE_SIZE, ttl_seconds=rc.SHARED_CACHE_TTL_SECONDS)
+
+def submit_generation(key, num_records:int, formatted_schema:str, mode:str, stream:bool,
+                      unique_fields:Optional[list[str]] = None):
+    '''Queues a generation on the worker pool, replacing any earlier one this
+    session is still waiting on. Sessions asking for the same normalized key
+    share one generation, each getting the records under its own field names'''
+
+    pool = get_worker_pool()
+    fields = ip.schema_fields(formatted_schema)
+    task = st.session_state.get('task')
+    if task:
+        if task['key'] == key:
+            task['fields'] = fields
+            return
+        pool.release(task['id'])
+
+    if mode == 'compiled':
+        make_records = partial(iter_compiled_generation, num_records, formatted_schema, unique_fields)
+    elif mode == 'hybrid':
+        generate_fn = partial(ig.generate_data_sample, llm=get_llm_client(), priority=isch.PRIORITY_INTERACTIVE)
+        make_records = partial(ih.iter_hybrid_dataset, formatted_schema, num_records, unique_fields=unique_fields,
+                               generate_fn=generate_fn)
+    else:
+        make_records = partial(iter_model_records, num_records, formatted_schema, get_llm_client(), unique_fields, stream)
+
+    task_id = pool.submit(make_records, num_records, key=key)
+    st.session_state.task = {'id': task_id, 'key': key, 'fields': fields}
+
+def as_fields(generated:dict, fields:list[str]):
+    '''Returns a generated record store under the given field names. A result
+    shared from a near-duplicate schema is renamed without copying it'''
+
+    mapping = rc.map_fields(generated['store'].fields, fields)
+    if mapping:
+        generated['store'] = generated['store'].renamed(mapping)
+    return generated['store']
+
+def get_or_generate(num_records:int, formatted_schema:str, mode:str = 'model', stream:bool = False):
+    '''Returns the record store generated for the schema and record count,
+    reusing the session result or the shared cache. Otherwise queues a
+    generation in the background and returns None; collect_generation picks
+    up its result'''
+
+    if not formatted_schema:
+        return None
+
+    unique_fields = ig.get_unique_fields(st.session_state.table_data)
+    key = rc.make_cache_key(formatted_schema, num_records, mode=mode, unique_fields=unique_fields)
+    st.session_state.requested = key
+
+    # Results for a near-duplicate schema are renamed to this schema's fields
+    fields = ip.schema_fields(formatted_schema)
+    generated = st.session_state.get('generated')
+    if generated and generated['key'] == key:
+        return as_fields(generated, fields)
+
+    shared_cache = get_shared_result_cache()
+    store = shared_cache.get(key) if shared_cache else None
+    if store is not None:
+        st.session_state.generated = {'key': key, 'store': store}
+        return as_fields(st.session_state.generated, fields)
+
+    submit_generation(key, num_records, formatted_schema, mode, stream, unique_fields)
+    return None
+
+def collect_generation() -> Optional[dict]:
+    '''Polls this session's background generation. The records stay in the
+    task's store on the worker pool, which every session sharing the task
+    reads. A finished generation's store becomes the session result and the
+    task is released. Returns the task while it is still running'''
+
+    task = st.session_state.get('task')
+    if not task:
+        return None
+
+    pool = get_worker_pool()
+    try:
+        worker_task = pool.get(task['id'])
+    except ValueError:
+        # Pruned from the pool after the session went quiet
+        del st.session_state.task
+        return None
+
+    status = worker_task.status
+    task.update(status=status, completed=len(worker_task.records), total=worker_task.total,
+                store=worker_task.records)
+
+    if status not in iw.FINISHED_STATUSES:
+        return task
+
+    pool.release(task['id'])
+    del st.session_state.task
+
+    if status == 'failed':
+        st.error(f"Generation failed: {worker_task.error}")
+    elif status == 'cancelled':
+        st.info(f"Generation cancelled after {task['completed']} records")
+    elif status == 'completed':
+        st.session_state.generated = {'key': task['key'], 'store': worker_task.records}
+        as_fields(st.session_state.generated, task['fields'])
+        shared_cache = get_shared_result_cache()
+        if shared_cache:
+            shared_cache.put(task['key'], worker_task.records)
+    return None
+
+def render_preview(store, fields:Optional[list[str]] = None):
+    '''Shows one page of a record store. Only the rows on the page are
+    decoded, and the table itself only draws the rows in view'''
+
+    pages = max(1, -(-len(store) // PREVIEW_PAGE_ROWS))
+    page = 1
+    if pages > 1:
+        # A new result may have fewer pages than the one last shown
+        if st.session_state.get('preview_page', 1) > pages:
+            st.session_state.preview_page = pages
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                               key="preview_page")
+
+    start = (page - 1) * PREVIEW_PAGE_ROWS
+    records = store.rows(start, start + PREVIEW_PAGE_ROWS)
+    if fields:
+        records = rc.remap_records(records, fields)
+    st.dataframe(records)
+    st.caption(f"Records {start + 1 if records else 0}-{start + len(records)} of {len(store)}")
+
+def render_data_box(submit:bool, num_records:int, stream:bool = False, mode:str = 'model'):
+    '''Queues the data sample generator and shows its progress, partial
+    results and finally the generated data in a streamlit container'''
 
     with st.container():
         if submit:
-            try:
-                formatted_schema = get_formatted_schema()
-            except ValueError as e:
-                st.error(e)
-
-            st.code(ig.generate_data_sample(num_records, formatted_schema))
+            get_or_generate(num_records, get_formatted_schema(), mode, stream)
+
+        task = collect_generation()
+        if task:
+            st.progress(task['completed'] / task['total'],
+                        text=f"Generated {task['completed']} of {task['total']} records")
+            if st.button("Cancel", key="cancel_generation") and not get_worker_pool().cancel(task['id']):
+                # Other sessions share the generation, so only this one stops waiting
+                del st.session_state.task
+                st.info("Stopped waiting for a generation shared with other sessions")
+                return
+            if task['completed']:
+                render_preview(task['store'], task['fields'])
+            return
+
+        generated = st.session_state.get('generated')
+        if not generated or generated['key'] != st.session_state.get('requested'):
+            return
+
+        render_preview(generated['store'])
 
 def render_field_list():
-    '''Manages the dynamic creation of the field list'''
-
-    # Initialize session state for table data
-    if 'table_data' not in st.session_state:
-        st.session_state.table_data = [{'col1': '', 'col2': ''}]
-    
-    # Create containers for the table
-    
+    '''Manages the editable table of fields. Edits are applied by the table
+    itself, so adding or deleting rows does not rebuild a widget per row'''
+
+    # The editor's input stays fixed between reruns; its edits live in widget state
+    if 'field_rows' not in st.session_state:
+        st.session_state.field_rows = [{'col1': '', 'col2': '', 'unique': False}]
+        st.session_state.field_editor_version = 0
+
     with st.container():
-        # Create column headers
-        col1, col2, col3 = st.columns([2, 2, 1])
+        rows = st.data_editor(
+            st.session_state.field_rows,
+            key=f"field_editor_{st.session_state.field_editor_version}",
+            num_rows="dynamic",
+            column_config={
+                'col1': st.column_config.TextColumn("Field Name"),
+                'col2': st.column_config.TextColumn("Value Description", width="large"),
+                'unique': st.column_config.CheckboxColumn(
+                    "Unique", help="Never repeat a value of this field across the generated records"),
+            },
+        )
+
+    # Rows added in the editor start out as None; blank rows are ignored
+    st.session_state.table_data = [
+        {'col1': row.get('col1') or '', 'col2': row.get('col2') or '', 'unique': bool(row.get('unique'))}
+        for row in rows if row.get('col1') or row.get('col2')
+    ]
+
+@st.cache_resource
+def start_metrics_server():
+    '''Serves Prometheus metrics once per process when DATA_GENERATOR_METRICS_PORT is set'''
+
+    if im.METRICS_PORT < 1:
+        return None
+
+    return im.start_http_server(im.METRICS_PORT)
+
+def render_metrics_panel():
+    '''Manages the optional sidebar panel showing generation stats for this process'''
+
+    with st.sidebar:
+        if not st.checkbox("Show live stats"):
+            return
+
+        stats = im.snapshot()
+        col1, col2 = st.columns(2)
 
         with col1:
-            st.write("**Field Name**")
+            st.metric("Records", f"{stats['records']:,.0f}")
+            st.metric("Input tokens", f"{stats['input_tokens']:,.0f}")
+            st.metric("Cache hits", f"{stats['cache_hits']:,.0f}")
+            st.metric("Queued requests", f"{stats['queue_depth']:,.0f}")
+
         with col2:
-            st.write("**Value Description**")
-        with col3:
-            st.write("**Actions**")
-        
-        # Display each row
-        for i, row in enumerate(st.session_state.table_data):
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
+            st.metric("Model requests", f"{stats['requests']:,.0f}")
+            st.metric("Output tokens", f"{stats['output_tokens']:,.0f}")
+            st.metric("Retries", f"{stats['retries']:,.0f}")
+
+        if stats['stages']:
+            st.dataframe([{'Stage': stage, 'Count': summary['count'], 'Mean (s)': round(summary['mean'], 4),
+                           'Total (s)': round(summary['sum'], 3)}
+                          for stage, summary in stats['stages'].items()], hide_index=True)
+
+def resume_job(job:dict, store):
+    '''Queues a job's resume on the worker pool and remembers it for this session'''
+
+    generate_fn = partial(ig.generate_data_sample, llm=get_llm_client())
+    task_id = get_worker_pool().submit_call(
+        lambda on_progress: ij.run_job(job['id'], store, progress_callback=on_progress, generate_fn=generate_fn),
+        job['num_records'])
+    st.session_state.job_tasks[job['id']] = task_id
+
+def collect_job_tasks() -> dict:
+    '''Polls the job resumes this session queued on the worker pool. Finished
+    resumes are released, showing any failure. Returns the progress of the
+    ones still running by job ID'''
+
+    if 'job_tasks' not in st.session_state:
+        st.session_state.job_tasks = {}
+
+    pool = get_worker_pool()
+    running = {}
+    for job_id, task_id in list(st.session_state.job_tasks.items()):
+        try:
+            state = pool.poll(task_id)
+        except ValueError:
+            # Pruned from the pool after the session went quiet
+            del st.session_state.job_tasks[job_id]
+            continue
+
+        if state['status'] not in iw.FINISHED_STATUSES:
+            running[job_id] = state
+            continue
+
+        pool.release(task_id)
+        del st.session_state.job_tasks[job_id]
+        if state['status'] == 'failed':
+            st.error(f"Job {job_id} failed: {state['error']}")
+    return running
+
+def render_jobs_panel():
+    '''Manages the optional sidebar panel listing resumable generation jobs
+    started from the command line or the app. Resumed jobs run on the worker
+    pool and their progress is polled like a generation'''
+
+    with st.sidebar:
+        running = collect_job_tasks()
+        if not st.checkbox("Show jobs"):
+            return
+
+        store = ij.get_job_store()
+        job_list = store.list()
+        if not job_list:
+            st.caption("No jobs yet. Start one with: python -m inference generate --job")
+            return
+
+        for job in job_list:
+            st.markdown(f"**{job['id']}** · {job['status']}  \n"
+                        f"{job['committed_records']:,} of {job['num_records']:,} records → `{job['output_path']}`")
+            col1, col2 = st.columns(2)
+
             with col1:
-                # Input for column 1
-                st.session_state.table_data[i]['col1'] = st.text_input(
-                    f"Row {i+1} Col 1", 
-                    value=row['col1'], 
-                    key=f"col1_{i}",
-                    label_visibility="collapsed"
-                )
-            
+                state = running.get(job['id'])
+                if state:
+                    st.progress(state['completed'] / state['total'],
+                                text=f"Generated {state['completed']} of {state['total']} records")
+                elif job['status'] in ij.RESUMABLE_STATUSES and st.button("Resume", key=f"resume_{job['id']}"):
+                    resume_job(job, store)
+                    st.rerun()
+
             with col2:
-                # Input for column 2
-                st.session_state.table_data[i]['col2'] = st.text_input(
-                    f"Row {i+1} Col 2", 
-                    value=row['col2'], 
-                    key=f"col2_{i}",
-                    label_visibility="collapsed"
-                )
-            
-            with col3:
-                # Action buttons container
-                button_col1, button_col2 = st.columns(2)
-                
-                with button_col1:
-                    # Add button (using + symbol)
-                    if st.button("➕", key=f"add_{i}", help="Add new row"):
-                        st.session_state.table_data.insert(i + 1, {'col1': '', 'col2': ''})
-                        st.rerun()
-                
-                with button_col2:
-                    # Delete button (using - symbol) - only show if more than 1 row
-                    if len(st.session_state.table_data) > 1:
-                        if st.button("🗑️", key=f"delete_{i}", help="Delete this row"):
-                            st.session_state.table_data.pop(i)
-                            st.rerun()
-
-def on_download(download:bool, num_records:int, formatted_schema:str):
+                if job['status'] not in ('completed', 'cancelled') and st.button("Cancel", key=f"cancel_{job['id']}"):
+                    store.cancel(job['id'])
+                    st.rerun()
+
+def on_download(download:bool, num_records:int, mode:str = 'model'):
     '''Manages the Download button action to write the generated data sample
-    to the local Downloads directory'''
+    to the local Downloads directory, once it has been generated'''
 
     if download:
-        utils.write_string_to_downloads(ig.generate_data_sample(num_records, formatted_schema))
+        store = get_or_generate(num_records, get_formatted_schema(), mode=mode)
+        if store is None:
+            st.session_state.download = st.session_state.get('requested')
+        else:
+            utils.write_string_to_downloads(store.iter_chunks())
+
+    generated = st.session_state.get('generated')
+    if generated and st.session_state.get('download') == generated['key']:
+        del st.session_state.download
+        utils.write_string_to_downloads(generated['store'].iter_chunks())
+
+def poll_generation():
+    '''Reruns the script while a background generation or job resume is in
+    progress so its progress keeps updating. Any interaction interrupts the
+    wait harmlessly, since the work itself runs on the worker pool'''
+
+    if st.session_state.get('task') or st.session_state.get('job_tasks'):
+        time.sleep(POLL_INTERVAL_SECONDS)
+        st.rerun()
 
 def main():
+    start_metrics_server()
+
     render_header()
 
     render_field_list()
@@ -159,9 +509,20 @@ def main():
 
     submit, download = render_action_buttons()
 
-    render_data_box(submit, num_records)
+    mode = render_mode_select()
+
+    stream = render_stream_toggle()
+
+    render_data_box(submit, num_records, stream, mode)
+
+    on_download(download, num_records, mode)
+
+    render_jobs_panel()
+
+    # Rendered last so the stats include this run
+    render_metrics_panel()
 
-    on_download(download, num_records, get_formatted_schema())
+    poll_generation()
 
 
 if __name__ == "__main__":
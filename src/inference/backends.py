@@ -0,0 +1,420 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Iterator, NamedTuple, Optional
+
+from inference.clients import DEFAULT_MODEL, DEFAULT_TEMPERATURE, get_client
+from inference.scheduler import is_rate_limit_error
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Comma separated backends to route between. Gemini alone keeps the direct client
+BACKENDS = [name.strip() for name in os.getenv("DATA_GENERATOR_BACKENDS", "gemini").split(',') if name.strip()]
+
+# "latency" sends each request to the fastest healthy backend, "price" to the cheapest
+ROUTING = os.getenv("DATA_GENERATOR_ROUTING", "latency")
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Ollama, vLLM and llama.cpp all serve the OpenAI chat completions API
+LOCAL_MODEL_BASE_URL = os.getenv("LOCAL_MODEL_BASE_URL", "http://localhost:11434/v1")
+LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME", "llama3.1")
+
+# USD per million output tokens, used by price routing
+DEFAULT_PRICES = {'gemini': 2.50, 'openai': 0.60, 'local': 0.0, 'stub': 0.0}
+
+DEFAULT_TIMEOUT_SECONDS = 120.0
+DEFAULT_MAX_CONCURRENCY = 8
+
+# How long a backend is skipped after it throttles or fails
+SATURATED_COOLDOWN_SECONDS = 30.0
+DOWN_COOLDOWN_SECONDS = 60.0
+
+# Weight of the newest request in a backend's latency average
+LATENCY_SMOOTHING = 0.3
+
+_PROMPT_PATTERN = re.compile(r'Generate (\d+) records.*?\nFields: (.*?)\n', re.DOTALL)
+_SEED_PATTERN = re.compile(r'^Variation: (\d+)$', re.MULTILINE)
+
+
+class Message(NamedTuple):
+    '''A response, or a streamed part of one, in the shape of a LangChain message'''
+    content: str
+    usage_metadata: Optional[dict] = None
+
+
+class Backend(ABC):
+    '''A model that turns a prompt into text. Backends are used wherever a
+    LangChain chat model is, so they provide invoke and stream'''
+
+    name = 'backend'
+
+    def __init__(self, price:Optional[float] = None, max_concurrency:int = DEFAULT_MAX_CONCURRENCY):
+        self.price = DEFAULT_PRICES.get(self.name, 0.0) if price is None else price
+        self.max_concurrency = max_concurrency
+
+    @property
+    def identity(self) -> str:
+        '''Names the model behind the backend in cache keys and manifests'''
+        return self.name
+
+    @abstractmethod
+    def invoke(self, prompt:str):
+        '''Returns the response message for a prompt'''
+
+    @abstractmethod
+    def stream(self, prompt:str) -> Iterator:
+        '''Yields the response to a prompt as message chunks'''
+
+
+class GeminiBackend(Backend):
+    '''Gemini through the shared LangChain client'''
+
+    name = 'gemini'
+
+    def __init__(self, model:str = DEFAULT_MODEL, temperature:float = DEFAULT_TEMPERATURE, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def identity(self) -> str:
+        # The same name the direct Gemini client is keyed by
+        return self.model
+
+    def invoke(self, prompt:str):
+        return get_client(self.model, self.temperature).invoke(prompt)
+
+    def stream(self, prompt:str) -> Iterator:
+        return get_client(self.model, self.temperature).stream(prompt)
+
+
+def _usage(usage:Optional[dict]) -> Optional[dict]:
+    '''Converts OpenAI token usage to LangChain usage metadata'''
+    if not usage:
+        return None
+    return {
+        'input_tokens': usage.get('prompt_tokens'),
+        'output_tokens': usage.get('completion_tokens'),
+        'total_tokens': usage.get('total_tokens'),
+    }
+
+
+class OpenAICompatibleBackend(Backend):
+    '''Any server speaking the OpenAI chat completions API, called with
+    urllib so no SDK is needed. HTTP errors keep their status code, so
+    throttling is recognized by the scheduler'''
+
+    name = 'openai'
+
+    def __init__(self, base_url:str = OPENAI_BASE_URL, model:str = OPENAI_MODEL, api_key:Optional[str] = None,
+                 temperature:float = DEFAULT_TEMPERATURE, timeout:float = DEFAULT_TIMEOUT_SECONDS,
+                 name:Optional[str] = None, **kwargs):
+        if name:
+            self.name = name
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.temperature = temperature
+        self.timeout = timeout
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def _request(self, prompt:str, stream:bool) -> urllib.request.Request:
+        body = {
+            'model': self.model,
+            'temperature': self.temperature,
+            'messages': [{'role': 'user', 'content': prompt}],
+        }
+        if stream:
+            body.update(stream=True, stream_options={'include_usage': True})
+
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+
+        return urllib.request.Request(f"{self.base_url}/chat/completions", data=json.dumps(body).encode('utf-8'),
+                                      headers=headers, method='POST')
+
+    def invoke(self, prompt:str) -> Message:
+        with urllib.request.urlopen(self._request(prompt, stream=False), timeout=self.timeout) as response:
+            body = json.load(response)
+
+        return Message(body['choices'][0]['message']['content'] or '', _usage(body.get('usage')))
+
+    def stream(self, prompt:str) -> Iterator[Message]:
+        with urllib.request.urlopen(self._request(prompt, stream=True), timeout=self.timeout) as response:
+            # Server-sent events, one "data:" line per chunk
+            for line in response:
+                line = line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    return
+
+                event = json.loads(data)
+                choices = event.get('choices') or [{}]
+                yield Message(choices[0].get('delta', {}).get('content') or '', _usage(event.get('usage')))
+
+
+class StubBackend(Backend):
+    '''Answers the generation prompt locally with placeholder values, for
+    offline development and load tests that should not spend quota. Values
+    of a seeded prompt come from its seed, so they are the same in every
+    process; unseeded prompts are numbered by a counter'''
+
+    name = 'stub'
+
+    def __init__(self, delay:float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _content(self, prompt:str) -> str:
+        match = _PROMPT_PATTERN.search(prompt)
+        if not match:
+            raise ValueError("Stub backend only answers generation prompts")
+
+        num_records = int(match.group(1))
+        fields = list(json.loads(match.group(2)))
+        seed = _SEED_PATTERN.search(prompt)
+        if seed:
+            prefix = f"{seed.group(1)}-"
+            start = 0
+        else:
+            prefix = ''
+            with self._lock:
+                start = self._counter
+                self._counter += num_records
+
+        if self.delay:
+            time.sleep(self.delay)
+        return '\n'.join(json.dumps({field: f"{field}-{prefix}{start + i}" for field in fields})
+                         for i in range(num_records))
+
+    def invoke(self, prompt:str) -> Message:
+        return Message(self._content(prompt))
+
+    def stream(self, prompt:str) -> Iterator[Message]:
+        for line in self._content(prompt).splitlines(keepends=True):
+            yield Message(line)
+
+
+class _BackendState:
+    '''What the router knows about one backend'''
+
+    def __init__(self, backend:Backend):
+        self.backend = backend
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.unavailable_until = 0.0
+        self.failures = 0
+
+
+class Router(Backend):
+    '''Sends each request to the backend with the lowest recent latency, or
+    the lowest price, among those that are not saturated or down. A backend
+    that throttles or fails is skipped for a while and the request fails over
+    to the next one. Streams only fail over before their first chunk'''
+
+    name = 'router'
+
+    def __init__(self, backends:list[Backend], strategy:str = ROUTING, clock=time.monotonic):
+        if not backends:
+            raise ValueError("Router needs at least one backend")
+        if strategy not in ('latency', 'price'):
+            raise ValueError(f"Unknown routing strategy: {strategy}. Choose from: latency, price")
+
+        super().__init__(price=0.0, max_concurrency=sum(backend.max_concurrency for backend in backends))
+        self.strategy = strategy
+        self._clock = clock
+        self._states = [_BackendState(backend) for backend in backends]
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self) -> str:
+        '''The configured chain, since any backend in it may answer a request'''
+        return ','.join(state.backend.identity for state in self._states)
+
+    def _rank(self) -> list[_BackendState]:
+        '''Returns the backends in the order to try them. Unavailable and
+        saturated backends come last, so one is still tried when all are busy'''
+        now = self._clock()
+
+        def score(state:_BackendState):
+            # Backends without a measurement are tried first to learn their latency
+            latency = state.latency if state.latency is not None else 0.0
+            busy = state.unavailable_until > now or state.in_flight >= state.backend.max_concurrency
+            if self.strategy == 'price':
+                return (busy, state.backend.price, latency)
+            return (busy, latency, state.backend.price)
+
+        with self._lock:
+            return sorted(self._states, key=score)
+
+    def _start(self, state:_BackendState):
+        with self._lock:
+            state.in_flight += 1
+
+    def _succeeded(self, state:_BackendState, seconds:float):
+        with self._lock:
+            state.in_flight -= 1
+            state.failures = 0
+            state.latency = seconds if state.latency is None else \
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * state.latency
+
+    def _failed(self, state:_BackendState, error:Exception):
+        saturated = is_rate_limit_error(error)
+        with self._lock:
+            state.in_flight -= 1
+            state.failures += 1
+            cooldown = SATURATED_COOLDOWN_SECONDS if saturated else DOWN_COOLDOWN_SECONDS
+            state.unavailable_until = self._clock() + cooldown
+        logger.warning(f"Backend {state.backend.name} {'saturated' if saturated else 'failed'}, "
+                       f"skipping it for {cooldown:.0f}s: {str(error)}")
+
+    def stats(self) -> list[dict]:
+        '''Returns the router's view of each backend for monitoring'''
+        now = self._clock()
+        with self._lock:
+            return [{'backend': state.backend.name, 'latency': state.latency, 'in_flight': state.in_flight,
+                     'available': state.unavailable_until <= now, 'failures': state.failures}
+                    for state in self._states]
+
+    def invoke(self, prompt:str):
+        error = None
+        for state in self._rank():
+            self._start(state)
+            started = self._clock()
+            try:
+                response = state.backend.invoke(prompt)
+            except Exception as e:
+                self._failed(state, e)
+                error = e
+                continue
+
+            self._succeeded(state, self._clock() - started)
+            return response
+
+        raise error
+
+    def stream(self, prompt:str) -> Iterator:
+        error = None
+        for state in self._rank():
+            self._start(state)
+            started = self._clock()
+            try:
+                # Backends may create their client here, so this can fail too
+                chunks = iter(state.backend.stream(prompt))
+                first = next(chunks, None)
+            except Exception as e:
+                self._failed(state, e)
+                error = e
+                continue
+
+            # Time to first chunk is the latency that matters for streaming
+            latency = self._clock() - started
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except GeneratorExit:
+                # The consumer stopped reading
+                self._succeeded(state, latency)
+                raise
+            except Exception as e:
+                # Chunks were already yielded, so the stream cannot fail over
+                self._failed(state, e)
+                raise
+            self._succeeded(state, latency)
+            return
+
+        raise error
+
+
+def create_backend(name:str) -> Backend:
+    '''Returns the backend configured for a name from the environment'''
+    prices = _configured_prices()
+
+    if name == 'gemini':
+        return GeminiBackend(price=prices.get(name))
+    if name == 'openai':
+        return OpenAICompatibleBackend(OPENAI_BASE_URL, OPENAI_MODEL, api_key=os.getenv("OPENAI_API_KEY"),
+                                       price=prices.get(name))
+    if name == 'local':
+        return OpenAICompatibleBackend(LOCAL_MODEL_BASE_URL, LOCAL_MODEL_NAME, name='local', price=prices.get(name))
+    if name == 'stub':
+        return StubBackend(price=prices.get(name))
+
+    raise ValueError(f"Unknown backend: {name}. Choose from: gemini, openai, local, stub")
+
+
+def _configured_prices() -> dict:
+    '''Reads price overrides such as "gemini=2.5,openai=0.6" from DATA_GENERATOR_BACKEND_PRICES'''
+    prices = {}
+    for entry in os.getenv("DATA_GENERATOR_BACKEND_PRICES", "").split(','):
+        if '=' in entry:
+            name, price = entry.split('=', 1)
+            prices[name.strip()] = float(price)
+    return prices
+
+
+_default_llm = None
+_default_lock = threading.Lock()
+
+
+def get_default_llm():
+    '''Returns the model used when none is passed in: the shared Gemini client,
+    or a router over the backends named in DATA_GENERATOR_BACKENDS'''
+    global _default_llm
+
+    if BACKENDS == ['gemini']:
+        # Raises ValueError if the API key is missing
+        return get_client(DEFAULT_MODEL, DEFAULT_TEMPERATURE)
+
+    with _default_lock:
+        if _default_llm is None:
+            _default_llm = Router([create_backend(name) for name in BACKENDS])
+            logger.info(f"Routing requests by {_default_llm.strategy} across: {', '.join(BACKENDS)}")
+        return _default_llm
+
+
+def model_identity(llm) -> str:
+    '''Returns the name cache keys and manifests use for a model. Anything
+    but a backend is the Gemini client'''
+    return llm.identity if isinstance(llm, Backend) else DEFAULT_MODEL
+
+
+def default_model_identity() -> str:
+    '''Returns the name of the model get_default_llm uses, without creating
+    a Gemini client'''
+    if BACKENDS == ['gemini']:
+        return DEFAULT_MODEL
+    return get_default_llm().identity
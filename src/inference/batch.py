@@ -0,0 +1,165 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import utils
+from inference.generator import format_user_input, get_unique_fields
+from inference.engine import DEFAULT_MAX_WORKERS, ProgressCallback, resolve_batch_size, stream_dataset
+from inference.compiler import compile_schema, iter_compiled_records
+from inference.hybrid import iter_hybrid_dataset
+from inference import manifest
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+GENERATION_MODES = ('model', 'compiled', 'hybrid')
+
+# Records between progress reports in the modes that sample records locally
+PROGRESS_INTERVAL_RECORDS = 10_000
+
+
+def read_schema_file(path):
+    '''Reads the contents of a JSON or YAML schema file'''
+    path = Path(path)
+    if not path.exists():
+        raise ValueError(f"Schema file does not exist: {path}")
+
+    text = path.read_text(encoding='utf-8')
+
+    if path.suffix.lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML is required to read YAML schema files: pip install pyyaml")
+        return yaml.safe_load(text)
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON schema file {path}: {str(e)}")
+
+
+def load_schema(path) -> dict:
+    '''Reads a schema file (JSON or YAML) into a mapping of field names to value
+    descriptions. Files may hold the mapping directly or a "fields" list of
+    {"name", "description"} entries. A field can be marked unique with a
+    {"description", "unique": true} value or a "unique" entry in the list'''
+    data = read_schema_file(path)
+
+    if isinstance(data, dict) and isinstance(data.get('fields'), list):
+        try:
+            return {field['name']: {'description': field.get('description', ''), 'unique': True}
+                    if field.get('unique') else field.get('description', '') for field in data['fields']}
+        except (TypeError, KeyError, AttributeError):
+            raise ValueError('ERROR: Invalid field structure')
+
+    if not isinstance(data, dict):
+        raise ValueError(f"Schema file must hold a mapping of fields: {path}")
+
+    return data
+
+
+def schema_to_fields(schema:dict) -> list[dict]:
+    '''Converts a field mapping into the field list used by format_user_input'''
+    fields = []
+    for name, description in schema.items():
+        unique = False
+        if isinstance(description, dict):
+            unique = bool(description.get('unique'))
+            description = description.get('description')
+
+        field = {'col1': str(name), 'col2': '' if description is None else str(description)}
+        if unique:
+            field['unique'] = True
+        fields.append(field)
+
+    return fields
+
+
+def _report_progress(records:Iterator[dict], num_records:int,
+                     progress_callback:Optional[ProgressCallback]) -> Iterator[dict]:
+    '''Yields records while reporting the count every PROGRESS_INTERVAL_RECORDS
+    records and once at the end, as the model mode does after each batch'''
+    if not progress_callback:
+        yield from records
+        return
+
+    completed = 0
+    for record in records:
+        yield record
+        completed += 1
+        if completed % PROGRESS_INTERVAL_RECORDS == 0:
+            progress_callback(completed, num_records)
+
+    if completed % PROGRESS_INTERVAL_RECORDS:
+        progress_callback(completed, num_records)
+
+
+def iter_generated_records(formatted_schema:str, num_records:int, mode:str = 'model',
+                           concurrency:int = DEFAULT_MAX_WORKERS, batch_size:Optional[int] = None,
+                           progress_callback:Optional[ProgressCallback] = None,
+                           unique_fields:Optional[list[str]] = None,
+                           seed:Optional[int] = None,
+                           correlated:Optional[list[list[str]]] = None) -> Iterator[dict]:
+    '''Yields generated records in order, either from the model in concurrent
+    batches, sampled locally from the compiled schema, or recombined from a
+    pool of model-written values. A seed is used for both the model requests
+    and local sampling. Fields in a correlated group keep values from the same
+    pool record in hybrid mode'''
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unsupported generation mode: {mode}. Choose from: {', '.join(GENERATION_MODES)}")
+
+    if mode == 'compiled':
+        records = iter_compiled_records(compile_schema(formatted_schema), num_records, seed=seed,
+                                        unique_fields=unique_fields)
+        return _report_progress(records, num_records, progress_callback)
+
+    if mode == 'hybrid':
+        records = iter_hybrid_dataset(formatted_schema, num_records, unique_fields=unique_fields, seed=seed,
+                                      correlated=correlated or (), max_workers=concurrency)
+        return _report_progress(records, num_records, progress_callback)
+
+    return stream_dataset(num_records, formatted_schema, batch_size=batch_size, max_workers=concurrency,
+                          progress_callback=progress_callback, unique_fields=unique_fields, seed=seed)
+
+
+def generate_to_file(schema:Union[dict, str, Path], num_records:int, output_path, fmt:str = 'ndjson',
+                     mode:str = 'model', concurrency:int = DEFAULT_MAX_WORKERS,
+                     batch_size:Optional[int] = None, compression:Optional[str] = None,
+                     progress_callback:Optional[ProgressCallback] = None,
+                     unique_fields:Optional[list[str]] = None, seed:Optional[int] = None,
+                     correlated:Optional[list[list[str]]] = None) -> int:
+    '''Generates records for a schema mapping or schema file and streams them to
+    an output file. Fields marked unique in the schema or listed in
+    unique_fields get distinct values. A manifest of the run is written next to
+    the output for inference.manifest.replay. Returns the number of records written'''
+    if not isinstance(schema, dict):
+        schema = load_schema(schema)
+
+    fields = schema_to_fields(schema)
+    formatted_schema = format_user_input(fields)
+    unique_fields = list(dict.fromkeys(get_unique_fields(fields) + list(unique_fields or [])))
+    if mode == 'model':
+        batch_size = resolve_batch_size(batch_size, formatted_schema)
+    records = iter_generated_records(formatted_schema, num_records, mode, concurrency, batch_size,
+                                     progress_callback, unique_fields, seed, correlated)
+
+    count = utils.write_records(records, output_path, fmt, compression)
+    manifest.record_run(formatted_schema, num_records, output_path, fmt, compression, count, mode=mode,
+                        seed=seed, unique_fields=unique_fields, batch_size=batch_size if mode == 'model' else None)
+    return count
@@ -0,0 +1,304 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import logging
+import argparse
+from typing import Optional
+
+import utils
+from inference import batch, disk_cache, distributed, jobs, manifest, metrics, relational
+from inference.engine import DEFAULT_MAX_WORKERS
+
+
+def _print_progress(completed:int, total:int):
+    '''Reports generation progress on stderr'''
+    print(f"\rGenerated {completed} of {total} records", end='' if completed < total else '\n',
+          file=sys.stderr, flush=True)
+
+
+def _generate(args) -> int:
+    '''Runs the generate command'''
+    if args.job:
+        return _generate_job(args)
+
+    count = batch.generate_to_file(
+        args.schema,
+        args.records,
+        args.output,
+        fmt=args.format,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        compression=args.compression or utils.infer_compression(args.output),
+        progress_callback=None if args.quiet else _print_progress,
+        unique_fields=args.unique,
+        seed=args.seed,
+        correlated=[group.split(',') for group in args.correlate or []],
+    )
+
+    if not args.quiet:
+        print(f"Wrote {count} records to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _generate_job(args) -> int:
+    '''Runs the generate command as a resumable job'''
+    if args.mode != 'model':
+        raise ValueError("Jobs only support --mode model")
+
+    store = jobs.get_job_store()
+    job_id = store.create(args.schema, args.records, args.output, fmt=args.format,
+                          compression=args.compression or utils.infer_compression(args.output),
+                          concurrency=args.concurrency, batch_size=args.batch_size,
+                          unique_fields=args.unique, seed=args.seed)
+    if not args.quiet:
+        print(f"Started job {job_id}", file=sys.stderr)
+    return _run_job(job_id, store, args.quiet)
+
+
+def _run_job(job_id:str, store, quiet:bool) -> int:
+    '''Runs or resumes a job and reports how it ended'''
+    try:
+        job = jobs.run_job(job_id, store, progress_callback=None if quiet else _print_progress)
+    except (ValueError, RuntimeError):
+        print(f"Job {job_id} stopped. Resume it with: python -m inference jobs resume {job_id}", file=sys.stderr)
+        raise
+
+    if not quiet:
+        if job['status'] == 'completed':
+            print(f"Wrote {job['committed_records']} records to {job['output_path']}", file=sys.stderr)
+        else:
+            print(f"Job {job_id} {job['status']} after {job['committed_records']} records", file=sys.stderr)
+    return 0
+
+
+def _jobs(args) -> int:
+    '''Runs the jobs command'''
+    store = jobs.get_job_store()
+
+    if args.jobs_command == 'list':
+        for job in store.list():
+            print(f"{job['id']}  {job['status']:<11}  {job['committed_records']:>10} / {job['num_records']:<10}  "
+                  f"{job['output_path']}")
+    elif args.jobs_command == 'resume':
+        return _run_job(args.job_id, store, args.quiet)
+    elif args.jobs_command == 'cancel':
+        store.cancel(args.job_id)
+        print(f"Cancelled job {args.job_id}", file=sys.stderr)
+
+    return 0
+
+
+def _dist(args) -> int:
+    '''Runs the dist command'''
+    queue = distributed.TaskQueue(args.dir) if args.dir else distributed.get_task_queue()
+
+    if args.dist_command == 'submit':
+        run_id = distributed.submit_run(args.schema, args.records, args.output, fmt=args.format,
+                                        compression=args.compression or utils.infer_compression(args.output),
+                                        batch_size=args.batch_size, unique_fields=args.unique, seed=args.seed,
+                                        queue=queue)
+        print(f"Started run {run_id}", file=sys.stderr)
+        if not args.wait and not args.local_workers:
+            return 0
+
+        workers = distributed.start_local_workers(args.local_workers, run_id, queue) if args.local_workers else []
+        try:
+            run = distributed.wait_for_run(run_id, queue, progress_callback=None if args.quiet else _print_progress)
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.wait()
+
+        if not args.quiet:
+            print(f"Run {run_id} {run['status']}, output in {run['output_path']}", file=sys.stderr)
+    elif args.dist_command == 'worker':
+        completed = distributed.run_worker(queue, args.worker_id, args.concurrency, args.run, args.wait)
+        print(f"Completed {completed} tasks", file=sys.stderr)
+    elif args.dist_command == 'status':
+        for run_id in [args.run_id] if args.run_id else queue.runs():
+            run = queue.status(run_id)
+            tasks = '  '.join(f"{state} {count}" for state, count in run['tasks'].items())
+            print(f"{run['id']}  {run['status']:<9}  {tasks}  {run['output_path']}")
+    elif args.dist_command == 'merge':
+        run = distributed.merge_run(args.run_id, queue)
+        print(f"Run {args.run_id} {run['status']}", file=sys.stderr)
+    elif args.dist_command == 'cancel':
+        queue.cancel(args.run_id)
+        print(f"Cancelled run {args.run_id}", file=sys.stderr)
+
+    return 0
+
+
+def _tables(args) -> int:
+    '''Runs the tables command'''
+    counts = relational.generate_tables(
+        args.schema,
+        args.output_dir,
+        fmt=args.format,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        compression=args.compression,
+        seed=args.seed,
+        progress_callback=None if args.quiet else _print_progress,
+    )
+
+    if not args.quiet:
+        for name, count in counts.items():
+            print(f"Wrote {count} rows to table {name}", file=sys.stderr)
+    return 0
+
+
+def _replay(args) -> int:
+    '''Runs the replay command'''
+    restored = manifest.replay(args.manifest, args.output)
+    if not args.quiet:
+        print("Restored output from the cache" if restored else "Output already matches the manifest",
+              file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    '''Builds the command line parser'''
+    parser = argparse.ArgumentParser(prog='python -m inference',
+                                     description='Generate sample data without the Streamlit app')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log progress details')
+    parser.add_argument('--metrics-file', help='Write stage timings and counters to an OpenMetrics file on exit')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port while running')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='Generate records from a schema file')
+    generate_parser.add_argument('--schema', required=True, help='Schema file (JSON or YAML)')
+    generate_parser.add_argument('-n', '--records', type=int, required=True, help='Number of records')
+    generate_parser.add_argument('-o', '--output', required=True, help='Output file path')
+    generate_parser.add_argument('--format', default='ndjson', choices=sorted(utils.RECORD_WRITERS),
+                                 help='Output format (default: ndjson)')
+    generate_parser.add_argument('--compression', choices=utils.COMPRESSIONS,
+                                 help='Compress the output (default: inferred from a .gz or .zst extension)')
+    generate_parser.add_argument('--mode', default='model', choices=batch.GENERATION_MODES,
+                                 help='Call the model for every batch, compile the schema once, or recombine a pool '
+                                      'of model-written values (default: model)')
+    generate_parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_WORKERS,
+                                 help=f'Batches generated at the same time (default: {DEFAULT_MAX_WORKERS})')
+    generate_parser.add_argument('--batch-size', type=int,
+                                 help="Records per model request (default: the most that fit in the model's output limit)")
+    generate_parser.add_argument('--unique', action='append', metavar='FIELD',
+                                 help='Field whose values must not repeat, may be repeated '
+                                      '(fields can also be marked unique in the schema file)')
+    generate_parser.add_argument('--seed', type=int, help='Seed for model requests and local sampling')
+    generate_parser.add_argument('--correlate', action='append', metavar='FIELD,FIELD',
+                                 help='Fields that keep values from the same pool record in hybrid mode, '
+                                      'e.g. city,state,zip; may be repeated')
+    generate_parser.add_argument('--job', action='store_true',
+                                 help='Checkpoint completed batches so the run can be resumed with "jobs resume"')
+    generate_parser.add_argument('-q', '--quiet', action='store_true', help='Do not report progress')
+    generate_parser.set_defaults(handler=_generate)
+
+    tables_parser = subparsers.add_parser('tables', help='Generate related tables from a relational schema file')
+    tables_parser.add_argument('--schema', required=True, help='Relational schema file (JSON or YAML)')
+    tables_parser.add_argument('-o', '--output-dir', required=True, help='Directory to write one file per table')
+    tables_parser.add_argument('--format', default='ndjson', choices=sorted(utils.RECORD_WRITERS),
+                               help='Output format (default: ndjson)')
+    tables_parser.add_argument('--compression', choices=utils.COMPRESSIONS, help='Compress the output files')
+    tables_parser.add_argument('--mode', default='model', choices=batch.GENERATION_MODES,
+                               help='Call the model for every batch, compile each table once, or recombine a pool '
+                                    'of model-written values per table (default: model)')
+    tables_parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_WORKERS,
+                               help=f'Batches generated at the same time per table (default: {DEFAULT_MAX_WORKERS})')
+    tables_parser.add_argument('--batch-size', type=int,
+                               help="Records per model request (default: the most that fit in the model's output limit)")
+    tables_parser.add_argument('--seed', type=int, help='Seed for row counts and foreign key choices')
+    tables_parser.add_argument('-q', '--quiet', action='store_true', help='Do not report progress')
+    tables_parser.set_defaults(handler=_tables)
+
+    replay_parser = subparsers.add_parser('replay', help='Restore the output of an earlier run without the model')
+    replay_parser.add_argument('manifest', help='Manifest written next to the output of the run')
+    replay_parser.add_argument('-o', '--output', help='Output file path (default: the file next to the manifest)')
+    replay_parser.add_argument('-q', '--quiet', action='store_true', help='Do not report the result')
+    replay_parser.set_defaults(handler=_replay)
+
+    jobs_parser = subparsers.add_parser('jobs', help='List, resume and cancel resumable generation jobs')
+    jobs_subparsers = jobs_parser.add_subparsers(dest='jobs_command', required=True)
+    jobs_subparsers.add_parser('list', help='List jobs, newest first')
+    resume_parser = jobs_subparsers.add_parser('resume', help='Resume a job from its last completed batch')
+    resume_parser.add_argument('job_id', help='Job ID')
+    resume_parser.add_argument('-q', '--quiet', action='store_true', help='Do not report progress')
+    cancel_parser = jobs_subparsers.add_parser('cancel', help='Stop a job after its current batch')
+    cancel_parser.add_argument('job_id', help='Job ID')
+    jobs_parser.set_defaults(handler=_jobs)
+
+    dist_parser = subparsers.add_parser('dist', help='Split a generation across worker processes on one or many machines')
+    dist_parser.add_argument('--dir', help='Shared runs directory (defaults to DATA_GENERATOR_RUNS_DIR)')
+    dist_subparsers = dist_parser.add_subparsers(dest='dist_command', required=True)
+    submit_parser = dist_subparsers.add_parser('submit', help='Queue one task per batch for workers to pull')
+    submit_parser.add_argument('--schema', required=True, help='Schema file (JSON or YAML)')
+    submit_parser.add_argument('-n', '--records', type=int, required=True, help='Number of records')
+    submit_parser.add_argument('-o', '--output', required=True, help='Output file path')
+    submit_parser.add_argument('--format', default='ndjson', choices=sorted(utils.RECORD_WRITERS),
+                               help='Output format (default: ndjson)')
+    submit_parser.add_argument('--compression', choices=utils.COMPRESSIONS,
+                               help='Compress the output (default: inferred from a .gz or .zst extension)')
+    submit_parser.add_argument('--batch-size', type=int,
+                               help="Records per task (default: the most that fit in the model's output limit)")
+    submit_parser.add_argument('--unique', action='append', metavar='FIELD',
+                               help='Field whose values must not repeat, may be repeated')
+    submit_parser.add_argument('--seed', type=int, help='Seed for the model requests (default: a random one)')
+    submit_parser.add_argument('--wait', action='store_true', help='Wait for the workers and merge the output')
+    submit_parser.add_argument('--local-workers', type=int, default=0, metavar='N',
+                               help='Start N worker processes on this machine and wait for them')
+    submit_parser.add_argument('-q', '--quiet', action='store_true', help='Do not report progress')
+    worker_parser = dist_subparsers.add_parser('worker', help='Pull tasks and write their records to shard files')
+    worker_parser.add_argument('--run', help='Only work on this run')
+    worker_parser.add_argument('--concurrency', type=int, default=1, help='Tasks generated at the same time (default: 1)')
+    worker_parser.add_argument('--worker-id', help='Name of this worker (default: host name and process ID)')
+    worker_parser.add_argument('--wait', action='store_true', help='Keep polling for new tasks once the queue is empty')
+    status_parser = dist_subparsers.add_parser('status', help='Show the tasks of a run, or of every run')
+    status_parser.add_argument('run_id', nargs='?', help='Run ID')
+    merge_parser = dist_subparsers.add_parser('merge', help='Write the output of a run whose tasks are done')
+    merge_parser.add_argument('run_id', help='Run ID')
+    dist_cancel_parser = dist_subparsers.add_parser('cancel', help='Stop workers taking tasks of a run')
+    dist_cancel_parser.add_argument('run_id', help='Run ID')
+    dist_parser.set_defaults(handler=_dist)
+
+    cache_parser = subparsers.add_parser('cache', add_help=False, help='Inspect and purge the generation cache')
+    cache_parser.set_defaults(handler=None)
+
+    return parser
+
+
+def main(argv:Optional[list[str]] = None) -> int:
+    '''Entry point for python -m inference'''
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Cache administration has its own parser
+    if argv and argv[0] == 'cache':
+        return disk_cache.main(argv[1:])
+
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if args.metrics_port is not None:
+        metrics.start_http_server(args.metrics_port)
+
+    try:
+        return args.handler(args)
+    except (ValueError, RuntimeError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics_file:
+            metrics.write_openmetrics(args.metrics_file)
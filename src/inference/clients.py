@@ -0,0 +1,83 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_RESPONSE_FORMAT = "json_object"
+
+# One client per configuration for the life of the process. Each client owns a
+# single long-lived gRPC channel, so sharing the client shares its keep-alive
+# HTTP/2 connection across sessions and threads.
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_key() -> str:
+    '''Returns the Gemini API key from the environment'''
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        logger.error("GEMINI_API_KEY not found in environment variables")
+        raise ValueError(
+            "GEMINI_API_KEY not found. Please set it in your .env file. "
+            "Get your API key from: https://makersuite.google.com/app/apikey"
+        )
+
+    return api_key
+
+
+def load_chat_model():
+    '''Returns the Gemini chat model class. LangChain and the Google SDK take
+    about a second to import, so they are only loaded once a client is needed'''
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI
+
+
+def get_client(model:str = DEFAULT_MODEL, temperature:float = DEFAULT_TEMPERATURE,
+               response_format:str = DEFAULT_RESPONSE_FORMAT) -> 'ChatGoogleGenerativeAI':
+    '''Returns the shared chat model client for a configuration, creating it on
+    first use'''
+    api_key = get_api_key()
+    key = (model, float(temperature), response_format, api_key)
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            logger.info(f"Creating client for {model} (temperature={temperature})")
+            client = load_chat_model()(
+                model=model,
+                temperature=temperature,
+                google_api_key=api_key,
+                response_format={"type": response_format}
+            )
+            _clients[key] = client
+
+    return client
+
+
+def clear_clients():
+    '''Drops every cached client so the next call builds a new one'''
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,345 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import json
+import string
+import logging
+from datetime import date
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from inference.backends import model_identity
+from inference.clients import DEFAULT_MODEL, get_client
+from inference.disk_cache import DiskCache, get_default_cache, make_content_key
+from inference.parser import schema_fields
+from inference.scheduler import PRIORITY_INTERACTIVE, get_scheduler
+from inference.metrics import RECORDS, REQUESTS, record_usage, span
+from inference.dedup import UniqueIndex, validate_unique_fields
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows generated per vectorized chunk
+DEFAULT_CHUNK_SIZE = 100_000
+
+# The compiled spec should be the same every time, so compile at temperature 0
+COMPILE_TEMPERATURE = 0.0
+
+# Give up on unique sampling after drawing this many times the requested rows
+MAX_UNIQUE_SAMPLING_FACTOR = 10
+
+COMPILE_PROMPT_TEMPLATE = '''Convert the following data format into a generator spec that a program can sample from.
+
+Format: {input_user_schema}
+
+Respond ONLY with a JSON object of the form {{"fields": {{"<field name>": <field spec>}}}} with one entry per
+field, in the same order. Each field spec must be one of:
+{{"type": "int", "min": <int>, "max": <int>, "distribution": "uniform" or "normal"}}
+{{"type": "float", "min": <number>, "max": <number>, "decimals": <int>, "distribution": "uniform" or "normal"}}
+{{"type": "bool", "p_true": <probability>}}
+{{"type": "choice", "values": [<at least 20 realistic values>], "weights": [<optional relative weights>]}}
+{{"type": "date", "start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}}
+{{"type": "sequence", "start": <int>}}
+{{"type": "pattern", "pattern": "<text where # is a random digit and ? is a random capital letter>"}}
+{{"type": "template", "template": "<text with {{placeholders}}>", "parts": {{"<placeholder>": [<values>]}}}}
+Template placeholders may also name an earlier field, optionally with ":slug" to lowercase it and replace
+spaces and punctuation with dots, e.g. "{{name:slug}}@{{domain}}".
+Do not use markdown code blocks or triple backticks.
+'''
+
+FIELD_TYPES = ('int', 'float', 'bool', 'choice', 'date', 'sequence', 'pattern', 'template')
+
+_PLACEHOLDER = re.compile(r'\{([^{}:]+)(?::(slug))?\}')
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_spec(spec:dict, fields:Optional[list[str]] = None) -> dict:
+    '''Checks that a generator spec is well formed and, when fields are given,
+    covers every schema field. Specs are written by the model, so every value
+    sampling relies on is type checked. Returns the spec'''
+    if not isinstance(spec, dict) or not isinstance(spec.get('fields'), dict) or not spec['fields']:
+        raise ValueError("Spec must contain a non-empty 'fields' object")
+
+    if fields is not None:
+        missing = [field for field in fields if field not in spec['fields']]
+        if missing:
+            raise ValueError(f"Spec is missing fields: {', '.join(missing)}")
+
+    seen = set()
+    for name, field in spec['fields'].items():
+        field_type = field.get('type') if isinstance(field, dict) else None
+        if field_type not in FIELD_TYPES:
+            raise ValueError(f'Field "{name}" has unsupported type: {field_type}')
+
+        if field_type in ('int', 'float'):
+            if not _is_number(field.get('min')) or not _is_number(field.get('max')) or field['min'] > field['max']:
+                raise ValueError(f'Field "{name}" needs a numeric min no greater than its max')
+            for key in ('mean', 'std'):
+                if key in field and not _is_number(field[key]):
+                    raise ValueError(f'Field "{name}" has a {key} that is not a number')
+            if 'decimals' in field and (not isinstance(field['decimals'], int) or isinstance(field['decimals'], bool)):
+                raise ValueError(f'Field "{name}" needs a whole number of decimals')
+        elif field_type == 'bool':
+            p_true = field.get('p_true', 0.5)
+            if not _is_number(p_true) or not 0 <= p_true <= 1:
+                raise ValueError(f'Field "{name}" has a probability outside 0-1')
+        elif field_type == 'choice':
+            values = field.get('values')
+            if not isinstance(values, list) or not values:
+                raise ValueError(f'Field "{name}" needs a non-empty list of values')
+            weights = field.get('weights')
+            if weights is not None and (not isinstance(weights, list) or not all(_is_number(w) for w in weights)
+                                        or len(weights) != len(values) or min(weights) < 0 or sum(weights) <= 0):
+                raise ValueError(f'Field "{name}" has weights that do not match its values')
+        elif field_type == 'date':
+            if not isinstance(field.get('start'), str) or not isinstance(field.get('end'), str):
+                raise ValueError(f'Field "{name}" needs a start and end date')
+            if date.fromisoformat(field['start']) > date.fromisoformat(field['end']):
+                raise ValueError(f'Field "{name}" has a start date after its end date')
+        elif field_type == 'sequence':
+            start = field.get('start', 1)
+            if not isinstance(start, int) or isinstance(start, bool):
+                raise ValueError(f'Field "{name}" needs a whole number start')
+        elif field_type == 'pattern':
+            if not field.get('pattern') or not isinstance(field['pattern'], str):
+                raise ValueError(f'Field "{name}" needs a pattern')
+        elif field_type == 'template':
+            parts = field.get('parts', {})
+            if not isinstance(field.get('template', ''), str) or not isinstance(parts, dict):
+                raise ValueError(f'Field "{name}" needs a template text and an object of parts')
+            for placeholder, _ in _PLACEHOLDER.findall(field.get('template', '')):
+                if placeholder not in parts and placeholder not in seen:
+                    raise ValueError(f'Field "{name}" template references unknown placeholder: {placeholder}')
+                if placeholder in parts and (not isinstance(parts[placeholder], list) or not parts[placeholder]):
+                    raise ValueError(f'Field "{name}" placeholder "{placeholder}" has no values')
+
+        # Fields beyond the schema are dropped once compiled, so templates cannot use them
+        if fields is None or name in fields:
+            seen.add(name)
+
+    return spec
+
+
+def _parse_spec_response(content:str) -> dict:
+    '''Parses the model's spec response, tolerating markdown fences'''
+    text = content.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Model returned an invalid spec: {str(e)}")
+
+
+def compile_schema(input_user_schema:str, cache:Optional[DiskCache] = None, llm=None) -> dict:
+    '''Asks the model once for a declarative generator spec for each schema
+    field. Compiled specs are reused from the on-disk cache when one is configured'''
+    fields = schema_fields(input_user_schema)
+
+    cache = cache or get_default_cache()
+    cache_key = None
+    if cache:
+        cache_key = make_content_key(input_user_schema, 0, COMPILE_PROMPT_TEMPLATE, model_identity(llm))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info("Using cached compiled spec")
+            return validate_spec(json.loads(cached), fields)
+
+    # Raises ValueError if the API key is missing
+    llm = llm or get_client(DEFAULT_MODEL, COMPILE_TEMPERATURE)
+
+    try:
+        logger.info(f"Compiling schema: {input_user_schema}")
+        prompt = COMPILE_PROMPT_TEMPLATE.format(input_user_schema=input_user_schema)
+        with span('compile'):
+            response = get_scheduler().run(lambda: llm.invoke(prompt), PRIORITY_INTERACTIVE)
+        REQUESTS.inc(outcome='success')
+        record_usage(getattr(response, 'usage_metadata', None))
+    except Exception as e:
+        REQUESTS.inc(outcome='error')
+        logger.error(f"Error compiling schema: {str(e)}")
+        raise RuntimeError(f"Failed to compile schema: {str(e)}")
+
+    spec = validate_spec(_parse_spec_response(response.content), fields)
+
+    # Drop any fields the model added beyond the schema
+    spec = {'fields': {name: field for name, field in spec['fields'].items() if name in fields}}
+
+    if cache:
+        cache.put(cache_key, json.dumps(spec))
+
+    logger.info("Successfully compiled schema")
+    return spec
+
+
+def save_spec(spec:dict, path) -> str:
+    '''Writes a compiled spec to a JSON file for reuse'''
+    validate_spec(spec)
+    path = Path(path)
+    path.write_text(json.dumps(spec, indent=2), encoding='utf-8')
+    return str(path)
+
+
+def load_spec(path) -> dict:
+    '''Reads a compiled spec from a JSON file'''
+    return validate_spec(json.loads(Path(path).read_text(encoding='utf-8')))
+
+
+def _sample_numeric(field:dict, n:int, rng:np.random.Generator) -> np.ndarray:
+    '''Samples an int or float column within the field's range'''
+    low, high = field['min'], field['max']
+
+    if field.get('distribution') == 'normal':
+        mean = field.get('mean', (low + high) / 2)
+        std = field.get('std', (high - low) / 6 or 1)
+        values = np.clip(rng.normal(mean, std, n), low, high)
+    else:
+        values = rng.uniform(low, high, n)
+
+    if field['type'] == 'int':
+        if field.get('distribution') != 'normal':
+            return rng.integers(low, high, n, endpoint=True)
+        return np.rint(values).astype(np.int64)
+
+    return np.round(values, field.get('decimals', 2))
+
+
+def _sample_choice(values:list, weights:Optional[list], n:int, rng:np.random.Generator) -> np.ndarray:
+    '''Samples values from a vocabulary, optionally weighted'''
+    p = None
+    if weights is not None:
+        p = np.asarray(weights, dtype=float)
+        p = p / p.sum()
+
+    indices = rng.choice(len(values), size=n, p=p)
+    return np.asarray(values, dtype=object)[indices]
+
+
+def _sample_pattern(pattern:str, n:int, rng:np.random.Generator) -> np.ndarray:
+    '''Fills # with random digits and ? with random capital letters'''
+    column = np.full(n, '', dtype=object)
+    digits = np.array(list(string.digits), dtype=object)
+    letters = np.array(list(string.ascii_uppercase), dtype=object)
+
+    for char in pattern:
+        if char == '#':
+            column = column + digits[rng.integers(0, 10, n)]
+        elif char == '?':
+            column = column + letters[rng.integers(0, 26, n)]
+        else:
+            column = column + char
+
+    return column
+
+
+def _slug(values:np.ndarray) -> np.ndarray:
+    '''Lowercases values and joins their words with dots'''
+    return np.array([re.sub(r'[^a-z0-9]+', '.', str(value).lower()).strip('.') for value in values], dtype=object)
+
+
+def _sample_template(field:dict, columns:dict, n:int, rng:np.random.Generator) -> np.ndarray:
+    '''Assembles a template from sampled parts and earlier field values'''
+    template = field['template']
+    parts = field.get('parts', {})
+    column = np.full(n, '', dtype=object)
+    position = 0
+
+    for match in _PLACEHOLDER.finditer(template):
+        column = column + template[position:match.start()]
+        placeholder, modifier = match.group(1), match.group(2)
+
+        if placeholder in parts:
+            values = _sample_choice(parts[placeholder], None, n, rng)
+        else:
+            values = columns[placeholder].astype(str).astype(object)
+
+        column = column + (_slug(values) if modifier == 'slug' else values)
+        position = match.end()
+
+    return column + template[position:]
+
+
+def generate_columns(spec:dict, n:int, rng:np.random.Generator, offset:int = 0) -> dict:
+    '''Generates n values for every field of a spec as NumPy columns. offset is
+    the index of the first row, used by sequence fields'''
+    columns = {}
+
+    for name, field in spec['fields'].items():
+        field_type = field['type']
+
+        if field_type in ('int', 'float'):
+            columns[name] = _sample_numeric(field, n, rng)
+        elif field_type == 'bool':
+            columns[name] = rng.random(n) < field.get('p_true', 0.5)
+        elif field_type == 'choice':
+            columns[name] = _sample_choice(field['values'], field.get('weights'), n, rng)
+        elif field_type == 'date':
+            start = np.datetime64(field['start'])
+            days = (np.datetime64(field['end']) - start).astype(int)
+            columns[name] = (start + rng.integers(0, days, n, endpoint=True)).astype(str)
+        elif field_type == 'sequence':
+            columns[name] = np.arange(offset, offset + n) + field.get('start', 1)
+        elif field_type == 'pattern':
+            columns[name] = _sample_pattern(field['pattern'], n, rng)
+        elif field_type == 'template':
+            columns[name] = _sample_template(field, columns, n, rng)
+
+    return columns
+
+
+def iter_compiled_records(spec:dict, num_records:int, seed:Optional[int] = None,
+                          chunk_size:int = DEFAULT_CHUNK_SIZE,
+                          unique_fields:Optional[list[str]] = None) -> Iterator[dict]:
+    '''Yields records sampled locally from a compiled spec, generating columns
+    one chunk at a time so memory stays bounded. Rows repeating a value of a
+    unique field are dropped and the shortfall is sampled again'''
+    validate_spec(spec)
+    if num_records < 1:
+        raise ValueError("Number of records must be at least 1")
+
+    rng = np.random.default_rng(seed)
+    names = list(spec['fields'])
+    unique_fields = validate_unique_fields(unique_fields, names)
+    unique_index = UniqueIndex(unique_fields, num_records) if unique_fields else None
+    produced = 0
+    offset = 0
+
+    while produced < num_records:
+        if offset >= num_records * MAX_UNIQUE_SAMPLING_FACTOR:
+            raise RuntimeError(f"Only {produced} of {num_records} records have unique values for "
+                               f"{', '.join(unique_fields)}. Widen the range of those fields")
+
+        n = min(chunk_size, num_records - produced)
+        with span('sample', records=n):
+            columns = generate_columns(spec, n, rng, offset)
+        offset += n
+        start = produced
+
+        # tolist() converts NumPy scalars to plain Python values
+        for row in zip(*(columns[name].tolist() for name in names)):
+            record = dict(zip(names, row))
+            if unique_index is not None and not unique_index.add(record):
+                continue
+            produced += 1
+            yield record
+
+        RECORDS.inc(produced - start, source='compiled')
@@ -0,0 +1,31 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def load_environment() -> bool:
+    '''Loads variables from a .env file into the environment, once per
+    process. Returns whether a .env file was found'''
+    from dotenv import load_dotenv
+
+    loaded = load_dotenv()
+    if loaded:
+        logger.info("Loaded environment from .env")
+    return loaded
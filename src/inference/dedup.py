@@ -0,0 +1,140 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import math
+import hashlib
+import logging
+import threading
+from typing import Iterable, Iterator, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Runs up to this many records track exact value digests; larger runs use a
+# Bloom filter so memory stays fixed regardless of the record count
+EXACT_INDEX_LIMIT = int(os.getenv("DATA_GENERATOR_EXACT_UNIQUE_LIMIT", "1000000"))
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+
+
+def _digest(value) -> bytes:
+    '''Returns a 16 byte digest of a field value. Strings hash as themselves and
+    anything else by its JSON encoding, so 1 and "1" are different values'''
+    if isinstance(value, str):
+        data = b's' + value.encode('utf-8')
+    else:
+        data = b'j' + json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class BloomFilter:
+    '''Fixed-size set membership test with no false negatives and a bounded
+    false positive rate at the planned capacity'''
+
+    def __init__(self, capacity:int, false_positive_rate:float = DEFAULT_FALSE_POSITIVE_RATE):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("False positive rate must be between 0 and 1")
+
+        self.num_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, digest:bytes) -> list[int]:
+        # Double hashing derives every probe position from one digest
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, digest:bytes) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest:bytes):
+        for p in self._positions(digest):
+            self._bits[p >> 3] |= 1 << (p & 7)
+
+
+class _ExactSet:
+    '''Exact membership over 8 byte digest prefixes'''
+
+    def __init__(self):
+        self._values: set[int] = set()
+
+    def __contains__(self, digest:bytes) -> bool:
+        return int.from_bytes(digest[:8], 'little') in self._values
+
+    def add(self, digest:bytes):
+        self._values.add(int.from_bytes(digest[:8], 'little'))
+
+
+class UniqueIndex:
+    '''Incrementally enforces unique values for a set of fields across every
+    batch of a run. A record is accepted only if none of its unique field
+    values has been seen before. Runs above EXACT_INDEX_LIMIT records use a
+    Bloom filter per field, which may occasionally reject a new value but
+    never accepts a duplicate'''
+
+    def __init__(self, fields:Iterable[str], capacity:int,
+                 false_positive_rate:float = DEFAULT_FALSE_POSITIVE_RATE,
+                 exact_limit:Optional[int] = None):
+        self.fields = list(dict.fromkeys(fields))
+        if not self.fields:
+            raise ValueError("At least one unique field is required")
+
+        exact_limit = EXACT_INDEX_LIMIT if exact_limit is None else exact_limit
+        self.exact = capacity <= exact_limit
+        self._seen = {field: _ExactSet() if self.exact else BloomFilter(capacity, false_positive_rate)
+                      for field in self.fields}
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.duplicates = 0
+
+        if not self.exact:
+            size = sum(seen.size_bytes for seen in self._seen.values())
+            logger.info(f"Using Bloom filters ({size / 1_000_000:.1f} MB) for {capacity} unique records")
+
+    def add(self, record:dict) -> bool:
+        '''Records the unique values of a record and returns True, or returns
+        False without recording anything if any value was already seen'''
+        digests = [_digest(record.get(field)) for field in self.fields]
+
+        with self._lock:
+            if any(digest in self._seen[field] for field, digest in zip(self.fields, digests)):
+                self.duplicates += 1
+                return False
+
+            for field, digest in zip(self.fields, digests):
+                self._seen[field].add(digest)
+            self.accepted += 1
+            return True
+
+    def filter(self, records:Iterable[dict]) -> Iterator[dict]:
+        '''Yields the records whose unique values are new'''
+        return (record for record in records if self.add(record))
+
+
+def validate_unique_fields(unique_fields:Optional[Iterable[str]], fields:list[str]) -> list[str]:
+    '''Returns the unique fields, checking that each one is in the schema'''
+    unique_fields = list(dict.fromkeys(unique_fields or []))
+    unknown = [field for field in unique_fields if field not in fields]
+    if unknown:
+        raise ValueError(f"Unique fields are not in the schema: {', '.join(unknown)}")
+    return unique_fields
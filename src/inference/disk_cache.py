@@ -0,0 +1,305 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import ast
+import sys
+import json
+import mmap
+import time
+import hashlib
+import logging
+import shutil
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+from inference.metrics import CACHE_HITS, CACHE_MISSES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_FILE_SUFFIX = '.ndjson'
+
+# One cache per directory and size limit for the life of the process, so
+# callers share its eviction lock instead of each building their own
+_caches: dict = {}
+_caches_lock = threading.Lock()
+
+
+def canonicalize_schema(input_user_schema:str) -> str:
+    '''Returns a stable text form of a formatted schema so that equivalent
+    schemas produce the same cache key'''
+    if not input_user_schema or not input_user_schema.strip():
+        raise ValueError("Schema cannot be empty")
+
+    try:
+        schema = ast.literal_eval(input_user_schema.strip())
+    except (ValueError, SyntaxError):
+        return input_user_schema.strip()
+
+    if not isinstance(schema, dict):
+        return input_user_schema.strip()
+
+    # Field order is preserved because it determines the output column order
+    return json.dumps(schema, separators=(',', ':'), ensure_ascii=False)
+
+
+def make_content_key(input_user_schema:str, num_records:int, prompt_template:str,
+                     model:str, seed:Optional[int] = None) -> str:
+    '''Returns a content-addressed key for a generated batch'''
+    payload = json.dumps({
+        'schema': canonicalize_schema(input_user_schema),
+        'num_records': num_records,
+        'prompt_template': prompt_template,
+        'model': model,
+        'seed': seed,
+    }, sort_keys=True)
+
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    '''Persistent cache of generated batches stored as one file per key, with a
+    total size cap enforced by least recently used eviction'''
+
+    def __init__(self, directory, max_bytes:int = DEFAULT_MAX_BYTES):
+        if max_bytes < 1:
+            raise ValueError("Cache size cap must be positive")
+
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key:str) -> Path:
+        if not key or not all(c in '0123456789abcdef' for c in key):
+            raise ValueError(f"Invalid cache key: {key}")
+
+        return self.directory / f'{key}{CACHE_FILE_SUFFIX}'
+
+    def _touch(self, path:Path):
+        '''Marks an entry as recently used'''
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def get(self, key:str) -> Optional[str]:
+        '''Returns the cached content for a key, or None on a miss'''
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                content = mapped[:].decode('utf-8')
+        except (FileNotFoundError, ValueError):
+            logger.info(f"Cache miss: {key[:12]}")
+            CACHE_MISSES.inc(cache='disk')
+            return None
+
+        self._touch(path)
+        logger.info(f"Cache hit: {key[:12]}")
+        CACHE_HITS.inc(cache='disk')
+        return content
+
+    def stream(self, key:str) -> Optional[Iterator[str]]:
+        '''Returns an iterator over the cached lines for a key without loading
+        the whole entry, or None on a miss'''
+        path = self._path(key)
+        if not path.exists():
+            CACHE_MISSES.inc(cache='disk')
+            return None
+
+        self._touch(path)
+        CACHE_HITS.inc(cache='disk')
+
+        def lines():
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for line in iter(mapped.readline, b''):
+                    yield line.decode('utf-8').rstrip('\n')
+
+        return lines()
+
+    def put(self, key:str, content:str):
+        '''Stores content for a key, then evicts old entries over the size cap'''
+        if not content:
+            raise ValueError("Cannot cache empty content")
+
+        path = self._path(key)
+        data = content.encode('utf-8')
+
+        if len(data) > self.max_bytes:
+            logger.warning(f"Not caching {len(data)} bytes, larger than the cache size cap")
+            return
+
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key[:12]}: {str(e)}")
+            return
+
+        self._evict()
+
+    def put_file(self, key:str, source):
+        '''Stores a copy of a file for a key, then evicts old entries over the size cap'''
+        path = self._path(key)
+        size = os.path.getsize(source)
+
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {size} bytes, larger than the cache size cap")
+            return
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f, open(source, 'rb') as src:
+                shutil.copyfileobj(src, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key[:12]}: {str(e)}")
+            return
+
+        self._evict()
+
+    def get_file(self, key:str, destination) -> bool:
+        '''Copies the cached entry for a key to a file. Returns False on a miss'''
+        path = self._path(key)
+
+        try:
+            shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            logger.info(f"Cache miss: {key[:12]}")
+            CACHE_MISSES.inc(cache='disk')
+            return False
+
+        self._touch(path)
+        logger.info(f"Cache hit: {key[:12]}")
+        CACHE_HITS.inc(cache='disk')
+        return True
+
+    def entries(self) -> list[dict]:
+        '''Returns cached entries ordered from most to least recently used'''
+        entries = []
+        for path in self.directory.glob(f'*{CACHE_FILE_SUFFIX}'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append({'key': path.stem, 'bytes': stat.st_size, 'last_used': stat.st_mtime})
+
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def stats(self) -> dict:
+        '''Returns a summary of the cache contents'''
+        entries = self.entries()
+        return {
+            'directory': str(self.directory),
+            'entries': len(entries),
+            'total_bytes': sum(entry['bytes'] for entry in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+    def purge(self, key:Optional[str] = None) -> int:
+        '''Removes one entry, or every entry when no key is given, and returns
+        the number of entries removed'''
+        with self._lock:
+            paths = [self._path(key)] if key else [self.directory / f"{entry['key']}{CACHE_FILE_SUFFIX}"
+                                                   for entry in self.entries()]
+            removed = 0
+            for path in paths:
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+
+        logger.info(f"Purged {removed} cache entries")
+        return removed
+
+    def _evict(self):
+        '''Deletes least recently used entries until the cache fits the size cap'''
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry['bytes'] for entry in entries)
+
+            while entries and total > self.max_bytes:
+                entry = entries.pop()
+                try:
+                    (self.directory / f"{entry['key']}{CACHE_FILE_SUFFIX}").unlink()
+                except FileNotFoundError:
+                    pass
+                total -= entry['bytes']
+                logger.info(f"Evicted cache entry {entry['key'][:12]}")
+
+
+def get_default_cache() -> Optional[DiskCache]:
+    '''Returns the shared cache configured by DATA_GENERATOR_CACHE_DIR,
+    creating it on first use, or None when on-disk caching is disabled'''
+    directory = os.getenv("DATA_GENERATOR_CACHE_DIR")
+    if not directory:
+        return None
+
+    max_bytes = int(os.getenv("DATA_GENERATOR_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+    key = (os.path.abspath(directory), max_bytes)
+
+    with _caches_lock:
+        cache = _caches.get(key)
+        # A cache whose directory was removed is rebuilt, which recreates it
+        if cache is None or not cache.directory.is_dir():
+            cache = DiskCache(directory, max_bytes)
+            _caches[key] = cache
+
+    return cache
+
+
+def main(argv:Optional[list[str]] = None) -> int:
+    '''Admin commands to inspect and purge the on-disk generation cache'''
+    parser = argparse.ArgumentParser(prog='python -m inference.disk_cache',
+                                     description='Inspect and purge the generation cache')
+    parser.add_argument('--dir', help='Cache directory (defaults to DATA_GENERATOR_CACHE_DIR)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Show cache size and entry count')
+    subparsers.add_parser('list', help='List entries from most to least recently used')
+    purge_parser = subparsers.add_parser('purge', help='Remove one entry or the whole cache')
+    purge_parser.add_argument('--key', help='Only remove this entry')
+
+    args = parser.parse_args(argv)
+
+    directory = args.dir or os.getenv("DATA_GENERATOR_CACHE_DIR")
+    if not directory:
+        print("No cache directory. Pass --dir or set DATA_GENERATOR_CACHE_DIR.", file=sys.stderr)
+        return 1
+
+    cache = DiskCache(directory, int(os.getenv("DATA_GENERATOR_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))))
+
+    if args.command == 'stats':
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == 'list':
+        for entry in cache.entries():
+            last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['last_used']))
+            print(f"{entry['key']}  {entry['bytes']:>10}  {last_used}")
+    elif args.command == 'purge':
+        print(f"Removed {cache.purge(args.key)} entries")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,464 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import sys
+import json
+import time
+import secrets
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+import utils
+from inference import manifest
+from inference.batch import load_schema, schema_to_fields
+from inference.dedup import UniqueIndex, validate_unique_fields
+from inference.engine import ProgressCallback, generate_batch, plan_batches, resolve_batch_size
+from inference.generator import format_user_input, get_unique_fields
+from inference.parser import schema_fields
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Directory holding the queue and shards of distributed runs. Workers on other
+# machines need it on a shared mount
+RUNS_DIR = os.getenv("DATA_GENERATOR_RUNS_DIR", os.path.join(os.path.expanduser('~'), '.cache', 'data-generator', 'runs'))
+
+# A claimed task whose worker has not renewed it in this long is given to another worker
+TASK_LEASE_SECONDS = float(os.getenv("DATA_GENERATOR_TASK_LEASE", "300"))
+
+# Attempts a task gets before it is marked failed
+MAX_TASK_ATTEMPTS = 3
+
+# Rounds of extra tasks queued when repeats across shards leave a unique run short
+MAX_TOP_UP_ROUNDS = 3
+
+POLL_INTERVAL_SECONDS = 1.0
+
+TASK_STATES = ('pending', 'claimed', 'done', 'failed')
+
+RUN_FILE = 'run.json'
+CANCEL_FILE = 'cancel'
+
+
+def _write_json(path:Path, data:dict):
+    '''Replaces a JSON file atomically'''
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _file_safe(name:str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]', '-', name)
+
+
+def default_worker_id() -> str:
+    '''Returns a worker name unique to this process across machines'''
+    return _file_safe(f"{socket.gethostname()}-{os.getpid()}")
+
+
+class TaskQueue:
+    '''Queue of batch tasks kept as files in a directory every worker can
+    reach. A task moves between its run's pending, claimed, done and failed
+    directories by atomic rename, so exactly one worker claims it, and a claim
+    carries the worker's name so a worker whose lease ran out cannot complete
+    a task someone else has since claimed. Each worker writes its batch to its
+    own shard file'''
+
+    def __init__(self, directory = RUNS_DIR, lease:float = TASK_LEASE_SECONDS,
+                 clock:Callable[[], float] = time.time):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        self._clock = clock
+
+    def _dir(self, run_id:str) -> Path:
+        path = self.directory / run_id
+        if not run_id or path.parent != self.directory or not (path / RUN_FILE).exists():
+            raise ValueError(f"Unknown run: {run_id}")
+        return path
+
+    def create_run(self, spec:dict, sizes:list[int]) -> str:
+        '''Records a run and queues a task for each batch size. Returns its ID'''
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        path = self.directory / run_id
+        for directory in (*TASK_STATES, 'shards'):
+            (path / directory).mkdir(parents=True)
+
+        _write_json(path / RUN_FILE, {**spec, 'id': run_id, 'status': 'running', 'created': time.time(),
+                                      'batches': 0, 'top_up_rounds': 0, 'error': None, 'output_sha256': None})
+        self.add_tasks(run_id, sizes)
+        logger.info(f"Created run {run_id} with {len(sizes)} tasks")
+        return run_id
+
+    def add_tasks(self, run_id:str, sizes:list[int]):
+        '''Queues tasks for more batches, numbered after the run's last one'''
+        run = self.get_run(run_id)
+        for index, size in enumerate(sizes, start=run['batches']):
+            _write_json(self._dir(run_id) / 'pending' / f"{index:06d}.json", {'index': index, 'size': size})
+        self.update_run(run_id, batches=run['batches'] + len(sizes))
+
+    def get_run(self, run_id:str) -> dict:
+        return json.loads((self._dir(run_id) / RUN_FILE).read_text(encoding='utf-8'))
+
+    def update_run(self, run_id:str, **changes) -> dict:
+        run = self.get_run(run_id)
+        run.update(changes)
+        _write_json(self._dir(run_id) / RUN_FILE, run)
+        return run
+
+    def runs(self) -> list[str]:
+        '''Returns the IDs of every run, oldest first'''
+        return sorted(path.name for path in self.directory.iterdir() if (path / RUN_FILE).exists())
+
+    def cancel(self, run_id:str):
+        '''Stops workers claiming the run's tasks. Tasks already claimed finish'''
+        (self._dir(run_id) / CANCEL_FILE).touch()
+        self.update_run(run_id, status='cancelled')
+        logger.info(f"Cancelled run {run_id}")
+
+    def claim(self, worker:str, run_id:Optional[str] = None) -> Optional[dict]:
+        '''Claims the lowest pending task of a run, or of any run that is not
+        cancelled, for a worker. Returns None when there is nothing to claim'''
+        for candidate in [run_id] if run_id else self.runs():
+            path = self._dir(candidate)
+            if (path / CANCEL_FILE).exists():
+                continue
+
+            for pending in sorted((path / 'pending').glob('*.json')):
+                claimed = path / 'claimed' / f"{pending.stem}.{worker}.json"
+                try:
+                    os.rename(pending, claimed)
+                except FileNotFoundError:
+                    # Another worker claimed it first
+                    continue
+                # The lease runs from the claim
+                os.utime(claimed)
+                return {**json.loads(claimed.read_text(encoding='utf-8')), 'run_id': candidate,
+                        'worker': worker, 'path': str(claimed)}
+        return None
+
+    def complete(self, task:dict, records:list[dict]) -> bool:
+        '''Writes a task's records to the worker's shard and marks the task
+        done. Returns False, discarding the shard, if the worker's lease ran
+        out and the task went back to the queue'''
+        path = self._dir(task['run_id'])
+        name = f"{task['index']:06d}.{task['worker']}"
+        shard = path / 'shards' / f"{name}.ndjson"
+
+        tmp_path = shard.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, shard)
+
+        try:
+            os.rename(task['path'], path / 'done' / f"{name}.json")
+        except FileNotFoundError:
+            shard.unlink(missing_ok=True)
+            logger.warning(f"Task {task['index']} of run {task['run_id']} was given to another worker")
+            return False
+        return True
+
+    def fail(self, task:dict, error:str):
+        '''Returns a task that raised to the queue, or marks it failed once it
+        has used up its attempts. Does nothing if the worker's lease ran out
+        and the task already went back to the queue'''
+        claimed = Path(task['path'])
+        attempts = task.get('attempts', 0) + 1
+        state = 'failed' if attempts >= MAX_TASK_ATTEMPTS else 'pending'
+
+        # Take the claim out of the claimed directory first, so it cannot be
+        # requeued while the attempt is recorded
+        failing = claimed.with_suffix('.failing')
+        try:
+            os.rename(claimed, failing)
+        except FileNotFoundError:
+            logger.warning(f"Task {task['index']} of run {task['run_id']} was given to another worker")
+            return
+
+        _write_json(failing, {'index': task['index'], 'size': task['size'], 'attempts': attempts, 'error': error})
+        os.rename(failing, self._dir(task['run_id']) / state / f"{task['index']:06d}.json")
+        logger.warning(f"Task {task['index']} of run {task['run_id']} {state} after attempt {attempts}: {error}")
+
+    def renew(self, task:dict) -> bool:
+        '''Extends a worker's lease on a task it is still generating. Returns
+        False if the lease already ran out and the task went back to the queue'''
+        try:
+            os.utime(task['path'])
+        except FileNotFoundError:
+            return False
+        return True
+
+    def requeue_expired(self, run_id:Optional[str] = None) -> int:
+        '''Returns claimed tasks whose lease has run out to the queue, such as
+        those of a worker that died. Returns how many were requeued'''
+        requeued = 0
+        now = self._clock()
+        for candidate in [run_id] if run_id else self.runs():
+            path = self._dir(candidate)
+            for claimed in (path / 'claimed').glob('*.json'):
+                try:
+                    if now - claimed.stat().st_mtime <= self.lease:
+                        continue
+                    os.rename(claimed, path / 'pending' / f"{claimed.name.split('.')[0]}.json")
+                except FileNotFoundError:
+                    continue
+                requeued += 1
+                logger.warning(f"Requeued task {claimed.name} of run {candidate} after its lease ran out")
+        return requeued
+
+    def status(self, run_id:str) -> dict:
+        '''Returns the run with the number of tasks in each state and the
+        records of the done tasks'''
+        run = self.get_run(run_id)
+        path = self._dir(run_id)
+        tasks = {state: sorted((path / state).glob('*.json')) for state in TASK_STATES}
+        run['tasks'] = {state: len(paths) for state, paths in tasks.items()}
+        run['done_records'] = sum(json.loads(task.read_text(encoding='utf-8'))['size'] for task in tasks['done'])
+        run['errors'] = [json.loads(task.read_text(encoding='utf-8')).get('error') for task in tasks['failed']]
+        return run
+
+    def shards(self, run_id:str) -> list[Path]:
+        '''Returns the shards of the done tasks in batch order'''
+        path = self._dir(run_id)
+        return [path / 'shards' / f"{done.stem}.ndjson" for done in sorted((path / 'done').glob('*.json'))]
+
+
+def get_task_queue() -> TaskQueue:
+    '''Returns the task queue in DATA_GENERATOR_RUNS_DIR'''
+    return TaskQueue(RUNS_DIR)
+
+
+def submit_run(schema:Union[dict, str, Path], num_records:int, output_path, fmt:str = 'ndjson',
+               compression:Optional[str] = None, batch_size:Optional[int] = None,
+               unique_fields:Optional[list[str]] = None, seed:Optional[int] = None,
+               queue:Optional[TaskQueue] = None) -> str:
+    '''Splits a generation into one task per batch on the queue and returns
+    the run ID. Runs are always seeded, so every batch gets its own prompt
+    whichever worker generates it'''
+    if fmt not in utils.RECORD_WRITERS:
+        raise ValueError(f"Unsupported output format: {fmt}. Choose from: {', '.join(utils.RECORD_WRITERS)}")
+
+    if not isinstance(schema, dict):
+        schema = load_schema(schema)
+
+    fields = schema_to_fields(schema)
+    formatted_schema = format_user_input(fields)
+    unique_fields = validate_unique_fields(list(dict.fromkeys(get_unique_fields(fields) + list(unique_fields or []))),
+                                           schema_fields(formatted_schema))
+    batch_size = resolve_batch_size(batch_size, formatted_schema)
+
+    queue = queue or get_task_queue()
+    spec = {
+        'schema': formatted_schema,
+        'num_records': num_records,
+        'output_path': str(Path(output_path).resolve()),
+        'format': fmt,
+        'compression': compression,
+        'batch_size': batch_size,
+        'unique_fields': unique_fields,
+        'seed': secrets.randbits(32) if seed is None else seed,
+    }
+    return queue.create_run(spec, plan_batches(num_records, batch_size))
+
+
+@contextmanager
+def _renewing(queue:TaskQueue, task:dict):
+    '''Renews the lease on a task every third of the lease while the block
+    runs, so a batch slowed by rate limits is not given to another worker'''
+    done = threading.Event()
+
+    def renew():
+        while not done.wait(queue.lease / 3) and queue.renew(task):
+            pass
+
+    thread = threading.Thread(target=renew, daemon=True, name=f"dist-lease-{task['index']}")
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def _run_worker_thread(queue:TaskQueue, worker:str, run_id:Optional[str], wait:bool,
+                       generate_fn:Optional[Callable], poll_interval:float, stop:threading.Event) -> int:
+    '''Claims and generates tasks until the queue is empty, or until stopped when waiting'''
+    completed = 0
+    while not stop.is_set():
+        task = queue.claim(worker, run_id)
+        if task is None and queue.requeue_expired(run_id):
+            continue
+        if task is None:
+            if not wait:
+                return completed
+            stop.wait(poll_interval)
+            continue
+
+        run = queue.get_run(task['run_id'])
+        try:
+            with _renewing(queue, task):
+                records = generate_batch(task['index'], task['size'], run['schema'], generate_fn=generate_fn,
+                                         unique_fields=run['unique_fields'], seed=run['seed'])
+        except Exception as e:
+            queue.fail(task, str(e))
+            continue
+
+        if queue.complete(task, records):
+            completed += 1
+            logger.info(f"Worker {worker} completed task {task['index']} of run {task['run_id']}")
+    return completed
+
+
+def run_worker(queue:Optional[TaskQueue] = None, worker_id:Optional[str] = None, concurrency:int = 1,
+               run_id:Optional[str] = None, wait:bool = False, generate_fn:Optional[Callable] = None,
+               poll_interval:float = POLL_INTERVAL_SECONDS, stop:Optional[threading.Event] = None) -> int:
+    '''Pulls tasks from the queue on concurrency threads and writes each batch
+    to a shard. Without wait the worker stops once nothing is left to claim;
+    with wait it keeps polling for new runs until stop is set. Returns the
+    number of tasks completed'''
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    queue = queue or get_task_queue()
+    worker_id = _file_safe(worker_id) if worker_id else default_worker_id()
+    stop = stop or threading.Event()
+    counts = [0] * concurrency
+
+    def work(slot:int):
+        counts[slot] = _run_worker_thread(queue, f"{worker_id}-{slot}", run_id, wait, generate_fn,
+                                          poll_interval, stop)
+
+    threads = [threading.Thread(target=work, args=(slot,), name=f"dist-worker-{slot}") for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def start_local_workers(count:int, run_id:str, queue:Optional[TaskQueue] = None,
+                        concurrency:int = 1) -> list[subprocess.Popen]:
+    '''Starts worker processes on this machine for a run. They keep polling
+    until stopped, since the coordinator may queue more tasks'''
+    queue = queue or get_task_queue()
+    src = str(Path(__file__).resolve().parent.parent)
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [src, os.environ.get('PYTHONPATH')]))}
+    command = [sys.executable, '-m', 'inference', 'dist', '--dir', str(queue.directory), 'worker',
+               '--run', run_id, '--concurrency', str(concurrency), '--wait']
+    return [subprocess.Popen(command, env=env) for _ in range(count)]
+
+
+def _iter_merged(queue:TaskQueue, run:dict, kept:list[int]) -> Iterator[dict]:
+    '''Yields the records of the run's shards in batch order, dropping repeats
+    of unique values, up to the run's record count. kept holds the count'''
+    unique_index = UniqueIndex(run['unique_fields'], run['num_records']) if run['unique_fields'] else None
+    for shard in queue.shards(run['id']):
+        with open(shard, 'r', encoding='utf-8') as f:
+            for line in f:
+                if kept[0] == run['num_records']:
+                    return
+                record = json.loads(line)
+                if unique_index is not None and not unique_index.add(record):
+                    continue
+                kept[0] += 1
+                yield record
+
+
+def merge_run(run_id:str, queue:Optional[TaskQueue] = None) -> dict:
+    '''Writes the output of a run whose tasks are all done from its shards, in
+    batch order. Repeats of unique values across shards are dropped; when
+    that leaves the run short, tasks for the shortfall are queued and the run
+    is returned still running'''
+    queue = queue or get_task_queue()
+    run = queue.status(run_id)
+    if run['tasks']['pending'] or run['tasks']['claimed'] or run['tasks']['failed']:
+        raise RuntimeError(f"Run {run_id} has unfinished tasks: {run['tasks']}")
+
+    if run['unique_fields']:
+        kept = [0]
+        for _ in _iter_merged(queue, run, kept):
+            pass
+        if kept[0] < run['num_records']:
+            if run['top_up_rounds'] >= MAX_TOP_UP_ROUNDS:
+                raise RuntimeError(f"Run {run_id} only has {kept[0]} of {run['num_records']} records with unique "
+                                   f"values for {', '.join(run['unique_fields'])}")
+            shortfall = run['num_records'] - kept[0]
+            logger.info(f"Run {run_id} lost {shortfall} records to repeats across shards; queueing more")
+            queue.add_tasks(run_id, plan_batches(shortfall, run['batch_size']))
+            return queue.update_run(run_id, top_up_rounds=run['top_up_rounds'] + 1)
+
+    output_path = Path(run['output_path'])
+    if not output_path.parent.exists():
+        raise ValueError(f"Output directory does not exist: {output_path.parent}")
+
+    # Write next to the output and move it into place so a crash never leaves a partial file
+    kept = [0]
+    tmp_path = output_path.with_name(f".{output_path.name}.{run_id}.tmp")
+    try:
+        count = utils.write_records(_iter_merged(queue, run, kept), tmp_path, run['format'], run['compression'])
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    if count < run['num_records']:
+        raise RuntimeError(f"Run {run_id} only has {count} of {run['num_records']} records")
+
+    manifest.record_run(run['schema'], run['num_records'], output_path, run['format'], run['compression'], count,
+                        seed=run['seed'], unique_fields=run['unique_fields'], batch_size=run['batch_size'])
+    logger.info(f"Run {run_id} wrote {count} records to {output_path}")
+    return queue.update_run(run_id, status='completed', error=None,
+                            output_sha256=manifest.file_checksum(output_path))
+
+
+def wait_for_run(run_id:str, queue:Optional[TaskQueue] = None, poll_interval:float = POLL_INTERVAL_SECONDS,
+                 timeout:Optional[float] = None, progress_callback:Optional[ProgressCallback] = None) -> dict:
+    '''Coordinates a run: requeues tasks whose lease ran out, waits until
+    every task is done, then merges the shards into the output'''
+    queue = queue or get_task_queue()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    reported = None
+
+    while True:
+        queue.requeue_expired(run_id)
+        run = queue.status(run_id)
+        completed = min(run['done_records'], run['num_records'])
+        if progress_callback and completed != reported:
+            progress_callback(completed, run['num_records'])
+            reported = completed
+
+        if run['status'] in ('completed', 'cancelled'):
+            return run
+        if run['tasks']['failed']:
+            error = f"{run['tasks']['failed']} tasks of run {run_id} failed: {run['errors'][0]}"
+            queue.update_run(run_id, status='failed', error=error)
+            raise RuntimeError(error)
+        if not run['tasks']['pending'] and not run['tasks']['claimed']:
+            run = merge_run(run_id, queue)
+            if run['status'] == 'completed':
+                return run
+            continue
+
+        if deadline is not None and time.monotonic() > deadline:
+            raise RuntimeError(f"Run {run_id} did not finish in {timeout} seconds: {run['tasks']}")
+        time.sleep(poll_interval)
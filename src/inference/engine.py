@@ -0,0 +1,454 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional
+
+from inference.generator import MAX_RECORDS_PER_REQUEST, generate_data_sample, stream_data_sample
+from inference.parser import parse_records, schema_fields
+from inference.metrics import RECORDS, RETRIES, span
+from inference.dedup import UniqueIndex, validate_unique_fields
+from inference.prompts import choose_batch_size
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_DELAY = 1.0
+
+# Total record budget for a single generation run
+MAX_TOTAL_RECORDS = int(os.getenv("DATA_GENERATOR_MAX_RECORDS", "1000000"))
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def plan_batches(num_records:int, batch_size:int) -> list[int]:
+    '''Splits a target record count into a list of batch sizes, in order'''
+    if num_records < 1:
+        raise ValueError("Number of records must be at least 1")
+
+    if batch_size < 1 or batch_size > MAX_RECORDS_PER_REQUEST:
+        raise ValueError(f"Batch size must be between 1 and {MAX_RECORDS_PER_REQUEST}")
+
+    full_batches, remainder = divmod(num_records, batch_size)
+    batches = [batch_size] * full_batches
+    if remainder:
+        batches.append(remainder)
+
+    return batches
+
+
+def derive_seed(seed:int, *parts) -> int:
+    '''Derives an independent seed for one part of a seeded run, such as a batch'''
+    data = json.dumps([seed, *parts]).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little') >> 1
+
+
+def _seed_kwargs(seed:Optional[int], index:int, responses:int) -> dict:
+    '''Returns the seed keyword for a request of a batch. Each response a batch
+    receives moves it to the next seed, so a retry after a short response
+    asks for new records while a retry after an error repeats the request'''
+    return {} if seed is None else {'seed': derive_seed(seed, index, responses)}
+
+
+def resolve_batch_size(batch_size:Optional[int], input_user_schema:str) -> int:
+    '''Returns the batch size for a run. Without one, batches are the largest
+    that fit in the model's output window, and an explicit size that may not
+    fit is logged since its responses risk being cut off'''
+    fitted = choose_batch_size(input_user_schema, MAX_RECORDS_PER_REQUEST)
+    if batch_size is None:
+        logger.info(f"Using batches of {fitted} records")
+        return fitted
+
+    if batch_size > fitted:
+        logger.warning(f"Batches of {batch_size} records may exceed the model's output limit; "
+                       f"at most {fitted} are expected to fit")
+    return batch_size
+
+
+def _accept(records:list[dict], candidates:list[dict], size:int, unique_index:Optional[UniqueIndex]) -> int:
+    '''Adds candidates to records up to size, skipping any that repeat a unique
+    value. Returns the number of duplicates skipped'''
+    duplicates = 0
+    for record in candidates:
+        if len(records) == size:
+            break
+        if unique_index is None or unique_index.add(record):
+            records.append(record)
+        else:
+            duplicates += 1
+    return duplicates
+
+
+def _run_batch(index:int, size:int, input_user_schema:str, fields:list[str], generate_fn:Callable,
+               max_retries:int, retry_delay:float, unique_index:Optional[UniqueIndex] = None,
+               seed:Optional[int] = None) -> list[dict]:
+    '''Generates a single batch and salvages its valid records. Failed requests
+    are retried with exponential backoff, and a response with missing, invalid
+    or duplicate records only re-requests the shortfall. When uniqueness is
+    enforced, a response that adds any new records does not use up a retry'''
+    records: list[dict] = []
+    attempt = 0
+    responses = 0
+
+    while True:
+        try:
+            content = generate_fn(size - len(records), input_user_schema, **_seed_kwargs(seed, index, responses))
+        except ValueError:
+            # Invalid input or configuration will not succeed on retry
+            raise
+        except Exception as e:
+            failure = str(e)
+            reason = 'error'
+            delay = retry_delay * (2 ** attempt)
+        else:
+            responses += 1
+            with span('parse'):
+                result = parse_records(content, fields)
+            before = len(records)
+            duplicates = _accept(records, result.records, size, unique_index)
+            if len(records) == size:
+                RECORDS.inc(size, source='model')
+                return records
+
+            failure = f"{size - len(records)} of {size} records missing ({result.rejected} rejected"
+            failure += f", {duplicates} duplicate)" if unique_index else ")"
+            reason = 'duplicate' if duplicates else 'shortfall'
+            delay = 0
+
+            if unique_index and len(records) > before:
+                RETRIES.inc(reason=reason)
+                logger.info(f"Batch {index}: {failure}, requesting the rest")
+                continue
+
+        if attempt >= max_retries:
+            raise RuntimeError(f"Batch {index} failed after {attempt + 1} attempts: {failure}")
+
+        RETRIES.inc(reason=reason)
+        logger.warning(f"Batch {index} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {failure}")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _validate_run(num_records:int, max_records:int, max_workers:int, max_retries:int):
+    '''Validates the settings of a generation run'''
+    if num_records < 1 or num_records > max_records:
+        raise ValueError(f"Number of records must be between 1 and {max_records}")
+
+    if max_workers < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    if max_retries < 0:
+        raise ValueError("Retries cannot be negative")
+
+
+def _unique_setup(fn:Callable, unique_fields:Optional[list[str]], fields:list[str],
+                  num_records:int) -> tuple[Callable, Optional[UniqueIndex]]:
+    '''Returns the request function and the index enforcing unique fields for
+    a run, or the function unchanged and None when no fields are unique'''
+    unique_fields = validate_unique_fields(unique_fields, fields)
+    if not unique_fields:
+        return fn, None
+
+    return partial(fn, unique_fields=unique_fields), UniqueIndex(unique_fields, num_records)
+
+
+def generate_batch(index:int, size:int, input_user_schema:str,
+                   max_retries:int = DEFAULT_MAX_RETRIES,
+                   retry_delay:float = DEFAULT_RETRY_DELAY,
+                   generate_fn:Optional[Callable] = None,
+                   unique_fields:Optional[list[str]] = None,
+                   seed:Optional[int] = None) -> list[dict]:
+    '''Generates the batch at index of a planned run on its own, as a worker
+    of a distributed run does. Requests get the same seeds they would in
+    generate_batches, and unique_fields are only kept distinct within the batch'''
+    if size < 1 or size > MAX_RECORDS_PER_REQUEST:
+        raise ValueError(f"Batch size must be between 1 and {MAX_RECORDS_PER_REQUEST}")
+
+    fields = schema_fields(input_user_schema)
+    generate_fn, unique_index = _unique_setup(generate_fn or generate_data_sample, unique_fields, fields, size)
+    return _run_batch(index, size, input_user_schema, fields, generate_fn, max_retries, retry_delay,
+                      unique_index, seed)
+
+
+def generate_records(num_records:int, input_user_schema:str,
+                     batch_size:Optional[int] = None,
+                     max_workers:int = DEFAULT_MAX_WORKERS,
+                     max_retries:int = DEFAULT_MAX_RETRIES,
+                     retry_delay:float = DEFAULT_RETRY_DELAY,
+                     max_records:int = MAX_TOTAL_RECORDS,
+                     progress_callback:Optional[ProgressCallback] = None,
+                     generate_fn:Optional[Callable] = None,
+                     unique_fields:Optional[list[str]] = None,
+                     seed:Optional[int] = None) -> list[dict]:
+    '''Generates a dataset of any size by splitting it into batches that run
+    concurrently, then merges the parsed records in their original batch order.
+    Values of unique_fields are kept distinct across all batches, and
+    generate_fn is then called with a unique_fields keyword. With a seed, each
+    request gets a seed derived from it through a seed keyword'''
+    _validate_run(num_records, max_records, max_workers, max_retries)
+
+    generate_fn = generate_fn or generate_data_sample
+    fields = schema_fields(input_user_schema)
+    generate_fn, unique_index = _unique_setup(generate_fn, unique_fields, fields, num_records)
+    batches = plan_batches(num_records, resolve_batch_size(batch_size, input_user_schema))
+    results: list[list[dict]] = [[] for _ in batches]
+    completed = 0
+
+    logger.info(f"Generating {num_records} records in {len(batches)} batches with {max_workers} workers")
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(batches)))
+    try:
+        futures = {
+            executor.submit(_run_batch, i, size, input_user_schema, fields, generate_fn, max_retries, retry_delay,
+                            unique_index, seed): i
+            for i, size in enumerate(batches)
+        }
+
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            completed += batches[index]
+
+            if progress_callback:
+                progress_callback(completed, num_records)
+    finally:
+        # Drop queued batches if any batch failed
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    logger.info(f"Successfully generated {num_records} records")
+    return [record for batch in results for record in batch]
+
+
+def generate_batches(num_records:int, input_user_schema:str,
+                     batch_size:Optional[int] = None,
+                     max_workers:int = DEFAULT_MAX_WORKERS,
+                     max_retries:int = DEFAULT_MAX_RETRIES,
+                     retry_delay:float = DEFAULT_RETRY_DELAY,
+                     max_records:int = MAX_TOTAL_RECORDS,
+                     generate_fn:Optional[Callable] = None,
+                     unique_fields:Optional[list[str]] = None,
+                     seed:Optional[int] = None,
+                     start_batch:int = 0,
+                     seen_records:Iterable[dict] = ()) -> Iterator[tuple[int, list[dict]]]:
+    '''Yields (batch index, records) for every batch from start_batch on, in
+    order, with at most max_workers batches in flight. Records of earlier
+    batches passed as seen_records count towards unique_fields, so a run
+    resumed from a checkpoint keeps its values distinct'''
+    _validate_run(num_records, max_records, max_workers, max_retries)
+
+    generate_fn = generate_fn or generate_data_sample
+    fields = schema_fields(input_user_schema)
+    generate_fn, unique_index = _unique_setup(generate_fn, unique_fields, fields, num_records)
+    batches = plan_batches(num_records, resolve_batch_size(batch_size, input_user_schema))
+
+    if start_batch < 0 or start_batch > len(batches):
+        raise ValueError(f"Start batch must be between 0 and {len(batches)}")
+
+    if unique_index is not None:
+        for record in seen_records:
+            unique_index.add(record)
+
+    return _generate_batches(batches, start_batch, input_user_schema, fields, generate_fn, max_workers,
+                             max_retries, retry_delay, unique_index, seed)
+
+
+def _generate_batches(batches:list[int], start_batch:int, input_user_schema:str, fields:list[str],
+                      generate_fn:Callable, max_workers:int, max_retries:int, retry_delay:float,
+                      unique_index:Optional[UniqueIndex], seed:Optional[int]) -> Iterator[tuple[int, list[dict]]]:
+    '''Runs a sliding window of batches and yields each one in order'''
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, max(1, len(batches) - start_batch)))
+    pending: deque = deque()
+    next_batch = start_batch
+
+    def submit_next():
+        nonlocal next_batch
+        pending.append((next_batch, executor.submit(_run_batch, next_batch, batches[next_batch], input_user_schema,
+                                                    fields, generate_fn, max_retries, retry_delay,
+                                                    unique_index, seed)))
+        next_batch += 1
+
+    try:
+        while next_batch < len(batches) and len(pending) < max_workers:
+            submit_next()
+
+        while pending:
+            index, future = pending.popleft()
+            records = future.result()
+            if next_batch < len(batches):
+                submit_next()
+            yield index, records
+    finally:
+        # Drop queued batches if a batch failed or the consumer stopped early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_dataset(num_records:int, input_user_schema:str, **kwargs) -> str:
+    '''Generates a dataset with generate_records and returns it as line
+    delimited json'''
+    records = generate_records(num_records, input_user_schema, **kwargs)
+    return '\n'.join(json.dumps(record, ensure_ascii=False) for record in records)
+
+
+class _BatchFailed:
+    '''Marks a streamed batch that failed after all retries'''
+
+    def __init__(self, error:Exception):
+        self.error = error
+
+
+class _StreamShortfall(RuntimeError):
+    '''Raised when a stream ends before delivering its batch'''
+
+
+_BATCH_DONE = object()
+
+
+def _stream_batch(index:int, size:int, input_user_schema:str, stream_fn:Callable, max_retries:int,
+                  retry_delay:float, records:queue.Queue, cancelled:threading.Event,
+                  unique_index:Optional[UniqueIndex] = None, seed:Optional[int] = None):
+    '''Streams a single batch into a queue. A failed attempt only re-requests
+    the records that were not yet delivered. Duplicates of unique values are
+    dropped, and an attempt that delivered any records does not use up a retry
+    when uniqueness is enforced'''
+    remaining = size
+    attempt = 0
+    responses = 0
+
+    while remaining > 0:
+        before = remaining
+        try:
+            for record in stream_fn(remaining, input_user_schema, **_seed_kwargs(seed, index, responses)):
+                if cancelled.is_set():
+                    return
+                if unique_index is not None and not unique_index.add(record):
+                    continue
+                records.put(record)
+                remaining -= 1
+                if remaining == 0:
+                    break
+
+            responses += 1
+            if remaining > 0:
+                raise _StreamShortfall(f"Model returned {size - remaining} of {size} records")
+
+        except ValueError as e:
+            records.put(_BatchFailed(e))
+            return
+        except Exception as e:
+            shortfall = isinstance(e, _StreamShortfall)
+            if unique_index is not None and shortfall and remaining < before:
+                RETRIES.inc(reason='duplicate')
+                logger.info(f"Batch {index}: {str(e)}, requesting the rest")
+                continue
+
+            if attempt >= max_retries:
+                records.put(_BatchFailed(RuntimeError(f"Batch {index} failed after {attempt + 1} attempts: {str(e)}")))
+                return
+
+            RETRIES.inc(reason='shortfall' if shortfall else 'error')
+            delay = retry_delay * (2 ** attempt)
+            logger.warning(f"Batch {index} failed (attempt {attempt + 1}), retrying {remaining} records "
+                           f"in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+            attempt += 1
+
+    RECORDS.inc(size, source='model')
+    records.put(_BATCH_DONE)
+
+
+def stream_dataset(num_records:int, input_user_schema:str,
+                   batch_size:Optional[int] = None,
+                   max_workers:int = DEFAULT_MAX_WORKERS,
+                   max_retries:int = DEFAULT_MAX_RETRIES,
+                   retry_delay:float = DEFAULT_RETRY_DELAY,
+                   max_records:int = MAX_TOTAL_RECORDS,
+                   progress_callback:Optional[ProgressCallback] = None,
+                   stream_fn:Optional[Callable] = None,
+                   unique_fields:Optional[list[str]] = None,
+                   seed:Optional[int] = None) -> Iterator[dict]:
+    '''Yields records in batch order as they stream from the model. At most
+    max_workers batches are in flight, so memory stays bounded by the window
+    rather than by the total record count. Values of unique_fields are kept
+    distinct across all batches, and stream_fn is then called with a
+    unique_fields keyword. Seeds are passed to stream_fn as in generate_records'''
+    _validate_run(num_records, max_records, max_workers, max_retries)
+
+    stream_fn = stream_fn or stream_data_sample
+    fields = schema_fields(input_user_schema) if unique_fields else []
+    stream_fn, unique_index = _unique_setup(stream_fn, unique_fields, fields, num_records)
+    batches = plan_batches(num_records, resolve_batch_size(batch_size, input_user_schema))
+
+    return _stream_batches(batches, num_records, input_user_schema, stream_fn, max_workers,
+                           max_retries, retry_delay, progress_callback, unique_index, seed)
+
+
+def _stream_batches(batches:list[int], num_records:int, input_user_schema:str, stream_fn:Callable,
+                    max_workers:int, max_retries:int, retry_delay:float,
+                    progress_callback:Optional[ProgressCallback],
+                    unique_index:Optional[UniqueIndex] = None, seed:Optional[int] = None) -> Iterator[dict]:
+    '''Runs a sliding window of streamed batches and yields their records in order'''
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(batches)))
+    cancelled = threading.Event()
+    pending: dict[int, queue.Queue] = {}
+    next_batch = 0
+    completed = 0
+
+    def submit_next():
+        nonlocal next_batch
+        pending[next_batch] = queue.Queue()
+        executor.submit(_stream_batch, next_batch, batches[next_batch], input_user_schema, stream_fn,
+                        max_retries, retry_delay, pending[next_batch], cancelled, unique_index, seed)
+        next_batch += 1
+
+    logger.info(f"Streaming {num_records} records in {len(batches)} batches with {max_workers} workers")
+
+    try:
+        while next_batch < min(max_workers, len(batches)):
+            submit_next()
+
+        for index in range(len(batches)):
+            records = pending.pop(index)
+
+            while True:
+                item = records.get()
+                if item is _BATCH_DONE:
+                    break
+                if isinstance(item, _BatchFailed):
+                    raise item.error
+
+                completed += 1
+                yield item
+
+            if progress_callback:
+                progress_callback(completed, num_records)
+
+            if next_batch < len(batches):
+                submit_next()
+    finally:
+        # Stop in-flight batches if the consumer stops early or a batch failed
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(f"Successfully streamed {num_records} records")
@@ -12,17 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
 import logging
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Iterator, Optional
 
-# Load environment variables
-load_dotenv()
+from inference.backends import default_model_identity, get_default_llm, model_identity
+from inference.disk_cache import DiskCache, get_default_cache, make_content_key
+from inference.parser import iter_records, iter_records_from_lines, schema_fields
+from inference.scheduler import PRIORITY_BULK, get_scheduler, is_rate_limit_error
+from inference.metrics import REQUESTS, record_usage, span
+from inference.prompts import build_prompt, estimate_record_tokens, estimate_tokens
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Upper bound on records requested from the model in a single call. Larger
+# datasets are split into batches by inference.engine.
+MAX_RECORDS_PER_REQUEST = 100
+
 
 def format_user_input(input:list[dict]) -> str:
     '''Takes the streamlit generated list of fields and value descriptions and formats
@@ -49,47 +55,156 @@ def format_user_input(input:list[dict]) -> str:
 
     return str(schema)
 
-def generate_data_sample(num_records:int, input_user_schema:str) -> str:
-    '''Submits a formatted prompt and returns the structured model output containing
-    the sample data'''
-    # Validate API key exists
-    GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
-    if not GOOGLE_API_KEY:
-        logger.error("GEMINI_API_KEY not found in environment variables")
-        raise ValueError(
-            "GEMINI_API_KEY not found. Please set it in your .env file. "
-            "Get your API key from: https://makersuite.google.com/app/apikey"
-        )
-
-    # Validate inputs
-    if num_records < 1 or num_records > 100:
-        raise ValueError("Number of records must be between 1 and 100")
+def get_unique_fields(input:list[dict]) -> list[str]:
+    '''Returns the names of the fields marked unique in the streamlit field list'''
+    return [field['col1'] for field in input if field.get('unique') and field.get('col1')]
+
+def _validate_request(num_records:int, input_user_schema:str):
+    '''Validates the record count and schema of a single model request'''
+    if num_records < 1 or num_records > MAX_RECORDS_PER_REQUEST:
+        raise ValueError(f"Number of records must be between 1 and {MAX_RECORDS_PER_REQUEST}")
 
     if not input_user_schema or not input_user_schema.strip():
         raise ValueError("Schema cannot be empty")
 
+def _estimate_tokens(prompt:str, num_records:int, input_user_schema:str) -> int:
+    '''Estimates the prompt and response tokens of a request'''
+    return estimate_tokens(prompt) + num_records * estimate_record_tokens(input_user_schema)
+
+def _record_usage(response, estimated:int):
+    '''Records the token usage the model reported and corrects the scheduler's
+    token budget with it'''
+    usage = getattr(response, 'usage_metadata', None)
+    record_usage(usage)
+    if isinstance(usage, dict) and isinstance(usage.get('total_tokens'), int):
+        get_scheduler().record_tokens(estimated, usage['total_tokens'])
+
+def _request_cache(cache:Optional[DiskCache], seed:Optional[int]) -> Optional[DiskCache]:
+    '''Returns the cache for a request. Only seeded requests use it: every
+    batch of a run gets its own derived seed, while unseeded batches of the same
+    size share one prompt and would all be served the first batch's response'''
+    if seed is None:
+        return None
+    return cache or get_default_cache()
+
+def _model(llm) -> str:
+    '''Returns the name of the model that will answer a request, which keys its cache entry'''
+    return default_model_identity() if llm is None else model_identity(llm)
+
+def generate_data_sample(num_records:int, input_user_schema:str, cache:Optional[DiskCache] = None,
+                         llm=None, priority:int = PRIORITY_BULK,
+                         unique_fields:Optional[list[str]] = None, seed:Optional[int] = None) -> str:
+    '''Submits a formatted prompt and returns the structured model output containing
+    the sample data. Results are served from the on-disk cache when one is configured,
+    and the default model from inference.backends is used unless one is passed in.
+    Requests go through the process-wide scheduler at the given priority. A seed
+    gives the request its own prompt and cache entry; unseeded requests are not cached'''
+    _validate_request(num_records, input_user_schema)
+
+    with span('prompt'):
+        prompt = build_prompt(num_records, input_user_schema, unique_fields, seed)
+        tokens = _estimate_tokens(prompt, num_records, input_user_schema)
+
+    cache = _request_cache(cache, seed)
+    cache_key = None
+    if cache:
+        cache_key = make_content_key(input_user_schema, num_records, prompt, _model(llm), seed)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Serving {num_records} records from cache")
+            return cached
+
+    # Raises ValueError if the API key is missing
+    llm = llm or get_default_llm()
+
     try:
         logger.info(f"Generating {num_records} records with schema: {input_user_schema}")
 
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.7,
-            google_api_key=GOOGLE_API_KEY,
-            response_format={"type": "json_object"}
-        )
-
-        response = llm.invoke(f'''Generate {num_records} example records with the following format.
+        with span('model', records=num_records):
+            response = get_scheduler().run(lambda: llm.invoke(prompt), priority, tokens)
+        REQUESTS.inc(outcome='success')
+        _record_usage(response, tokens)
 
-                              Format: {input_user_schema}
+        logger.info("Successfully generated data sample")
 
-                              The output should be formatted as line delimited json only.
-                              Respond ONLY with valid JSON. Do not use markdown code blocks or triple backticks.
+    except Exception as e:
+        REQUESTS.inc(outcome='error')
+        logger.error(f"Error generating data sample: {str(e)}")
+        raise RuntimeError(f"Failed to generate data: {str(e)}")
 
-                              ''')
+    if cache and response.content:
+        cache.put(cache_key, response.content)
+
+    return response.content
+
+def _chunk_text(chunk) -> str:
+    '''Returns the text of a streamed message chunk'''
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+
+    # Some models stream a list of content parts
+    return ''.join(part if isinstance(part, str) else part.get('text', '') for part in content)
+
+def stream_data_sample(num_records:int, input_user_schema:str, cache:Optional[DiskCache] = None,
+                       llm=None, priority:int = PRIORITY_BULK,
+                       unique_fields:Optional[list[str]] = None, seed:Optional[int] = None) -> Iterator[dict]:
+    '''Submits a formatted prompt and yields each record as soon as it is
+    complete in the model's token stream. Records missing schema fields are dropped'''
+    _validate_request(num_records, input_user_schema)
+    fields = schema_fields(input_user_schema)
+
+    with span('prompt'):
+        prompt = build_prompt(num_records, input_user_schema, unique_fields, seed)
+
+    cache = _request_cache(cache, seed)
+    cache_key = None
+    if cache:
+        cache_key = make_content_key(input_user_schema, num_records, prompt, _model(llm), seed)
+        cached_lines = cache.stream(cache_key)
+        if cached_lines is not None:
+            logger.info(f"Streaming {num_records} records from cache")
+            return iter_records_from_lines(cached_lines, fields)
+
+    # Raises ValueError if the API key is missing
+    llm = llm or get_default_llm()
+    return _stream_records(llm, prompt, num_records, input_user_schema, fields, cache, cache_key, priority)
+
+def _stream_records(llm, prompt:str, num_records:int, input_user_schema:str, fields:list[str],
+                    cache:Optional[DiskCache], cache_key:Optional[str], priority:int) -> Iterator[dict]:
+    '''Parses records out of the model's token stream, caching the full
+    response once the stream completes. Throttled streams are reported to the
+    scheduler and left to the caller to retry, since records may already have
+    been yielded'''
+    scheduler = get_scheduler()
+    parts = []
+
+    def chunks():
+        for chunk in llm.stream(prompt):
+            record_usage(getattr(chunk, 'usage_metadata', None))
+            text = _chunk_text(chunk)
+            parts.append(text)
+            yield text
+
+    scheduler.acquire(priority, _estimate_tokens(prompt, num_records, input_user_schema))
 
-        logger.info("Successfully generated data sample")
-        return response.content
+    try:
+        logger.info(f"Streaming {num_records} records with schema: {input_user_schema}")
+        # Includes the time the consumer spends between records
+        with span('stream', records=num_records):
+            yield from iter_records(chunks(), fields)
+        logger.info("Successfully streamed data sample")
 
     except Exception as e:
-        logger.error(f"Error generating data sample: {str(e)}")
+        REQUESTS.inc(outcome='error')
+        if is_rate_limit_error(e):
+            scheduler.on_throttled()
+        logger.error(f"Error streaming data sample: {str(e)}")
         raise RuntimeError(f"Failed to generate data: {str(e)}")
+
+    REQUESTS.inc(outcome='success')
+    scheduler.on_success()
+
+    content = ''.join(parts)
+    if cache and content:
+        cache.put(cache_key, content)
@@ -0,0 +1,256 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+
+from inference.disk_cache import canonicalize_schema
+from inference.engine import DEFAULT_MAX_WORKERS, derive_seed, generate_records
+from inference.parser import schema_fields
+from inference.metrics import RECORDS, span
+from inference.dedup import UniqueIndex, validate_unique_fields
+from inference.result_cache import ResultCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Records the model writes for a pool. Every field is sampled from these
+DEFAULT_POOL_RECORDS = int(os.getenv("DATA_GENERATOR_POOL_SIZE", "200"))
+
+# A pool older than this is rebuilt with new model calls on its next use
+POOL_TTL_SECONDS = float(os.getenv("DATA_GENERATOR_POOL_TTL", "3600"))
+
+# Pools kept at once; the least recently used is dropped beyond this
+MAX_POOLS = int(os.getenv("DATA_GENERATOR_MAX_POOLS", "32"))
+
+# Rows sampled per vectorized chunk
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Give up on unique sampling after drawing this many times the requested rows
+MAX_UNIQUE_SAMPLING_FACTOR = 10
+
+
+def _value_key(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+
+class ValuePool:
+    '''Records written by the model for a schema, kept as columns. Each field
+    also keeps its distinct values and how often the model wrote them'''
+
+    def __init__(self, records:list[dict], fields:list[str], created:Optional[float] = None):
+        if not records:
+            raise ValueError("Value pool is empty")
+
+        self.fields = fields
+        self.size = len(records)
+        self.created = time.monotonic() if created is None else created
+        self.columns: dict[str, np.ndarray] = {}
+        self.distinct: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+        for field in fields:
+            column = np.empty(self.size, dtype=object)
+            column[:] = [record.get(field) for record in records]
+            self.columns[field] = column
+
+            counts: dict[str, int] = {}
+            values = {}
+            for value in column:
+                key = _value_key(value)
+                counts[key] = counts.get(key, 0) + 1
+                values.setdefault(key, value)
+
+            distinct = np.empty(len(values), dtype=object)
+            distinct[:] = list(values.values())
+            self.distinct[field] = (distinct, np.array(list(counts.values()), dtype=float))
+
+    def is_stale(self, max_age:float = POOL_TTL_SECONDS) -> bool:
+        return time.monotonic() - self.created > max_age
+
+
+def _validate_sampling(pool:ValuePool, correlated:Iterable[Iterable[str]],
+                       weights:Optional[dict[str, dict]]) -> list[list[str]]:
+    '''Checks the correlated groups and weights against the pool's fields'''
+    groups = [list(group) for group in correlated]
+    grouped = [field for group in groups for field in group]
+
+    unknown = [field for field in grouped + list(weights or {}) if field not in pool.fields]
+    if unknown:
+        raise ValueError(f"Fields are not in the schema: {', '.join(dict.fromkeys(unknown))}")
+    if len(grouped) != len(set(grouped)):
+        raise ValueError("A field can only be in one correlated group")
+
+    for field, field_weights in (weights or {}).items():
+        if field in grouped:
+            raise ValueError(f'Field "{field}" is correlated, so it cannot be weighted')
+        if any(weight < 0 for weight in field_weights.values()):
+            raise ValueError(f'Field "{field}" has a negative weight')
+
+    return groups
+
+
+def _field_probabilities(pool:ValuePool, field:str, weights:Optional[dict]) -> np.ndarray:
+    '''Returns the probability of each distinct value of a field: how often
+    the model wrote it, unless a weight is given for the value'''
+    values, counts = pool.distinct[field]
+    p = counts.copy()
+    if weights:
+        for i, value in enumerate(values):
+            key = value if isinstance(value, (str, int, float, bool)) or value is None else _value_key(value)
+            if key in weights:
+                p[i] = weights[key]
+
+    if p.sum() <= 0:
+        raise ValueError(f'Field "{field}" has no value with a positive weight')
+    return p / p.sum()
+
+
+def sample_columns(pool:ValuePool, n:int, rng:np.random.Generator,
+                   correlated:Iterable[Iterable[str]] = (),
+                   weights:Optional[dict[str, dict]] = None) -> dict[str, np.ndarray]:
+    '''Samples n values for every field of a pool as NumPy columns. Fields in
+    a correlated group are copied together from one pool record, so their
+    values still agree; every other field is sampled on its own, recombining
+    values from different records'''
+    groups = _validate_sampling(pool, correlated, weights)
+    grouped = {field for group in groups for field in group}
+    columns = {}
+
+    for group in groups:
+        rows = rng.integers(0, pool.size, n)
+        for field in group:
+            columns[field] = pool.columns[field][rows]
+
+    for field in pool.fields:
+        if field in grouped:
+            continue
+        values, _ = pool.distinct[field]
+        p = _field_probabilities(pool, field, (weights or {}).get(field))
+        columns[field] = values[rng.choice(len(values), size=n, p=p)]
+
+    return {field: columns[field] for field in pool.fields}
+
+
+def iter_hybrid_records(pool:ValuePool, num_records:int, seed:Optional[int] = None,
+                        chunk_size:int = DEFAULT_CHUNK_SIZE, unique_fields:Optional[list[str]] = None,
+                        correlated:Iterable[Iterable[str]] = (),
+                        weights:Optional[dict[str, dict]] = None) -> Iterator[dict]:
+    '''Yields records sampled locally from a value pool one chunk at a time.
+    Rows repeating a value of a unique field are dropped and the shortfall is
+    sampled again, so a unique field can have at most as many rows as the
+    pool has distinct values for it'''
+    if num_records < 1:
+        raise ValueError("Number of records must be at least 1")
+
+    correlated = [list(group) for group in correlated]
+    _validate_sampling(pool, correlated, weights)
+    rng = np.random.default_rng(seed)
+    unique_fields = validate_unique_fields(unique_fields, pool.fields)
+    unique_index = UniqueIndex(unique_fields, num_records) if unique_fields else None
+    produced = 0
+    drawn = 0
+
+    while produced < num_records:
+        if drawn >= num_records * MAX_UNIQUE_SAMPLING_FACTOR:
+            raise RuntimeError(f"Only {produced} of {num_records} records have unique values for "
+                               f"{', '.join(unique_fields)}. Raise DATA_GENERATOR_POOL_SIZE or use model mode")
+
+        n = min(chunk_size, num_records - produced)
+        with span('sample', records=n):
+            columns = sample_columns(pool, n, rng, correlated, weights)
+        drawn += n
+        start = produced
+
+        for row in zip(*(columns[field].tolist() for field in pool.fields)):
+            record = dict(zip(pool.fields, row))
+            if unique_index is not None and not unique_index.add(record):
+                continue
+            produced += 1
+            yield record
+
+        RECORDS.inc(produced - start, source='hybrid')
+
+
+def build_pool(input_user_schema:str, pool_records:int = DEFAULT_POOL_RECORDS,
+               unique_fields:Optional[list[str]] = None, seed:Optional[int] = None,
+               generate_fn:Optional[Callable] = None, max_workers:int = DEFAULT_MAX_WORKERS) -> ValuePool:
+    '''Asks the model for pool_records records to sample from. Requests are
+    always seeded so each batch gets its own prompt and values; without a seed
+    a new one is drawn, so a rebuilt pool has fresh values'''
+    seed = secrets.randbits(32) if seed is None else derive_seed(seed, 'pool')
+    with span('pool', records=pool_records):
+        records = generate_records(pool_records, input_user_schema, max_workers=max_workers,
+                                   generate_fn=generate_fn, unique_fields=unique_fields, seed=seed)
+    return ValuePool(records, schema_fields(input_user_schema))
+
+
+_pools = ResultCache(max_entries=MAX_POOLS, ttl_seconds=POOL_TTL_SECONDS, name='pool')
+
+# Build lock of each pool key, with the number of callers holding or waiting for it
+_pool_locks: dict[tuple, list] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(input_user_schema:str, pool_records:int = DEFAULT_POOL_RECORDS,
+             unique_fields:Optional[list[str]] = None, seed:Optional[int] = None,
+             generate_fn:Optional[Callable] = None, max_age:float = POOL_TTL_SECONDS,
+             max_workers:int = DEFAULT_MAX_WORKERS) -> ValuePool:
+    '''Returns the shared value pool for a schema, building it on first use
+    and again once it is older than max_age. Model calls therefore follow how
+    often pools go stale, not how many records are sampled. At most
+    DATA_GENERATOR_MAX_POOLS pools are kept, least recently used first out'''
+    key = (canonicalize_schema(input_user_schema), pool_records, tuple(sorted(unique_fields or ())), seed)
+
+    with _pools_lock:
+        entry = _pool_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+
+    # Concurrent requests for the same pool wait for one build
+    try:
+        with entry[0]:
+            pool = _pools.get(key)
+            if pool is None or pool.is_stale(max_age):
+                logger.info(f"Building value pool of {pool_records} records")
+                pool = build_pool(input_user_schema, pool_records, unique_fields, seed, generate_fn, max_workers)
+                _pools.put(key, pool)
+            return pool
+    finally:
+        with _pools_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _pool_locks[key]
+
+
+def clear_pools():
+    '''Drops every shared value pool so the next use rebuilds it'''
+    _pools.clear()
+
+
+def iter_hybrid_dataset(input_user_schema:str, num_records:int, unique_fields:Optional[list[str]] = None,
+                        seed:Optional[int] = None, generate_fn:Optional[Callable] = None,
+                        correlated:Iterable[Iterable[str]] = (), pool_records:int = DEFAULT_POOL_RECORDS,
+                        max_workers:int = DEFAULT_MAX_WORKERS) -> Iterator[dict]:
+    '''Yields records for a schema from its shared value pool. The pool is
+    fetched when iteration starts, so a background task builds it off the
+    calling thread. Small requests use a pool no larger than themselves'''
+    pool_records = min(pool_records, num_records)
+    pool = get_pool(input_user_schema, pool_records, unique_fields, seed, generate_fn, max_workers=max_workers)
+    yield from iter_hybrid_records(pool, num_records, seed=seed, unique_fields=unique_fields, correlated=correlated)
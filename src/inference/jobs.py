@@ -0,0 +1,327 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import secrets
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: jobs are not locked against being run twice at once
+    fcntl = None
+
+import utils
+from inference import manifest
+from inference.batch import load_schema, schema_to_fields
+from inference.engine import DEFAULT_MAX_WORKERS, ProgressCallback, generate_batches, resolve_batch_size
+from inference.generator import format_user_input, get_unique_fields
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("DATA_GENERATOR_JOBS_DIR", os.path.join(os.path.expanduser('~'), '.cache', 'data-generator', 'jobs'))
+
+# Jobs are pending, running, failed, cancelled or completed. A job left
+# running by a process that is gone is reported as interrupted
+RESUMABLE_STATUSES = ('pending', 'interrupted', 'failed', 'cancelled')
+
+JOB_FILE = 'job.json'
+RECORDS_FILE = 'records.ndjson'
+INDEX_FILE = 'batches.idx'
+CANCEL_FILE = 'cancel'
+LOCK_FILE = 'lock'
+
+
+def _write_json(path:Path, data:dict):
+    '''Replaces a JSON file atomically'''
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class JobStore:
+    '''Directory of generation jobs. Each job keeps its settings in job.json,
+    its completed batches in an append-only records.ndjson, and a progress
+    index with one line per committed batch giving the end offset of its
+    records. Anything past the last committed offset is discarded on resume'''
+
+    def __init__(self, directory = JOBS_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, job_id:str) -> Path:
+        path = self.directory / job_id
+        if not job_id or path.parent != self.directory or not (path / JOB_FILE).exists():
+            raise ValueError(f"Unknown job: {job_id}")
+        return path
+
+    def records_path(self, job_id:str) -> Path:
+        return self._dir(job_id) / RECORDS_FILE
+
+    def create(self, schema:Union[dict, str, Path], num_records:int, output_path, fmt:str = 'ndjson',
+               compression:Optional[str] = None, concurrency:int = DEFAULT_MAX_WORKERS,
+               batch_size:Optional[int] = None, unique_fields:Optional[list[str]] = None,
+               seed:Optional[int] = None) -> str:
+        '''Records a new job for a schema mapping or schema file and returns its ID.
+        The batch size is fixed now so that a resumed job keeps the same batch plan'''
+        if fmt not in utils.RECORD_WRITERS:
+            raise ValueError(f"Unsupported output format: {fmt}. Choose from: {', '.join(utils.RECORD_WRITERS)}")
+
+        if not isinstance(schema, dict):
+            schema = load_schema(schema)
+
+        fields = schema_to_fields(schema)
+        formatted_schema = format_user_input(fields)
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+        job = {
+            'id': job_id,
+            'status': 'pending',
+            'created': time.time(),
+            'updated': time.time(),
+            'schema': formatted_schema,
+            'num_records': num_records,
+            'output_path': str(Path(output_path).resolve()),
+            'format': fmt,
+            'compression': compression,
+            'concurrency': concurrency,
+            'batch_size': resolve_batch_size(batch_size, formatted_schema),
+            'unique_fields': list(dict.fromkeys(get_unique_fields(fields) + list(unique_fields or []))),
+            'seed': seed,
+            'error': None,
+            'output_sha256': None,
+        }
+
+        (self.directory / job_id).mkdir()
+        _write_json(self.directory / job_id / JOB_FILE, job)
+        logger.info(f"Created job {job_id} for {num_records} records")
+        return job_id
+
+    def _read(self, job_id:str) -> dict:
+        return json.loads((self._dir(job_id) / JOB_FILE).read_text(encoding='utf-8'))
+
+    def update(self, job_id:str, **changes) -> dict:
+        '''Changes fields of a job's settings file'''
+        job = self._read(job_id)
+        job.update(changes, updated=time.time())
+        _write_json(self._dir(job_id) / JOB_FILE, job)
+        return job
+
+    def _read_index(self, job_id:str) -> tuple[list[dict], int]:
+        '''Returns the committed index entries and the byte offset where the
+        last complete line ends'''
+        path = self._dir(job_id) / INDEX_FILE
+        if not path.exists():
+            return [], 0
+
+        entries = []
+        end = 0
+        for line in path.read_bytes().splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            end += len(line)
+        return entries, end
+
+    def committed(self, job_id:str) -> list[dict]:
+        '''Returns the index entries of the committed batches, in order. A
+        partly written last line, from a crash mid-write, is ignored'''
+        return self._read_index(job_id)[0]
+
+    def truncate_index(self, job_id:str) -> list[dict]:
+        '''Cuts a partly written last line off the progress index, so entries
+        appended when the job resumes are read, and returns the committed entries'''
+        entries, end = self._read_index(job_id)
+        with open(self._dir(job_id) / INDEX_FILE, 'ab') as f:
+            f.truncate(end)
+        return entries
+
+    def is_running(self, job_id:str) -> bool:
+        '''Returns True if a process holds the job's lock'''
+        if fcntl is None:
+            return self._read(job_id)['status'] == 'running'
+
+        with open(self._dir(job_id) / LOCK_FILE, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return False
+
+    @contextmanager
+    def lock(self, job_id:str) -> Iterator[None]:
+        '''Holds the job's lock, failing if another process is running it'''
+        with open(self._dir(job_id) / LOCK_FILE, 'a') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    raise RuntimeError(f"Job {job_id} is already running")
+            yield
+
+    def get(self, job_id:str) -> dict:
+        '''Returns a job's settings with its progress and current status'''
+        job = self._read(job_id)
+        committed = self.committed(job_id)
+        job['committed_batches'] = len(committed)
+        job['committed_records'] = sum(entry['records'] for entry in committed)
+        job['cancel_requested'] = (self._dir(job_id) / CANCEL_FILE).exists()
+        if job['status'] == 'running' and not self.is_running(job_id):
+            job['status'] = 'interrupted'
+        return job
+
+    def list(self) -> list[dict]:
+        '''Returns every job, newest first'''
+        jobs = [self.get(path.name) for path in self.directory.iterdir() if (path / JOB_FILE).exists()]
+        return sorted(jobs, key=lambda job: job['created'], reverse=True)
+
+    def cancel(self, job_id:str):
+        '''Cancels a job. A running job stops after its next committed batch,
+        and a cancelled job can be resumed later'''
+        job = self.get(job_id)
+        if job['status'] == 'completed':
+            raise ValueError(f"Job {job_id} has already completed")
+
+        (self._dir(job_id) / CANCEL_FILE).touch()
+        if job['status'] != 'running':
+            self.update(job_id, status='cancelled')
+        logger.info(f"Cancelled job {job_id}")
+
+    def cancel_requested(self, job_id:str) -> bool:
+        return (self._dir(job_id) / CANCEL_FILE).exists()
+
+    def clear_cancel(self, job_id:str):
+        (self._dir(job_id) / CANCEL_FILE).unlink(missing_ok=True)
+
+
+def get_job_store() -> JobStore:
+    '''Returns the job store in DATA_GENERATOR_JOBS_DIR'''
+    return JobStore(JOBS_DIR)
+
+
+def _checkpoint(records_path:Path, committed:list[dict]) -> int:
+    '''Cuts the records file back to the end of the last committed batch and
+    returns that offset'''
+    offset = committed[-1]['offset'] if committed else 0
+    with open(records_path, 'ab') as f:
+        f.truncate(offset)
+    return offset
+
+
+def _iter_committed(records_path:Path) -> Iterator[dict]:
+    '''Yields the records of the committed batches'''
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _finish(store:JobStore, job:dict) -> dict:
+    '''Writes the output file from the committed records. Finishing again
+    leaves an output that still matches its checksum untouched'''
+    output_path = Path(job['output_path'])
+    if job['output_sha256'] and output_path.exists() and manifest.file_checksum(output_path) == job['output_sha256']:
+        logger.info(f"Output of job {job['id']} is already complete")
+        return store.get(job['id'])
+
+    if not output_path.parent.exists():
+        raise ValueError(f"Output directory does not exist: {output_path.parent}")
+
+    # Write next to the output and move it into place so a crash never leaves a partial file
+    tmp_path = output_path.with_name(f".{output_path.name}.{job['id']}.tmp")
+    try:
+        count = utils.write_records(_iter_committed(store.records_path(job['id'])), tmp_path,
+                                    job['format'], job['compression'])
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    manifest.record_run(job['schema'], job['num_records'], output_path, job['format'], job['compression'], count,
+                        seed=job['seed'], unique_fields=job['unique_fields'], batch_size=job['batch_size'])
+    logger.info(f"Job {job['id']} wrote {count} records to {output_path}")
+    store.update(job['id'], status='completed', error=None, output_sha256=manifest.file_checksum(output_path))
+    return store.get(job['id'])
+
+
+def run_job(job_id:str, store:Optional[JobStore] = None,
+            progress_callback:Optional[ProgressCallback] = None,
+            generate_fn:Optional[Callable] = None) -> dict:
+    '''Runs or resumes a job from its last committed batch, then writes its
+    output file. Each batch is appended to the records file and flushed to
+    disk before it is added to the progress index. Returns the job, which is
+    "cancelled" if a cancel was requested while it ran'''
+    store = store or get_job_store()
+
+    with store.lock(job_id):
+        job = store.get(job_id)
+        if job['status'] == 'completed':
+            return _finish(store, job)
+
+        store.clear_cancel(job_id)
+        job = store.update(job_id, status='running', error=None)
+        records_path = store.records_path(job_id)
+        committed = store.truncate_index(job_id)
+        _checkpoint(records_path, committed)
+        completed = sum(entry['records'] for entry in committed)
+
+        if committed:
+            logger.info(f"Resuming job {job_id} after batch {len(committed) - 1} ({completed} records)")
+
+        seen = _iter_committed(records_path) if job['unique_fields'] else ()
+        try:
+            batches = generate_batches(job['num_records'], job['schema'], batch_size=job['batch_size'],
+                                       max_workers=job['concurrency'], generate_fn=generate_fn,
+                                       unique_fields=job['unique_fields'], seed=job['seed'],
+                                       start_batch=len(committed), seen_records=seen)
+
+            with open(records_path, 'ab') as records_file, \
+                    open(records_path.with_name(INDEX_FILE), 'a', encoding='utf-8') as index_file:
+                for index, records in batches:
+                    records_file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                               for record in records).encode('utf-8'))
+                    records_file.flush()
+                    os.fsync(records_file.fileno())
+
+                    index_file.write(json.dumps({'batch': index, 'offset': records_file.tell(),
+                                                 'records': len(records)}) + '\n')
+                    index_file.flush()
+                    os.fsync(index_file.fileno())
+
+                    completed += len(records)
+                    if progress_callback:
+                        progress_callback(completed, job['num_records'])
+
+                    if store.cancel_requested(job_id):
+                        batches.close()
+                        logger.info(f"Job {job_id} cancelled after {completed} records")
+                        store.update(job_id, status='cancelled')
+                        return store.get(job_id)
+
+        except Exception as e:
+            store.update(job_id, status='failed', error=str(e))
+            logger.error(f"Job {job_id} failed after {completed} records: {str(e)}")
+            raise
+
+        return _finish(store, store.get(job_id))
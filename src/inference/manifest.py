@@ -0,0 +1,172 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from inference.backends import default_model_identity
+from inference.clients import DEFAULT_TEMPERATURE
+from inference.disk_cache import DiskCache, canonicalize_schema, get_default_cache
+from inference.engine import plan_batches
+from inference.prompts import PROMPT_TEMPLATE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+
+_CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+def manifest_path(output_path) -> Path:
+    '''Returns where the manifest of an output file is written'''
+    return Path(f"{output_path}{MANIFEST_SUFFIX}")
+
+
+def _sha256(text:str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_checksum(path) -> str:
+    '''Returns the SHA-256 of a file'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHECKSUM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(formatted_schema:str, num_records:int, output_path, fmt:str, compression:Optional[str],
+                   records:int, mode:str = 'model', seed:Optional[int] = None,
+                   unique_fields:Optional[list[str]] = None, batch_size:Optional[int] = None,
+                   model:Optional[str] = None) -> dict:
+    '''Describes a finished run: the settings that determine its output, the
+    batch plan and the output checksum. The run key identifies the settings
+    and is where the output is kept in the on-disk cache. An unseeded run
+    does not repeat, so it gets a run ID of its own and a key no other run
+    shares. The model defaults to the one configured by DATA_GENERATOR_BACKENDS'''
+    schema = canonicalize_schema(formatted_schema)
+    run = {
+        'schema_hash': _sha256(schema),
+        'prompt_hash': _sha256(PROMPT_TEMPLATE),
+        'model': model or default_model_identity(),
+        'temperature': DEFAULT_TEMPERATURE,
+        'mode': mode,
+        'seed': seed,
+        'num_records': num_records,
+        'unique_fields': sorted(unique_fields or []),
+        'batch_plan': None if batch_size is None else {
+            'batch_size': batch_size,
+            'batches': len(plan_batches(num_records, batch_size)),
+        },
+        'format': fmt,
+        'compression': compression,
+    }
+    if seed is None:
+        run['run_id'] = uuid.uuid4().hex
+
+    return {
+        'version': MANIFEST_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'run_key': _sha256(json.dumps(run, sort_keys=True)),
+        'schema': schema,
+        **run,
+        'output': {
+            'path': Path(output_path).name,
+            'records': records,
+            'bytes': os.path.getsize(output_path),
+            'sha256': file_checksum(output_path),
+        },
+    }
+
+
+def write_manifest(manifest:dict, path) -> Path:
+    '''Writes a manifest as JSON'''
+    path = Path(path)
+    path.write_text(json.dumps(manifest, indent=2) + '\n', encoding='utf-8')
+    return path
+
+
+def load_manifest(path) -> dict:
+    '''Reads a manifest written by write_manifest'''
+    path = Path(path)
+    if not path.exists():
+        raise ValueError(f"Manifest does not exist: {path}")
+
+    try:
+        manifest = json.loads(path.read_text(encoding='utf-8'))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid manifest {path}: {str(e)}")
+
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {path}")
+
+    return manifest
+
+
+def record_run(formatted_schema:str, num_records:int, output_path, fmt:str, compression:Optional[str],
+               records:int, cache:Optional[DiskCache] = None, **settings) -> dict:
+    '''Writes the manifest of a finished run next to its output and keeps a
+    copy of the output in the on-disk cache, when one is configured, for replay'''
+    manifest = build_manifest(formatted_schema, num_records, output_path, fmt, compression, records, **settings)
+    path = write_manifest(manifest, manifest_path(output_path))
+    logger.info(f"Wrote manifest {path}")
+
+    cache = cache or get_default_cache()
+    if cache:
+        cache.put_file(manifest['run_key'], output_path)
+
+    return manifest
+
+
+def replay(path, output_path=None, cache:Optional[DiskCache] = None) -> bool:
+    '''Rebuilds the output a manifest describes without calling the model. An
+    output that already matches the recorded checksum is left alone and False
+    is returned; otherwise it is restored from the on-disk cache and True is
+    returned. Defaults to the output file next to the manifest'''
+    manifest = load_manifest(path)
+    output_path = Path(output_path or Path(path).parent / manifest['output']['path'])
+    expected = manifest['output']['sha256']
+
+    if output_path.exists() and file_checksum(output_path) == expected:
+        logger.info(f"{output_path} already matches its manifest")
+        return False
+
+    cache = cache or get_default_cache()
+    if not output_path.parent.exists():
+        raise ValueError(f"Output directory does not exist: {output_path.parent}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        if cache is None or not cache.get_file(manifest['run_key'], tmp_path):
+            raise RuntimeError(f"Output of run {manifest['run_key'][:12]} is not in the cache. Replay needs "
+                               f"DATA_GENERATOR_CACHE_DIR to point at the cache of the original run")
+        if file_checksum(tmp_path) != expected:
+            raise RuntimeError(f"Cached output of run {manifest['run_key'][:12]} does not match its manifest")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Restored {manifest['output']['records']} records to {output_path}")
+    return True
@@ -0,0 +1,373 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import math
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from prompt building up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Number of finished spans kept for the live stats panel
+RECENT_SPANS = 200
+
+METRICS_PORT = int(os.getenv("DATA_GENERATOR_METRICS_PORT", "0"))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _format_value(value:float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels:dict) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric:
+    '''Base for a named metric family whose samples are keyed by label values'''
+    kind = ''
+
+    def __init__(self, name:str, help_text:str, label_names:tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def _key(self, labels:dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} takes labels: {', '.join(self.label_names) or 'none'}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key:tuple) -> dict:
+        return dict(zip(self.label_names, key))
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    '''Monotonically increasing count'''
+    kind = 'counter'
+
+    def inc(self, amount:float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        '''Returns the sum over every label combination'''
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self) -> list[tuple]:
+        with self._lock:
+            return [('_total', self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    '''Value that can go up and down, or be read from a function when collected'''
+    kind = 'gauge'
+
+    def __init__(self, name:str, help_text:str, label_names:tuple = ()):
+        super().__init__(name, help_text, label_names)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function:Callable[[], float]):
+        '''Reads the unlabelled value from function at collection time'''
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None and not labels:
+            return float(self._function())
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[tuple]:
+        if self._function is not None:
+            return [('', {}, float(self._function()))]
+        with self._lock:
+            return [('', self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class _HistogramValue:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size:int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    '''Distribution of observations over fixed buckets'''
+    kind = 'histogram'
+
+    def __init__(self, name:str, help_text:str, label_names:tuple = (), buckets:tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = _HistogramValue(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry.counts[i] += 1
+                    break
+            entry.sum += value
+            entry.count += 1
+
+    def summary(self) -> dict:
+        '''Returns the count, sum and mean of each label combination'''
+        with self._lock:
+            return {key: {'count': entry.count, 'sum': entry.sum, 'mean': entry.sum / entry.count}
+                    for key, entry in sorted(self._values.items()) if entry.count}
+
+    def samples(self) -> list[tuple]:
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry.counts):
+                    cumulative += count
+                    samples.append(('_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+                samples.append(('_sum', labels, entry.sum))
+                samples.append(('_count', labels, entry.count))
+        return samples
+
+
+class MetricsRegistry:
+    '''Holds metric families and renders them for export'''
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name:str, help_text:str, label_names:tuple, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name:str, help_text:str, label_names:tuple = ()) -> Counter:
+        '''Returns the named counter, creating it on first use. Exported with a _total suffix'''
+        return self._register(Counter, name, help_text, label_names)
+
+    def gauge(self, name:str, help_text:str, label_names:tuple = ()) -> Gauge:
+        '''Returns the named gauge, creating it on first use'''
+        return self._register(Gauge, name, help_text, label_names)
+
+    def histogram(self, name:str, help_text:str, label_names:tuple = (),
+                  buckets:tuple = DEFAULT_BUCKETS) -> Histogram:
+        '''Returns the named histogram, creating it on first use'''
+        return self._register(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def metrics(self) -> list[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def clear(self):
+        '''Resets every value, keeping the registered families'''
+        for metric in self.metrics():
+            metric.clear()
+
+    def _render(self, openmetrics:bool) -> str:
+        lines = []
+        for metric in self.metrics():
+            # Prometheus text names the counter family after its samples
+            family = metric.name if openmetrics or metric.kind != 'counter' else f"{metric.name}_total"
+            lines.append(f"# HELP {family} {metric.help_text}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def render_prometheus(self) -> str:
+        '''Returns all metrics in the Prometheus text exposition format'''
+        return self._render(openmetrics=False)
+
+    def render_openmetrics(self) -> str:
+        '''Returns all metrics in the OpenMetrics text format'''
+        return self._render(openmetrics=True)
+
+
+REGISTRY = MetricsRegistry()
+
+RECORDS = REGISTRY.counter('data_generator_records', 'Records produced', ('source',))
+REQUESTS = REGISTRY.counter('data_generator_model_requests', 'Model requests by outcome', ('outcome',))
+TOKENS = REGISTRY.counter('data_generator_tokens', 'Model tokens reported by the provider', ('kind',))
+RETRIES = REGISTRY.counter('data_generator_retries', 'Retried requests by reason', ('reason',))
+CACHE_HITS = REGISTRY.counter('data_generator_cache_hits', 'Cache lookups that found a result', ('cache',))
+CACHE_MISSES = REGISTRY.counter('data_generator_cache_misses', 'Cache lookups that found nothing', ('cache',))
+STAGE_SECONDS = REGISTRY.histogram('data_generator_stage_seconds', 'Time spent in each pipeline stage',
+                                   ('stage',))
+QUEUE_DEPTH = REGISTRY.gauge('data_generator_scheduler_queue_depth', 'Model requests waiting for quota')
+
+
+def record_usage(usage:Optional[dict]):
+    '''Adds the token usage a model response reported'''
+    if not isinstance(usage, dict):
+        return
+
+    for kind in ('input_tokens', 'output_tokens'):
+        if isinstance(usage.get(kind), int):
+            TOKENS.inc(usage[kind], kind=kind.split('_')[0])
+
+
+class Span(NamedTuple):
+    '''A finished timed stage'''
+    stage: str
+    parent: Optional[str]
+    started: float
+    seconds: float
+    attributes: dict
+
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_recent_spans: deque = deque(maxlen=RECENT_SPANS)
+_recent_lock = threading.Lock()
+
+
+@contextmanager
+def span(stage:str, **attributes) -> Iterator[None]:
+    '''Times a pipeline stage into the stage latency histogram and the recent
+    span log. Spans opened inside another span on the same thread record it
+    as their parent'''
+    parent = _current_span.get()
+    token = _current_span.set(stage)
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _current_span.reset(token)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        with _recent_lock:
+            _recent_spans.append(Span(stage, parent, started, seconds, attributes))
+
+
+def recent_spans() -> list[Span]:
+    '''Returns the most recently finished spans, oldest first'''
+    with _recent_lock:
+        return list(_recent_spans)
+
+
+def snapshot() -> dict:
+    '''Returns headline totals and per-stage latency for display'''
+    return {
+        'records': RECORDS.total(),
+        'requests': REQUESTS.total(),
+        'input_tokens': TOKENS.value(kind='input'),
+        'output_tokens': TOKENS.value(kind='output'),
+        'retries': RETRIES.total(),
+        'cache_hits': CACHE_HITS.total(),
+        'cache_misses': CACHE_MISSES.total(),
+        'queue_depth': QUEUE_DEPTH.value(),
+        'stages': {key[0]: stats for key, stats in STAGE_SECONDS.summary().items()},
+    }
+
+
+def reset():
+    '''Clears every metric value and the recent span log'''
+    REGISTRY.clear()
+    with _recent_lock:
+        _recent_spans.clear()
+
+
+def write_openmetrics(file_path, registry:MetricsRegistry = REGISTRY) -> Path:
+    '''Writes the current metrics to an OpenMetrics text file'''
+    file_path = Path(file_path)
+    temp_path = file_path.with_name(f".{file_path.name}.tmp")
+    temp_path.write_text(registry.render_openmetrics(), encoding='utf-8')
+    temp_path.replace(file_path)
+    return file_path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        if 'application/openmetrics-text' in self.headers.get('Accept', ''):
+            body, content_type = self.registry.render_openmetrics(), OPENMETRICS_CONTENT_TYPE
+        else:
+            body, content_type = self.registry.render_prometheus(), PROMETHEUS_CONTENT_TYPE
+
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_http_server(port:int, address:str = '127.0.0.1',
+                      registry:MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    '''Serves the metrics at /metrics from a background thread. Pass port 0 to
+    pick a free port, available as server.server_port'''
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((address, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-server').start()
+    logger.info(f"Serving metrics on http://{address}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,207 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import ast
+import json
+import logging
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Characters that change the scanner state outside and inside JSON strings
+_STRUCTURE_CHARS = re.compile(r'[{}"\n]')
+_STRING_CHARS = re.compile(r'["\\]')
+
+
+class ParseResult(NamedTuple):
+    '''Records salvaged from a model response and the number of objects rejected'''
+    records: list[dict]
+    rejected: int
+
+
+def schema_fields(input_user_schema:str) -> list[str]:
+    '''Returns the field names of a formatted schema'''
+    try:
+        schema = ast.literal_eval(input_user_schema.strip())
+    except (ValueError, SyntaxError, AttributeError):
+        raise ValueError("Schema must be a formatted field dictionary")
+
+    if not isinstance(schema, dict) or not schema:
+        raise ValueError("Schema must be a formatted field dictionary")
+
+    return [str(field) for field in schema]
+
+
+def validate_record(record:dict, fields:Optional[list[str]]) -> Optional[dict]:
+    '''Returns the record restricted to the schema fields, in schema order, or
+    None if any field is missing'''
+    if fields is None:
+        return record
+
+    if any(field not in record for field in fields):
+        return None
+
+    return {field: record[field] for field in fields}
+
+
+class RecordScanner:
+    '''Incrementally extracts records from model output. Anything between
+    top-level objects (markdown fences, array brackets, commas, prose) is
+    ignored. Objects that fail to parse, miss schema fields, or are still open
+    when the output ends or a new object starts a line are rejected'''
+
+    def __init__(self, fields:Optional[list[str]] = None):
+        self.fields = fields
+        self.malformed = 0
+        self.invalid = 0
+        self.truncated = 0
+        self._reset()
+
+    def _reset(self):
+        self._pending = ''
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def rejected(self) -> int:
+        '''Number of objects dropped so far'''
+        return self.malformed + self.invalid + self.truncated
+
+    def _emit(self, text:str, records:list):
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed record: {text[:80]}")
+            self.malformed += 1
+            return
+
+        record = validate_record(record, self.fields)
+        if record is None:
+            logger.warning(f"Skipping record with missing fields: {text[:80]}")
+            self.invalid += 1
+            return
+
+        records.append(record)
+
+    def feed(self, text:str) -> list[dict]:
+        '''Adds output text and returns the valid records it completed'''
+        records = []
+        buffer = self._pending + text
+        i = self._scan
+        start = 0
+        n = len(buffer)
+
+        while i < n:
+            if self._depth == 0:
+                start = buffer.find('{', i)
+                if start < 0:
+                    i = n
+                    break
+                self._depth = 1
+                i = start + 1
+                continue
+
+            if self._escaped:
+                self._escaped = False
+                i += 1
+                continue
+
+            match = (_STRING_CHARS if self._in_string else _STRUCTURE_CHARS).search(buffer, i)
+            if match is None:
+                i = n
+                break
+
+            char = match.group()
+            i = match.end()
+
+            if self._in_string:
+                if char == '\\':
+                    # Skip the escaped character, which may arrive in the next chunk
+                    if i < n:
+                        i += 1
+                    else:
+                        self._escaped = True
+                else:
+                    self._in_string = False
+            elif char == '\n':
+                if i == n:
+                    # Check the character after the newline once it arrives
+                    i = match.start()
+                    break
+                if buffer[i] == '{':
+                    # A record starting on a new line while one is still open
+                    # means the open one was cut off
+                    logger.warning(f"Dropping truncated record: {buffer[start:i][:80]}")
+                    self.truncated += 1
+                    start = i
+                    self._depth = 1
+                    i += 1
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[start:i], records)
+
+        # Keep only the unfinished object for the next chunk
+        if self._depth == 0:
+            self._pending = ''
+            self._scan = 0
+        else:
+            self._pending = buffer[start:]
+            self._scan = i - start
+
+        return records
+
+    def finish(self):
+        '''Marks the end of the output, counting any unfinished object as truncated'''
+        if self._depth > 0:
+            logger.warning(f"Dropping truncated record: {self._pending[:80]}")
+            self.truncated += 1
+
+        self._reset()
+
+
+def iter_records(chunks:Iterable[str], fields:Optional[list[str]] = None) -> Iterator[dict]:
+    '''Yields valid records from streamed text chunks as soon as each object
+    completes'''
+    scanner = RecordScanner(fields)
+
+    for chunk in chunks:
+        yield from scanner.feed(chunk)
+
+    scanner.finish()
+
+    if scanner.rejected:
+        logger.warning(f"Rejected {scanner.rejected} malformed, truncated or incomplete records")
+
+
+def iter_records_from_lines(lines:Iterable[str], fields:Optional[list[str]] = None) -> Iterator[dict]:
+    '''Yields valid records from an iterable of NDJSON lines'''
+    return iter_records((line + '\n' for line in lines), fields)
+
+
+def parse_records(content:str, fields:Optional[list[str]] = None) -> ParseResult:
+    '''Salvages every valid record from a complete model response'''
+    scanner = RecordScanner(fields)
+    records = scanner.feed(content)
+    scanner.finish()
+
+    return ParseResult(records, scanner.rejected)
@@ -0,0 +1,131 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import ast
+import json
+import math
+import logging
+from typing import Iterable, Optional
+
+from inference.clients import DEFAULT_MODEL
+from inference.disk_cache import canonicalize_schema
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = '''Generate {num_records} records as line delimited JSON, one object per line, no markdown.
+Fields: {input_user_schema}
+'''
+
+UNIQUE_PROMPT_TEMPLATE = '''Every record must have a different value for: {unique_fields}. Avoid common example values.
+'''
+
+# Gives each seeded batch its own prompt, so batches of a run differ from each
+# other and each is cached separately
+SEED_PROMPT_TEMPLATE = '''Variation: {seed}
+'''
+
+# Rough text length of one token for Gemini models
+CHARS_PER_TOKEN = 4
+
+# Used when the schema cannot be parsed into fields
+ESTIMATED_TOKENS_PER_RECORD = 40
+
+# Estimated size of a generated value, and of one whose description asks for prose
+VALUE_TOKENS = 8
+LONG_VALUE_TOKENS = 60
+_LONG_VALUE_HINTS = re.compile(r'paragraph|sentence|description|review|summary|comment|bio|text|address', re.IGNORECASE)
+
+# Maximum output tokens per response
+MODEL_OUTPUT_TOKEN_LIMITS = {
+    'gemini-2.5-pro': 65536,
+    'gemini-2.5-flash': 65536,
+    'gemini-2.5-flash-lite': 65536,
+    'gemini-2.0-flash': 8192,
+    'gemini-2.0-flash-lite': 8192,
+    'gemini-1.5-pro': 8192,
+    'gemini-1.5-flash': 8192,
+}
+DEFAULT_OUTPUT_TOKEN_LIMIT = 8192
+
+# Share of the output window a batch is sized to fill. The rest absorbs
+# estimation error and, on thinking models, reasoning tokens
+OUTPUT_TOKEN_HEADROOM = 0.75
+
+
+def compact_schema(input_user_schema:str) -> str:
+    '''Returns the schema as compact JSON in field order'''
+    return canonicalize_schema(input_user_schema)
+
+
+def build_prompt(num_records:int, input_user_schema:str, unique_fields:Optional[list[str]] = None,
+                 seed:Optional[int] = None) -> str:
+    '''Fills in the generation prompt with the compact schema, asking for
+    distinct values of any unique fields'''
+    prompt = PROMPT_TEMPLATE.format(num_records=num_records, input_user_schema=compact_schema(input_user_schema))
+    if unique_fields:
+        prompt += UNIQUE_PROMPT_TEMPLATE.format(unique_fields=', '.join(unique_fields))
+    if seed is not None:
+        prompt += SEED_PROMPT_TEMPLATE.format(seed=seed)
+    return prompt
+
+
+def estimate_tokens(text:str) -> int:
+    '''Estimates the number of tokens in a text'''
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_record_tokens(input_user_schema:str, sample:Optional[Iterable[dict]] = None) -> int:
+    '''Estimates the output tokens of one line delimited record. A sample of
+    real records gives the largest of their sizes; otherwise each field is
+    sized from its description'''
+    if sample is not None:
+        sizes = [estimate_tokens(json.dumps(record, ensure_ascii=False)) + 1 for record in sample]
+        if sizes:
+            return max(sizes)
+
+    try:
+        schema = ast.literal_eval(input_user_schema.strip())
+    except (ValueError, SyntaxError, AttributeError):
+        return ESTIMATED_TOKENS_PER_RECORD
+    if not isinstance(schema, dict) or not schema:
+        return ESTIMATED_TOKENS_PER_RECORD
+
+    tokens = 1
+    for field, description in schema.items():
+        long_value = _LONG_VALUE_HINTS.search(str(description))
+        # Key, quotes, colon and separator
+        tokens += estimate_tokens(json.dumps(str(field))) + 2
+        tokens += LONG_VALUE_TOKENS if long_value else VALUE_TOKENS
+    return tokens
+
+
+def output_token_limit(model:str = DEFAULT_MODEL) -> int:
+    '''Returns the maximum output tokens of a model. GEMINI_MAX_OUTPUT_TOKENS
+    overrides the built-in table'''
+    override = os.getenv("GEMINI_MAX_OUTPUT_TOKENS")
+    if override:
+        return int(override)
+    return MODEL_OUTPUT_TOKEN_LIMITS.get(model, DEFAULT_OUTPUT_TOKEN_LIMIT)
+
+
+def choose_batch_size(input_user_schema:str, max_batch_size:int, model:str = DEFAULT_MODEL,
+                      sample:Optional[Iterable[dict]] = None) -> int:
+    '''Returns the largest number of records, up to max_batch_size, whose
+    estimated output fits in the model's output window'''
+    record_tokens = estimate_record_tokens(input_user_schema, sample)
+    budget = output_token_limit(model) * OUTPUT_TOKEN_HEADROOM
+    return max(1, min(max_batch_size, int(budget // record_tokens)))
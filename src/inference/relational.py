@@ -0,0 +1,294 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import logging
+import threading
+from array import array
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, NamedTuple, Optional, Union
+
+import utils
+from inference.batch import GENERATION_MODES, iter_generated_records, read_schema_file, schema_to_fields
+from inference.generator import format_user_input, get_unique_fields
+from inference.engine import DEFAULT_MAX_WORKERS, MAX_TOTAL_RECORDS, ProgressCallback, derive_seed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Child rows per parent row when a table does not set per_parent
+DEFAULT_PER_PARENT = (1, 3)
+
+_COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class Table(NamedTuple):
+    '''One table of a relational schema. Rows of a child table belong to a row
+    of its parent table through a foreign key named after the parent's key,
+    and references add foreign keys to rows of other tables chosen at random'''
+    name: str
+    fields: dict
+    rows: Optional[int] = None
+    key: Optional[str] = None
+    key_format: Optional[str] = None
+    parent: Optional[str] = None
+    per_parent: tuple[int, int] = DEFAULT_PER_PARENT
+    references: dict = {}
+
+    def foreign_keys(self, tables:dict) -> dict[str, str]:
+        '''Returns the foreign key fields of the table and the table each refers to'''
+        keys = {tables[self.parent].key: self.parent} if self.parent else {}
+        keys.update(self.references)
+        return keys
+
+
+def _parse_table(name:str, spec) -> Table:
+    '''Builds a Table from its schema entry'''
+    if not isinstance(spec, dict):
+        raise ValueError(f"Table {name} must be a mapping")
+
+    fields = spec.get('fields') or {}
+    if not isinstance(fields, dict):
+        raise ValueError(f"Fields of table {name} must be a mapping of field names to descriptions")
+
+    references = spec.get('references') or {}
+    if not isinstance(references, dict):
+        raise ValueError(f"References of table {name} must map field names to tables")
+
+    rows = spec.get('rows')
+    parent = spec.get('parent')
+    if parent is None and (not isinstance(rows, int) or rows < 1):
+        raise ValueError(f"Table {name} needs a positive row count or a parent table")
+    if parent is not None and rows is not None:
+        raise ValueError(f"Table {name} has a parent, so its row count comes from per_parent")
+
+    per_parent = spec.get('per_parent', DEFAULT_PER_PARENT)
+    if isinstance(per_parent, int):
+        per_parent = (per_parent, per_parent)
+    try:
+        low, high = (int(count) for count in per_parent)
+    except (TypeError, ValueError):
+        raise ValueError(f"per_parent of table {name} must be a count or a [min, max] range")
+    if low < 0 or high < low:
+        raise ValueError(f"per_parent of table {name} must be a range with 0 <= min <= max")
+
+    return Table(name=str(name), fields=fields, rows=rows, key=spec.get('key'), key_format=spec.get('key_format'),
+                 parent=parent, per_parent=(low, high), references={str(k): str(v) for k, v in references.items()})
+
+
+def load_tables(schema:Union[dict, str, Path]) -> dict[str, Table]:
+    '''Reads a relational schema from a mapping or a JSON or YAML file. The
+    schema holds a "tables" mapping of table names to entries with "fields"
+    plus either "rows" or a "parent" table and a "per_parent" count or
+    [min, max] range. A table other tables refer to needs a "key" field, whose
+    values are row numbers from 1 or, with "key_format", formatted row numbers'''
+    if not isinstance(schema, dict):
+        schema = read_schema_file(schema)
+
+    specs = schema.get('tables') if isinstance(schema, dict) else None
+    if not isinstance(specs, dict) or not specs:
+        raise ValueError('Relational schema must hold a "tables" mapping')
+
+    tables = {str(name): _parse_table(str(name), spec) for name, spec in specs.items()}
+
+    for table in tables.values():
+        targets = ([table.parent] if table.parent else []) + list(table.references.values())
+        for target in targets:
+            if target not in tables:
+                raise ValueError(f"Table {table.name} refers to unknown table {target}")
+            if not tables[target].key:
+                raise ValueError(f"Table {target} is referred to by {table.name} but has no key field")
+
+        generated = [table.key, tables[table.parent].key if table.parent else None, *table.references]
+        generated = [field for field in generated if field]
+        clashes = sorted({field for field in generated if field in table.fields or generated.count(field) > 1})
+        if clashes:
+            raise ValueError(f"Key fields of table {table.name} are defined more than once: {', '.join(clashes)}")
+
+    return tables
+
+
+def plan_order(tables:dict[str, Table]) -> list[str]:
+    '''Orders tables so that every table comes after the tables it refers to,
+    keeping the schema order where it is free'''
+    remaining = {name: set(table.foreign_keys(tables).values()) for name, table in tables.items()}
+    order = []
+
+    while remaining:
+        ready = [name for name, needs in remaining.items() if needs <= set(order)]
+        if not ready:
+            raise ValueError(f"Tables refer to each other in a cycle: {', '.join(remaining)}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+
+    return order
+
+
+class KeyIndex:
+    '''Primary keys of the planned tables and the parent row of every child
+    row. Keys are row numbers, so a table's keys take constant memory, and
+    parent rows are held in a compact unsigned integer array'''
+
+    def __init__(self):
+        self._rows: dict[str, int] = {}
+        self._formats: dict[str, Optional[str]] = {}
+        self._parents: dict[str, array] = {}
+
+    def add_table(self, name:str, rows:int, key_format:Optional[str] = None,
+                  parents:Optional[array] = None):
+        self._rows[name] = rows
+        self._formats[name] = key_format
+        if parents is not None:
+            self._parents[name] = parents
+
+    def rows(self, name:str) -> int:
+        return self._rows[name]
+
+    def key(self, name:str, row:int):
+        '''Returns the key of a zero-based row of a table'''
+        key_format = self._formats[name]
+        return key_format.format(row + 1) if key_format else row + 1
+
+    def parent_row(self, name:str, row:int) -> int:
+        '''Returns the parent row of a zero-based row of a child table'''
+        return self._parents[name][row]
+
+    def sample(self, name:str, rng:random.Random):
+        '''Returns the key of a random row of a table'''
+        return self.key(name, rng.randrange(self._rows[name]))
+
+
+def _assign_parents(parent_rows:int, per_parent:tuple[int, int], rng:random.Random) -> array:
+    '''Draws a child count for every parent row and returns the parent row of
+    each child, grouped by parent'''
+    low, high = per_parent
+    parents = array('I')
+    for row in range(parent_rows):
+        parents.extend([row] * rng.randint(low, high))
+    return parents
+
+
+def plan_tables(tables:dict[str, Table], seed:Optional[int] = None,
+                max_records:int = MAX_TOTAL_RECORDS) -> tuple[list[str], KeyIndex]:
+    '''Fixes the generation order and the row count and keys of every table.
+    Parents are planned first, so child rows can be generated in parallel
+    against the key index without waiting for parent rows'''
+    order = plan_order(tables)
+    rng = random.Random(seed)
+    index = KeyIndex()
+
+    for name in order:
+        table = tables[name]
+        if table.parent:
+            parents = _assign_parents(index.rows(table.parent), table.per_parent, rng)
+            index.add_table(name, len(parents), table.key_format, parents)
+        else:
+            index.add_table(name, table.rows, table.key_format)
+
+        empty = [target for target in table.references.values() if index.rows(target) == 0]
+        if index.rows(name) and empty:
+            raise ValueError(f"Table {name} refers to tables with no rows: {', '.join(empty)}")
+        if index.rows(name) > max_records:
+            raise ValueError(f"Table {name} plans {index.rows(name)} rows, more than the limit of {max_records}")
+        logger.info(f"Planned {index.rows(name)} rows for table {name}")
+
+    return order, index
+
+
+def _value_records(table:Table, rows:int, mode:str, concurrency:int, batch_size:Optional[int],
+                   progress_callback:Optional[ProgressCallback], seed:Optional[int]) -> Iterator[dict]:
+    '''Yields the generated (non-key) values of a table's rows'''
+    if rows == 0:
+        return iter(())
+    if not table.fields:
+        return ({} for _ in range(rows))
+
+    fields = schema_to_fields(table.fields)
+    return iter_generated_records(format_user_input(fields), rows, mode, concurrency, batch_size,
+                                  progress_callback, get_unique_fields(fields), seed=seed)
+
+
+def iter_table_records(table:Table, tables:dict[str, Table], index:KeyIndex, mode:str = 'model',
+                       concurrency:int = DEFAULT_MAX_WORKERS, batch_size:Optional[int] = None,
+                       seed:Optional[int] = None,
+                       progress_callback:Optional[ProgressCallback] = None) -> Iterator[dict]:
+    '''Yields the rows of a table with its key and foreign keys filled in from
+    the key index, followed by the generated fields'''
+    seed = None if seed is None else derive_seed(seed, table.name)
+    rng = random.Random(seed)
+    parent_key = tables[table.parent].key if table.parent else None
+    values = _value_records(table, index.rows(table.name), mode, concurrency, batch_size, progress_callback, seed)
+
+    for row, record in enumerate(values):
+        keys = {}
+        if table.key:
+            keys[table.key] = index.key(table.name, row)
+        if parent_key:
+            keys[parent_key] = index.key(table.parent, index.parent_row(table.name, row))
+        for field, target in table.references.items():
+            keys[field] = index.sample(target, rng)
+        keys.update(record)
+        yield keys
+
+
+def generate_tables(schema:Union[dict, str, Path], output_dir, fmt:str = 'ndjson', mode:str = 'model',
+                    concurrency:int = DEFAULT_MAX_WORKERS, batch_size:Optional[int] = None,
+                    compression:Optional[str] = None, seed:Optional[int] = None,
+                    progress_callback:Optional[ProgressCallback] = None) -> dict[str, int]:
+    '''Generates every table of a relational schema into one file per table in
+    output_dir, named after the table. Keys are planned up front and all tables
+    are generated at the same time, so foreign keys are valid without a join
+    afterwards. Returns the number of rows written per table'''
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unsupported generation mode: {mode}. Choose from: {', '.join(GENERATION_MODES)}")
+
+    output_dir = Path(output_dir)
+    if not output_dir.is_dir():
+        raise ValueError(f"Output directory does not exist: {output_dir}")
+
+    tables = load_tables(schema)
+    order, index = plan_tables(tables, seed)
+    total = sum(index.rows(name) for name in order)
+    completed = {name: 0 for name in order}
+    lock = threading.Lock()
+
+    def table_progress(name:str):
+        def report(done:int, _total:int):
+            with lock:
+                completed[name] = done
+                progress = sum(completed.values())
+            progress_callback(progress, total)
+        return report if progress_callback else None
+
+    def write_table(name:str) -> int:
+        path = output_dir / f"{name}.{fmt}{_COMPRESSION_SUFFIXES.get(compression, '')}"
+        records = iter_table_records(tables[name], tables, index, mode, concurrency, batch_size, seed,
+                                     table_progress(name))
+        return utils.write_records(records, path, fmt, compression)
+
+    logger.info(f"Generating {total} rows across {len(order)} tables")
+
+    counts = {}
+    # Parents are submitted first, but every table can run at once since its keys are planned
+    executor = ThreadPoolExecutor(max_workers=len(order))
+    try:
+        futures = {executor.submit(write_table, name): name for name in order}
+        for future in as_completed(futures):
+            counts[futures[future]] = future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return {name: counts[name] for name in order}
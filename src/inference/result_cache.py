@@ -0,0 +1,152 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import ast
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from inference.backends import default_model_identity
+from inference.clients import DEFAULT_TEMPERATURE
+from inference.metrics import CACHE_HITS, CACHE_MISSES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_TTL_SECONDS = 3600.0
+
+# Results shared across app sessions; a size of 0 keeps results per session only
+SHARED_CACHE_SIZE = int(os.getenv("DATA_GENERATOR_SHARED_CACHE_SIZE", "0"))
+SHARED_CACHE_TTL_SECONDS = float(os.getenv("DATA_GENERATOR_SHARED_CACHE_TTL", str(DEFAULT_TTL_SECONDS)))
+
+CacheKey = tuple[str, int, str, float, str, tuple]
+
+
+def _normalize(text) -> str:
+    return ' '.join(str(text).split()).casefold()
+
+
+def normalize_schema(formatted_schema:str) -> str:
+    '''Returns the form of a formatted schema that near-duplicate requests
+    share: fields sorted by name, with whitespace collapsed and casing folded
+    in names and descriptions. A schema whose field names only differ by case
+    keeps its own field names'''
+    if not formatted_schema or not formatted_schema.strip():
+        raise ValueError("Schema cannot be empty")
+
+    try:
+        schema = ast.literal_eval(formatted_schema.strip())
+    except (ValueError, SyntaxError):
+        return _normalize(formatted_schema)
+
+    if not isinstance(schema, dict):
+        return _normalize(formatted_schema)
+
+    fields = {_normalize(name): _normalize(description) for name, description in schema.items()}
+    if len(fields) < len(schema):
+        fields = {str(name).strip(): _normalize(description) for name, description in schema.items()}
+
+    return json.dumps(sorted(fields.items()), separators=(',', ':'), ensure_ascii=False)
+
+
+def remap_records(records:list[dict], fields:list[str]) -> list[dict]:
+    '''Renames and reorders records generated for a near-duplicate schema to
+    the given field names. Records already in that form are returned as is'''
+    if not records or list(records[0]) == fields:
+        return records
+
+    remapped = []
+    for record in records:
+        values = {_normalize(name): value for name, value in record.items()}
+        remapped.append({field: values.get(_normalize(field)) for field in fields})
+    return remapped
+
+
+def map_fields(source:list[str], fields:list[str]) -> Optional[dict[str, str]]:
+    '''Returns the source field matching each of the given fields of a
+    near-duplicate schema, in their order, or None when the fields already match'''
+    if not source or source == fields:
+        return None
+    by_name = {_normalize(name): name for name in source}
+    return {by_name[_normalize(field)]: field for field in fields}
+
+
+def make_cache_key(formatted_schema:str, num_records:int,
+                   model:Optional[str] = None, temperature:float = DEFAULT_TEMPERATURE,
+                   mode:str = 'model', unique_fields:Optional[list[str]] = None) -> CacheKey:
+    '''Builds the lookup key for a generated result from the normalized schema
+    and the generation settings, so near-duplicate schemas share a key. The
+    model defaults to the one configured by DATA_GENERATOR_BACKENDS'''
+    model = model or default_model_identity()
+    return (normalize_schema(formatted_schema), num_records, model, float(temperature), mode,
+            tuple(sorted(_normalize(field) for field in unique_fields or ())))
+
+
+class ResultCache:
+    '''Thread-safe in-memory cache of generated results with LRU and TTL
+    eviction. Hits and misses are counted under the given cache name'''
+
+    def __init__(self, max_entries:int = DEFAULT_MAX_ENTRIES, ttl_seconds:Optional[float] = DEFAULT_TTL_SECONDS,
+                 clock:Callable[[], float] = time.monotonic, name:str = 'memory'):
+        if max_entries < 1:
+            raise ValueError("Cache must hold at least one entry")
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key:CacheKey) -> Optional[Any]:
+        '''Returns the cached result for a key, or None if missing or expired'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                CACHE_MISSES.inc(cache=self.name)
+                return None
+
+            stored_at, value = entry
+            if self.ttl_seconds is not None and self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                CACHE_MISSES.inc(cache=self.name)
+                return None
+
+            self._entries.move_to_end(key)
+            CACHE_HITS.inc(cache=self.name)
+            return value
+
+    def put(self, key:CacheKey, value:Any):
+        '''Stores a result, evicting the least recently used entries over capacity'''
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                logger.info(f"Evicted least recently used entry from {self.name} cache")
+
+    def clear(self):
+        '''Removes every cached result'''
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,236 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import heapq
+import time
+import random
+import logging
+import itertools
+import threading
+from typing import Callable, Optional, TypeVar
+
+from inference.metrics import QUEUE_DEPTH, RETRIES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# The request rate never drops below this share of the configured quota
+MIN_RATE_FRACTION = 0.1
+
+_RATE_LIMIT_CODES = (429, 503)
+_RATE_LIMIT_MARKERS = ('429', '503', 'resource_exhausted', 'resourceexhausted', 'rate limit',
+                       'quota', 'unavailable', 'overloaded')
+
+T = TypeVar('T')
+
+
+def is_rate_limit_error(error:Exception) -> bool:
+    '''Returns whether an error means the provider is throttling or overloaded'''
+    for attribute in ('code', 'status_code'):
+        code = getattr(error, attribute, None)
+        code = getattr(code, 'value', code)
+        if code in _RATE_LIMIT_CODES:
+            return True
+
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    '''Refills continuously at a per-minute rate up to a burst capacity'''
+
+    def __init__(self, rate_per_minute:float, capacity:Optional[float] = None,
+                 clock:Callable[[], float] = time.monotonic):
+        if rate_per_minute <= 0:
+            raise ValueError("Rate must be positive")
+
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+
+    def wait_time(self, amount:float) -> float:
+        '''Returns the seconds until amount is available'''
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) * 60 / self.rate_per_minute
+
+    def consume(self, amount:float):
+        '''Takes amount from the bucket. The level may go negative to account
+        for usage that exceeded an estimate'''
+        self._refill()
+        self._level -= min(amount, self.capacity) if amount > 0 else amount
+
+    def set_rate(self, rate_per_minute:float):
+        '''Changes the refill rate without changing the burst capacity'''
+        self._refill()
+        self.rate_per_minute = rate_per_minute
+
+
+class RequestScheduler:
+    '''Admits model requests in priority order under request-per-minute and
+    token-per-minute limits. Throttling errors are retried with exponential
+    backoff and full jitter, and also lower the request rate, which then
+    recovers gradually on success so throughput settles near the quota'''
+
+    def __init__(self, requests_per_minute:float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute:float = DEFAULT_TOKENS_PER_MINUTE,
+                 max_attempts:int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay:float = DEFAULT_BASE_DELAY,
+                 max_delay:float = DEFAULT_MAX_DELAY,
+                 burst:Optional[float] = None,
+                 clock:Callable[[], float] = time.monotonic,
+                 sleep:Callable[[float], None] = time.sleep):
+        if max_attempts < 1:
+            raise ValueError("Attempts must be at least 1")
+
+        self.max_requests_per_minute = requests_per_minute
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(requests_per_minute, burst, clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self._sleep = sleep
+        self._waiting: list = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.throttled = 0
+
+    @property
+    def queue_depth(self) -> int:
+        '''Number of requests waiting for admission'''
+        with self._condition:
+            return len(self._waiting)
+
+    @property
+    def requests_per_minute(self) -> float:
+        '''Current, possibly reduced, request rate'''
+        with self._condition:
+            return self._requests.rate_per_minute
+
+    def stats(self) -> dict:
+        '''Returns the scheduler state for monitoring'''
+        with self._condition:
+            return {
+                'queue_depth': len(self._waiting),
+                'requests_per_minute': self._requests.rate_per_minute,
+                'max_requests_per_minute': self.max_requests_per_minute,
+                'throttled': self.throttled,
+            }
+
+    def acquire(self, priority:int = PRIORITY_BULK, tokens:float = 0):
+        '''Blocks until the request is at the head of the queue and both limits
+        have capacity'''
+        ticket = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            if len(self._waiting) > 1:
+                logger.info(f"Request queued behind {len(self._waiting) - 1} others")
+
+            while True:
+                if self._waiting[0] == ticket:
+                    wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+                    if wait == 0:
+                        heapq.heappop(self._waiting)
+                        self._requests.consume(1)
+                        self._tokens.consume(tokens)
+                        self._condition.notify_all()
+                        return
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+
+    def record_tokens(self, estimated:float, actual:float):
+        '''Corrects the token bucket once the real usage of a request is known'''
+        with self._condition:
+            self._tokens.consume(actual - estimated)
+
+    def on_success(self):
+        '''Raises the request rate back toward the quota after a successful call'''
+        with self._condition:
+            rate = self._requests.rate_per_minute
+            if rate < self.max_requests_per_minute:
+                self._requests.set_rate(min(self.max_requests_per_minute, rate + self.max_requests_per_minute * 0.05))
+
+    def on_throttled(self):
+        '''Halves the request rate after the provider throttles a call'''
+        RETRIES.inc(reason='throttled')
+        with self._condition:
+            self.throttled += 1
+            rate = max(self.max_requests_per_minute * MIN_RATE_FRACTION, self._requests.rate_per_minute / 2)
+            self._requests.set_rate(rate)
+            logger.warning(f"Rate limited, lowering request rate to {rate:.1f}/min")
+
+    def backoff_delay(self, attempt:int) -> float:
+        '''Returns a jittered delay for a retry attempt, starting at 0'''
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, fn:Callable[[], T], priority:int = PRIORITY_BULK, tokens:float = 0) -> T:
+        '''Runs fn once admitted, retrying throttling errors with backoff'''
+        attempt = 0
+        while True:
+            self.acquire(priority, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+
+                self.on_throttled()
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+
+                delay = self.backoff_delay(attempt - 1)
+                logger.warning(f"Retrying throttled request in {delay:.1f}s (attempt {attempt + 1})")
+                self._sleep(delay)
+                continue
+
+            self.on_success()
+            return result
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    '''Returns the scheduler shared by every request in the process'''
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+            QUEUE_DEPTH.set_function(lambda: _scheduler.queue_depth)
+        return _scheduler
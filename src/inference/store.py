@@ -0,0 +1,230 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Initial rows allocated per column; capacity doubles as records arrive
+INITIAL_CAPACITY = 1024
+
+# Values looked up in a column's dictionary without serializing them first
+SCALAR_TYPES = (int, float, bool, type(None))
+
+# Records encoded together when a store is extended
+APPEND_CHUNK_ROWS = 1024
+
+# Rows joined into each text chunk when streaming the store as NDJSON
+DEFAULT_CHUNK_ROWS = 10_000
+
+
+class _Column:
+    '''Dictionary-encoded column. Each distinct value is stored once as its
+    JSON text and rows hold an int32 code into that dictionary. Once the
+    column is complete, compact packs the dictionary into one UTF-8 buffer
+    with offsets, so distinct values no longer cost a Python object each'''
+
+    def __init__(self):
+        self.codes = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self.values: Optional[list[str]] = []
+        self.index: Optional[dict] = {}
+        self.buffer: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+
+    def append(self, row:int, value):
+        if self.index is None:
+            raise ValueError("Cannot append to a compacted record store")
+
+        if row == len(self.codes):
+            self.codes = np.concatenate([self.codes, np.empty(len(self.codes), dtype=np.int32)])
+        self.codes[row] = self._encode(value)
+
+    def extend(self, rows:int, values:list):
+        '''Encodes values as the rows following the first rows of the column'''
+        if self.index is None:
+            raise ValueError("Cannot append to a compacted record store")
+
+        codes = [self._encode(value) for value in values]
+        needed = rows + len(codes)
+        if needed > len(self.codes):
+            grown = np.empty(max(needed, 2 * len(self.codes)), dtype=np.int32)
+            grown[:rows] = self.codes[:rows]
+            self.codes = grown
+        self.codes[rows:needed] = codes
+
+    def _encode(self, value) -> int:
+        # Scalars are looked up as they are, so only new values are serialized.
+        # The type keeps 1, 1.0 and True apart
+        kind = type(value)
+        if kind is str:
+            key = value
+        elif kind in SCALAR_TYPES:
+            key = (kind, value)
+        else:
+            key = (json.dumps(value),)
+        code = self.index.get(key)
+        if code is None:
+            code = self.index[key] = len(self.values)
+            self.values.append(json.dumps(value))
+        return code
+
+    def compact(self, rows:int):
+        encoded = [text.encode('utf-8') for text in self.values]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self.codes = self.codes[:rows].copy()
+        self.values = None
+        self.index = None
+
+    def fragments(self, start:int, stop:int) -> np.ndarray:
+        '''Returns the JSON text of rows start to stop, decoding each distinct
+        value once'''
+        codes = self.codes[start:stop]
+        if self.values is not None:
+            fragments = np.empty(len(codes), dtype=object)
+            fragments[:] = [self.values[code] for code in codes.tolist()]
+            return fragments
+
+        distinct, inverse = np.unique(codes, return_inverse=True)
+        lookup = np.empty(len(distinct), dtype=object)
+        lookup[:] = [self.buffer[self.offsets[code]:self.offsets[code + 1]].tobytes().decode('utf-8')
+                     for code in distinct]
+        return lookup[inverse.reshape(-1)]
+
+    @property
+    def nbytes(self) -> int:
+        if self.values is None:
+            return self.codes.nbytes + self.buffer.nbytes + self.offsets.nbytes
+        # Estimate of the Python strings and index entries while building
+        return self.codes.nbytes + sum(len(text) + 120 for text in self.values)
+
+
+class RecordStore:
+    '''Columnar in-memory store of generated records. Records are encoded
+    once as they arrive; previews decode only the rows they show, and NDJSON
+    downloads are assembled from the stored JSON text without serializing the
+    records again. Appends and reads may come from different threads'''
+
+    def __init__(self, fields:Optional[list[str]] = None, _columns:Optional[list[_Column]] = None,
+                 _rows:int = 0):
+        self._fields = list(fields) if fields is not None else None
+        self._columns = _columns if _columns is not None else (
+            [_Column() for _ in self._fields] if self._fields is not None else None)
+        self._rows = _rows
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records:Iterable[dict], fields:Optional[list[str]] = None) -> 'RecordStore':
+        store = cls(fields)
+        store.extend(records)
+        store.compact()
+        return store
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._fields or [])
+
+    @property
+    def compacted(self) -> bool:
+        return bool(self._columns) and self._columns[0].values is None
+
+    def append(self, record:dict):
+        '''Adds one record, as the worker pool does while records arrive'''
+        with self._lock:
+            if self._fields is None:
+                self._fields = list(record)
+                self._columns = [_Column() for _ in self._fields]
+
+            for field, column in zip(self._fields, self._columns):
+                column.append(self._rows, record.get(field))
+            self._rows += 1
+
+    def extend(self, records:Iterable[dict]):
+        '''Adds records. Without fields given up front, they are taken from the
+        first record; fields a record lacks are stored as null'''
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, APPEND_CHUNK_ROWS))
+            if not chunk:
+                return
+
+            with self._lock:
+                if self._fields is None:
+                    self._fields = list(chunk[0])
+                    self._columns = [_Column() for _ in self._fields]
+
+                for field, column in zip(self._fields, self._columns):
+                    column.extend(self._rows, [record.get(field) for record in chunk])
+                self._rows += len(chunk)
+
+    def compact(self):
+        '''Packs every column's dictionary once no more records will be added'''
+        with self._lock:
+            if self._columns and not self.compacted:
+                for column in self._columns:
+                    column.compact(self._rows)
+                logger.info(f"Compacted record store of {self._rows} records to {self.nbytes} bytes")
+
+    def renamed(self, mapping:dict[str, str]) -> 'RecordStore':
+        '''Returns a compacted store sharing this store's columns, with fields
+        renamed from source to target name and ordered as mapping'''
+        self.compact()
+        if self._fields is None:
+            return RecordStore(list(mapping.values()))
+        columns = [self._columns[self._fields.index(source)] for source in mapping]
+        return RecordStore(list(mapping.values()), columns, self._rows)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _fragments(self, start:int, stop:Optional[int]) -> tuple[int, int, list[np.ndarray]]:
+        with self._lock:
+            stop = self._rows if stop is None else min(stop, self._rows)
+            start = min(start, stop)
+            return start, stop, [column.fragments(start, stop) for column in self._columns or []]
+
+    def rows(self, start:int = 0, stop:Optional[int] = None) -> list[dict]:
+        '''Decodes records start to stop, for a preview page'''
+        start, stop, fragments = self._fragments(start, stop)
+        columns = [[json.loads(text) for text in column] for column in fragments]
+        return [dict(zip(self._fields, values)) for values in zip(*columns)]
+
+    def iter_lines(self, start:int = 0, stop:Optional[int] = None) -> Iterator[str]:
+        '''Yields records start to stop as JSON lines, byte-for-byte what
+        json.dumps would write for each record'''
+        start, stop, fragments = self._fragments(start, stop)
+        keys = [json.dumps(field) + ': ' for field in self._fields or []]
+        for values in zip(*fragments):
+            yield '{' + ', '.join(key + value for key, value in zip(keys, values)) + '}'
+
+    def iter_chunks(self, chunk_rows:int = DEFAULT_CHUNK_ROWS) -> Iterator[str]:
+        '''Yields the whole store as newline delimited JSON, chunk_rows records
+        at a time'''
+        rows = len(self)
+        for start in range(0, rows, chunk_rows):
+            text = '\n'.join(self.iter_lines(start, start + chunk_rows))
+            yield text if start + chunk_rows >= rows else text + '\n'
+
+    @property
+    def nbytes(self) -> int:
+        '''Approximate memory held by the store'''
+        return sum(column.nbytes for column in self._columns or [])
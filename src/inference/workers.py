@@ -0,0 +1,225 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from inference.metrics import CACHE_HITS
+from inference.store import RecordStore
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Generations run at once across every app session. Work is mostly waiting on
+# the model, so threads share the process-wide request scheduler and quota
+DEFAULT_WORKERS = int(os.getenv("DATA_GENERATOR_APP_WORKERS", "4"))
+
+# How long a finished task is kept for a session to collect its result
+FINISHED_TASK_TTL_SECONDS = 600.0
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class Task:
+    '''A generation submitted to the worker pool. The worker thread appends
+    records to a columnar store as they arrive, so a poll can show partial
+    results and sessions sharing the task read one copy of them'''
+
+    def __init__(self, task_id:str, total:int, key=None):
+        self.id = task_id
+        self.total = total
+        self.key = key
+        # Callers sharing the task. It is only dropped once all have released it
+        self.refs = 1
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.records = RecordStore()
+        # Set by work that reports progress instead of producing records
+        self.progress: Optional[int] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    def snapshot(self, offset:int = 0) -> dict:
+        '''Returns the task's progress and its records from offset on'''
+        records = self.records.rows(offset)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'completed': offset + len(records) if self.progress is None else self.progress,
+            'total': self.total,
+            'error': self.error,
+            'records': records,
+        }
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+
+class WorkerPool:
+    '''Runs generations on background threads and keeps a registry of their
+    tasks, so a result outlives the script run that asked for it. One pool is
+    shared by every session'''
+
+    def __init__(self, max_workers:int = DEFAULT_WORKERS, finished_ttl:float = FINISHED_TASK_TTL_SECONDS,
+                 clock:Callable[[], float] = time.monotonic):
+        if max_workers < 1:
+            raise ValueError("Worker pool needs at least one worker")
+
+        self.finished_ttl = finished_ttl
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation')
+        self._tasks: dict[str, Task] = {}
+        self._keys: dict = {}
+        self._lock = threading.Lock()
+
+    def submit(self, make_records:Callable[[], Iterable[dict]], total:int, key=None) -> str:
+        '''Queues a generation and returns its task ID. make_records is called
+        on a worker thread and returns the records as they are generated. A
+        submit with the key of a task that is still running or has completed
+        joins that task instead of starting another generation'''
+        with self._lock:
+            self._prune()
+            shared = self._keys.get(key) if key is not None else None
+            if shared is not None and shared.status not in ('failed', 'cancelled') and not shared.cancel_requested:
+                shared.refs += 1
+                CACHE_HITS.inc(cache='coalesced')
+                logger.info(f"Joined task {shared.id} ({shared.refs} callers)")
+                return shared.id
+
+            task = Task(uuid.uuid4().hex, total, key)
+            self._tasks[task.id] = task
+            if key is not None:
+                self._keys[key] = task
+
+        self._executor.submit(self._run, task, make_records)
+        logger.info(f"Queued task {task.id} for {total} records")
+        return task.id
+
+    def submit_call(self, call:Callable[[Callable[[int, int], None]], object], total:int) -> str:
+        '''Queues work that reports progress instead of producing records, such
+        as resuming a job, and returns its task ID. call is run on a worker
+        thread with a callback taking the completed and total counts'''
+        task = Task(uuid.uuid4().hex, total)
+        with self._lock:
+            self._prune()
+            self._tasks[task.id] = task
+
+        def on_progress(completed:int, total:int):
+            task.progress = completed
+
+        def make_records():
+            call(on_progress)
+            return ()
+
+        self._executor.submit(self._run, task, make_records)
+        logger.info(f"Queued task {task.id} for {total} records")
+        return task.id
+
+    def get(self, task_id:str) -> Task:
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is None:
+            raise ValueError(f"Unknown task: {task_id}")
+        return task
+
+    def poll(self, task_id:str, offset:int = 0) -> dict:
+        '''Returns the progress of a task and the records added since offset'''
+        return self.get(task_id).snapshot(offset)
+
+    def cancel(self, task_id:str) -> bool:
+        '''Stops a task after the record it is waiting on. A task other callers
+        still share keeps running and only this caller's share is released;
+        returns whether the task was cancelled'''
+        task = self.get(task_id)
+        with self._lock:
+            if task.refs > 1:
+                task.refs -= 1
+                return False
+        task._cancel.set()
+        logger.info(f"Cancel requested for task {task_id}")
+        return True
+
+    def release(self, task_id:str):
+        '''Forgets a task once every caller sharing it has collected its result,
+        cancelling it if it is still running'''
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task.refs -= 1
+            if task.refs > 0:
+                return
+            self._drop(task)
+        task._cancel.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def shutdown(self):
+        '''Cancels every task and waits for the workers to stop'''
+        with self._lock:
+            for task in self._tasks.values():
+                task._cancel.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _prune(self):
+        '''Drops finished tasks nobody collected. Called with the lock held'''
+        now = self._clock()
+        for task in [task for task in self._tasks.values()
+                     if task.finished_at is not None and now - task.finished_at > self.finished_ttl]:
+            self._drop(task)
+
+    def _drop(self, task:Task):
+        '''Removes a task from the registry. Called with the lock held'''
+        del self._tasks[task.id]
+        if task.key is not None and self._keys.get(task.key) is task:
+            del self._keys[task.key]
+
+    def _finish(self, task:Task, status:str, error:Optional[str] = None):
+        task.records.compact()
+        task.error = error
+        task.status = status
+        task.finished_at = self._clock()
+
+    def _run(self, task:Task, make_records:Callable[[], Iterable[dict]]):
+        if task.cancel_requested:
+            self._finish(task, 'cancelled')
+            return
+
+        task.status = 'running'
+        try:
+            records = make_records()
+            try:
+                for record in records:
+                    task.records.append(record)
+                    if task.cancel_requested:
+                        break
+            finally:
+                # Stops the engine's remaining batches
+                if hasattr(records, 'close'):
+                    records.close()
+        except Exception as e:
+            logger.error(f"Task {task.id} failed after {len(task.records)} records: {str(e)}")
+            self._finish(task, 'failed', str(e))
+            return
+
+        self._finish(task, 'cancelled' if task.cancel_requested else 'completed')
+        logger.info(f"Task {task.id} {task.status} with {len(task.records)} records")
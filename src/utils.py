@@ -12,15 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import os
+import csv
+import gzip
+import json
 import platform
 import time
 import logging
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from inference.metrics import span
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Records per Parquet row group or Arrow record batch
+DEFAULT_WRITE_CHUNK_SIZE = 100_000
+
+COMPRESSIONS = ('gzip', 'zstd')
+
 
 def get_default_download_folder() -> Path:
     '''Returns the default Downloads folder path for the current operating system'''
@@ -49,9 +63,12 @@ def get_default_download_folder() -> Path:
         raise
 
 
-def write_string_to_file(download_path:Path, contents:str) -> str:
-    '''Writes content to a file with a timestamp-based filename'''
-    if not contents:
+def write_string_to_file(download_path:Path, contents:Union[str, Iterable[str]]) -> str:
+    '''Writes content to a file with a timestamp-based filename. Content can
+    also be an iterable of strings, which are written as they are produced'''
+    chunks = iter([contents] if isinstance(contents, str) else contents)
+    first = next(chunks, '')
+    if not first:
         raise ValueError("Cannot write empty content to file")
 
     if not download_path.exists():
@@ -62,7 +79,9 @@ def write_string_to_file(download_path:Path, contents:str) -> str:
         logger.info(f"Writing data to file: {file_path}")
 
         with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(contents)
+            f.write(first)
+            for chunk in chunks:
+                f.write(chunk)
 
         logger.info(f"Successfully wrote data to {file_path}")
         return str(file_path)
@@ -75,7 +94,7 @@ def write_string_to_file(download_path:Path, contents:str) -> str:
         raise
 
 
-def write_string_to_downloads(contents:str) -> str:
+def write_string_to_downloads(contents:Union[str, Iterable[str]]) -> str:
     '''Writes content to a file in the default Downloads folder'''
     try:
         download_folder = get_default_download_folder()
@@ -83,3 +102,279 @@ def write_string_to_downloads(contents:str) -> str:
     except Exception as e:
         logger.error(f"Error writing to downloads: {str(e)}")
         raise
+
+
+def _import_pyarrow(fmt:str):
+    '''Imports pyarrow, which is only needed for columnar output'''
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError(f"pyarrow is required for {fmt} output: pip install pyarrow")
+
+    return pyarrow
+
+
+@contextmanager
+def _open_text(file_path:Path, compression:Optional[str]) -> Iterator[io.TextIOBase]:
+    '''Opens a text file for writing, compressing it on the fly if requested'''
+    if compression is None:
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            yield f
+    elif compression == 'gzip':
+        # A fixed timestamp and no embedded file name keep identical records byte-for-byte identical
+        with open(file_path, 'wb') as raw:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as compressed:
+                with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+                    yield f
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstandard is required for zstd compression: pip install zstandard")
+
+        with open(file_path, 'wb') as raw:
+            with zstandard.ZstdCompressor().stream_writer(raw) as compressed:
+                with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+                    yield f
+
+
+def _iter_chunks(records:Iterable[dict], chunk_size:int) -> Iterator[list[dict]]:
+    '''Groups records into lists of at most chunk_size'''
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_ndjson(records:Iterable[dict], file_path:Path, compression:Optional[str], chunk_size:int) -> int:
+    '''Writes one JSON object per line'''
+    count = 0
+    with _open_text(file_path, compression) as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def _write_json(records:Iterable[dict], file_path:Path, compression:Optional[str], chunk_size:int) -> int:
+    '''Writes a JSON array one record at a time'''
+    count = 0
+    with _open_text(file_path, compression) as f:
+        f.write('[')
+        for record in records:
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write('\n]\n' if count else ']\n')
+    return count
+
+
+def _write_csv(records:Iterable[dict], file_path:Path, compression:Optional[str], chunk_size:int) -> int:
+    '''Writes a header from the first record's fields, then one row per record'''
+    writer = None
+    count = 0
+    with _open_text(file_path, compression) as f:
+        for record in records:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(record), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow(record)
+            count += 1
+    return count
+
+
+def _as_text(value) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _chunk_table(pa, chunk:list[dict]):
+    '''Converts a chunk of records to an Arrow table. A column whose values
+    have no common type is written as text'''
+    columns = {}
+    for field in dict.fromkeys(field for record in chunk for field in record):
+        values = [record.get(field) for record in chunk]
+        try:
+            columns[field] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns[field] = pa.array([_as_text(value) for value in values], pa.string())
+    return pa.table(columns)
+
+
+def _promote_type(pa, current, new):
+    '''Returns a type holding values of both types: null and integer columns
+    are widened, and types with nothing in common fall back to text'''
+    if current == new:
+        return current
+    try:
+        merged = pa.unify_schemas([pa.schema([pa.field('value', current)]), pa.schema([pa.field('value', new)])],
+                                  promote_options='permissive')
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+    return merged.field('value').type
+
+
+def _promote_schema(pa, schema, table_schema):
+    '''Returns schema with its types promoted for table_schema's columns and
+    any new columns added at the end'''
+    fields = {field.name: field.type for field in schema}
+    for field in table_schema:
+        fields[field.name] = _promote_type(pa, fields[field.name], field.type) if field.name in fields else field.type
+    return pa.schema(list(fields.items()))
+
+
+def _conform(pa, table, schema):
+    '''Casts a table to schema, filling columns it lacks with nulls'''
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        column = table.column(field.name)
+        if column.type == field.type:
+            columns.append(column)
+        elif field.type == pa.string() and not pa.types.is_primitive(column.type):
+            # Nested values have no cast to text
+            columns.append(pa.array([_as_text(value) for value in column.to_pylist()], pa.string()))
+        else:
+            columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _write_columnar(records:Iterable[dict], file_path:Path, fmt:str, chunk_size:int, open_writer:Callable,
+                    read_tables:Callable) -> int:
+    '''Converts records to Arrow tables one chunk at a time. When a chunk
+    needs wider column types than the file was opened with, such as a column
+    that was all null or integer so far, the chunks written so far are
+    rewritten once with the promoted types'''
+    pa = _import_pyarrow(fmt)
+    writer = None
+    schema = None
+    count = 0
+
+    try:
+        for chunk in _iter_chunks(records, chunk_size):
+            table = _chunk_table(pa, chunk)
+            promoted = table.schema if schema is None else _promote_schema(pa, schema, table.schema)
+
+            if writer is not None and not promoted.equals(schema):
+                logger.info(f"Promoting {fmt} columns to {promoted} after {count} records")
+                writer.close()
+                writer = None
+                written = file_path.with_name(f"{file_path.name}.promote")
+                os.replace(file_path, written)
+                try:
+                    writer = open_writer(pa, promoted)
+                    for written_table in read_tables(pa, written):
+                        writer.write_table(_conform(pa, written_table, promoted))
+                finally:
+                    written.unlink(missing_ok=True)
+
+            if writer is None:
+                writer = open_writer(pa, promoted)
+            schema = promoted
+            writer.write_table(_conform(pa, table, schema))
+            count += len(chunk)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Records cannot be written as {fmt}: {str(e)}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return count
+
+
+def _write_arrow(records:Iterable[dict], file_path:Path, compression:Optional[str], chunk_size:int) -> int:
+    '''Writes an Arrow IPC file with one record batch per chunk'''
+    if compression == 'gzip':
+        raise ValueError("Arrow output supports zstd compression only")
+
+    def open_writer(pa, schema):
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        return pa.ipc.new_file(str(file_path), schema, options=options)
+
+    def read_tables(pa, path):
+        with pa.ipc.open_file(str(path)) as reader:
+            for i in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(i)])
+
+    return _write_columnar(records, file_path, 'arrow', chunk_size, open_writer, read_tables)
+
+
+def _write_parquet(records:Iterable[dict], file_path:Path, compression:Optional[str], chunk_size:int) -> int:
+    '''Writes a Parquet file with one row group per chunk'''
+    def open_writer(pa, schema):
+        return pa.parquet.ParquetWriter(str(file_path), schema, compression=compression or 'snappy')
+
+    def read_tables(pa, path):
+        parquet_file = pa.parquet.ParquetFile(str(path))
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i)
+
+    return _write_columnar(records, file_path, 'parquet', chunk_size, open_writer, read_tables)
+
+
+RecordWriter = Callable[[Iterable[dict], Path, Optional[str], int], int]
+
+RECORD_WRITERS: dict[str, RecordWriter] = {
+    'ndjson': _write_ndjson,
+    'json': _write_json,
+    'csv': _write_csv,
+    'arrow': _write_arrow,
+    'parquet': _write_parquet,
+}
+
+
+def register_writer(fmt:str, writer:RecordWriter):
+    '''Adds an output format. A writer takes the records, output path, compression
+    and chunk size, and returns the number of records written'''
+    if not fmt or not fmt.strip():
+        raise ValueError("Format name cannot be empty")
+
+    RECORD_WRITERS[fmt] = writer
+
+
+def infer_compression(file_path) -> Optional[str]:
+    '''Returns the compression implied by a file extension, if any'''
+    suffix = Path(file_path).suffix.lower()
+    if suffix == '.gz':
+        return 'gzip'
+    if suffix in ('.zst', '.zstd'):
+        return 'zstd'
+    return None
+
+
+def write_records(records:Iterable[dict], file_path, fmt:str = 'ndjson', compression:Optional[str] = None,
+                  chunk_size:int = DEFAULT_WRITE_CHUNK_SIZE) -> int:
+    '''Streams records to a file in the given format and returns the number of
+    records written. Memory use is bounded by chunk_size for columnar formats'''
+    if fmt not in RECORD_WRITERS:
+        raise ValueError(f"Unsupported output format: {fmt}. Choose from: {', '.join(RECORD_WRITERS)}")
+
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}. Choose from: {', '.join(COMPRESSIONS)}")
+
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1")
+
+    file_path = Path(file_path)
+    if not file_path.parent.exists():
+        raise ValueError(f"Output directory does not exist: {file_path.parent}")
+
+    try:
+        logger.info(f"Writing {fmt} records to file: {file_path}")
+
+        # Streamed input is produced while writing, so this includes generation time
+        with span('write', format=fmt):
+            count = RECORD_WRITERS[fmt](records, file_path, compression, chunk_size)
+
+        logger.info(f"Successfully wrote {count} records to {file_path}")
+        return count
+
+    except IOError as e:
+        logger.error(f"Error writing to file: {str(e)}")
+        raise RuntimeError(f"Failed to write file: {str(e)}")
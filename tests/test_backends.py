@@ -0,0 +1,266 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.backends import Backend, Message, OpenAICompatibleBackend, Router, StubBackend, create_backend
+from inference.generator import generate_data_sample, stream_data_sample
+from inference.prompts import build_prompt
+from inference.scheduler import RequestScheduler
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """Answers chat completions like an OpenAI-compatible server"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, self.headers.get('Authorization'), body))
+
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+
+        content = '{"name": "Ada"}\n{"name": "Grace"}'
+        usage = {'prompt_tokens': 12, 'completion_tokens': 9, 'total_tokens': 21}
+        self.send_response(200)
+
+        if not body.get('stream'):
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'choices': [{'message': {'content': content}}], 'usage': usage}).encode())
+            return
+
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for part in ('{"name": "Ada"}\n{"na', 'me": "Grace"}'):
+            event = {'choices': [{'delta': {'content': part}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+        self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOpenAICompatibleBackend(unittest.TestCase):
+    """Test cases for OpenAICompatibleBackend against a local fake server"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeChatHandler)
+        self.server.requests = []
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.backend = OpenAICompatibleBackend(f"http://127.0.0.1:{self.server.server_port}/v1", 'test-model',
+                                               api_key='secret')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_invoke(self):
+        """Test that a completion returns its content and token usage"""
+        response = self.backend.invoke('Generate 2 records')
+
+        self.assertEqual(response.content, '{"name": "Ada"}\n{"name": "Grace"}')
+        self.assertEqual(response.usage_metadata['output_tokens'], 9)
+        path, auth, body = self.server.requests[0]
+        self.assertEqual(path, '/v1/chat/completions')
+        self.assertEqual(auth, 'Bearer secret')
+        self.assertEqual(body['model'], 'test-model')
+        self.assertEqual(body['messages'][0]['content'], 'Generate 2 records')
+
+    def test_stream(self):
+        """Test that streamed chunks are parsed into records by stream_data_sample"""
+        with patch('inference.generator.get_scheduler', return_value=RequestScheduler(sleep=lambda s: None)):
+            records = list(stream_data_sample(2, "{'name': 'full names'}", llm=self.backend))
+
+        self.assertEqual(records, [{'name': 'Ada'}, {'name': 'Grace'}])
+        self.assertTrue(self.server.requests[0][2]['stream'])
+
+    def test_rate_limit_status_kept(self):
+        """Test that a 429 keeps its status code so it is treated as throttling"""
+        self.server.status = 429
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.backend.invoke('Generate 2 records')
+        self.assertEqual(context.exception.code, 429)
+
+
+class FakeBackend(StubBackend):
+    """Stub backend that can be made to fail"""
+
+    def __init__(self, name, error=None, mid_stream_error=None, **kwargs):
+        self.name = name
+        super().__init__(**kwargs)
+        self.error = error
+        self.mid_stream_error = mid_stream_error
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return Message(self.name)
+
+    def stream(self, prompt):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self._chunks()
+
+    def _chunks(self):
+        yield Message(self.name)
+        if self.mid_stream_error:
+            raise self.mid_stream_error
+
+
+class TestRouter(unittest.TestCase):
+    """Test cases for Router class"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.clock = lambda: self.now[0]
+
+    def test_prefers_lowest_latency(self):
+        """Test that requests go to the backend that answered fastest"""
+        slow, fast = FakeBackend('slow'), FakeBackend('fast')
+        router = Router([slow, fast], clock=self.clock)
+        router._states[0].latency = 2.0
+        router._states[1].latency = 0.5
+
+        self.assertEqual(router.invoke('prompt').content, 'fast')
+
+    def test_price_strategy(self):
+        """Test that price routing picks the cheapest backend"""
+        router = Router([FakeBackend('paid', price=2.5), FakeBackend('cheap', price=0.1)], strategy='price',
+                        clock=self.clock)
+        self.assertEqual(router.invoke('prompt').content, 'cheap')
+
+    def test_fails_over_and_cools_down(self):
+        """Test that a failing backend is skipped until its cooldown passes"""
+        down = FakeBackend('down', error=RuntimeError('connection refused'))
+        backup = FakeBackend('backup')
+        router = Router([down, backup], clock=self.clock)
+        router._states[1].latency = 1.0
+
+        self.assertEqual(router.invoke('prompt').content, 'backup')
+        self.assertEqual(router.invoke('prompt').content, 'backup')
+        self.assertEqual(down.calls, 1)
+        self.assertFalse(router.stats()[0]['available'])
+
+        self.now[0] = 1000.0
+        down.error = None
+        self.assertEqual(router.invoke('prompt').content, 'down')
+
+    def test_saturated_backend_skipped(self):
+        """Test that a backend at its concurrency limit is tried last"""
+        busy, idle = FakeBackend('busy', max_concurrency=1), FakeBackend('idle')
+        router = Router([busy, idle], clock=self.clock)
+        router._states[0].in_flight = 1
+        router._states[1].latency = 5.0
+
+        self.assertEqual(router.invoke('prompt').content, 'idle')
+
+    def test_all_backends_fail(self):
+        """Test that the last error is raised when no backend answers"""
+        router = Router([FakeBackend('a', error=RuntimeError('a down')), FakeBackend('b', error=RuntimeError('b down'))],
+                        clock=self.clock)
+        with self.assertRaises(RuntimeError):
+            router.invoke('prompt')
+
+    def test_stream_fails_over_before_first_chunk(self):
+        """Test that a stream that fails to start moves to the next backend"""
+        router = Router([FakeBackend('down', error=RuntimeError('503 unavailable')), FakeBackend('up')],
+                        clock=self.clock)
+        self.assertEqual([chunk.content for chunk in router.stream('prompt')], ['up'])
+
+    def test_stream_creation_error_fails_over(self):
+        """Test that a backend raising when its stream is created is skipped and released"""
+        router = Router([FakeBackend('down', error=ValueError('API key not found')), FakeBackend('up')],
+                        clock=self.clock)
+        self.assertEqual([chunk.content for chunk in router.stream('prompt')], ['up'])
+        self.assertEqual([state['in_flight'] for state in router.stats()], [0, 0])
+        self.assertEqual(router.stats()[0]['failures'], 1)
+
+    def test_stream_error_after_first_chunk(self):
+        """Test that an error mid-stream is raised and recorded as a failure"""
+        broken = FakeBackend('broken', mid_stream_error=RuntimeError('connection reset'))
+        router = Router([broken, FakeBackend('up')], clock=self.clock)
+        router._states[1].latency = 1.0
+
+        chunks = []
+        with self.assertRaises(RuntimeError):
+            for chunk in router.stream('prompt'):
+                chunks.append(chunk.content)
+
+        self.assertEqual(chunks, ['broken'])
+        self.assertEqual(router.stats()[0], {'backend': 'broken', 'latency': None, 'in_flight': 0,
+                                             'available': False, 'failures': 1})
+
+    def test_unknown_strategy(self):
+        """Test with a routing strategy that does not exist"""
+        with self.assertRaises(ValueError):
+            Router([FakeBackend('a')], strategy='random')
+
+
+class TestStubBackend(unittest.TestCase):
+    """Test cases for StubBackend and create_backend"""
+
+    def test_answers_generation_prompt(self):
+        """Test that the stub fills every field of the requested number of records"""
+        with patch('inference.generator.get_scheduler', return_value=RequestScheduler(sleep=lambda s: None)):
+            content = generate_data_sample(3, "{'name': 'names', 'city': 'cities'}", llm=StubBackend())
+
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(set(records[0]), {'name', 'city'})
+
+    def test_streams_lines(self):
+        """Test that the stub streams one record per chunk"""
+        chunks = list(StubBackend().stream(build_prompt(2, "{'name': 'names'}", unique_fields=['name'])))
+        self.assertEqual(len(chunks), 2)
+
+    def test_seeded_values(self):
+        """Test that seeded prompts get values from their seed in any backend instance"""
+        first = StubBackend().invoke(build_prompt(2, "{'name': 'names'}", seed=7)).content
+        self.assertEqual(first, StubBackend().invoke(build_prompt(2, "{'name': 'names'}", seed=7)).content)
+        self.assertNotEqual(first, StubBackend().invoke(build_prompt(2, "{'name': 'names'}", seed=8)).content)
+
+    def test_backend_is_abstract(self):
+        """Test that a backend must implement invoke and stream"""
+        class Incomplete(Backend):
+            def invoke(self, prompt):
+                return Message('')
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_unknown_backend(self):
+        """Test with a backend name that does not exist"""
+        with self.assertRaises(ValueError):
+            create_backend('mystery')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.batch import load_schema, schema_to_fields, generate_to_file
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class TestLoadSchema(unittest.TestCase):
+    """Test cases for load_schema function"""
+
+    def setUp(self):
+        """Create a temporary directory for tests"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Remove the temporary directory after tests"""
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_json_mapping(self):
+        """Test a JSON file mapping field names to descriptions"""
+        path = self.test_dir / 'schema.json'
+        path.write_text(json.dumps({'name': 'realistic full names', 'age': 'ages between 25-65'}))
+        self.assertEqual(load_schema(path), {'name': 'realistic full names', 'age': 'ages between 25-65'})
+
+    @unittest.skipUnless(yaml, 'PyYAML is not installed')
+    def test_yaml_field_list(self):
+        """Test a YAML file with a list of fields"""
+        path = self.test_dir / 'schema.yaml'
+        path.write_text('fields:\n  - name: name\n    description: realistic full names\n')
+        self.assertEqual(load_schema(path), {'name': 'realistic full names'})
+
+    def test_missing_file(self):
+        """Test with a schema file that does not exist"""
+        with self.assertRaises(ValueError) as context:
+            load_schema(self.test_dir / 'missing.json')
+        self.assertIn('does not exist', str(context.exception))
+
+    def test_schema_to_fields(self):
+        """Test conversion to the field list used by format_user_input"""
+        self.assertEqual(schema_to_fields({'name': 'full names'}), [{'col1': 'name', 'col2': 'full names'}])
+
+    def test_unique_fields(self):
+        """Test that fields can be marked unique in either file layout"""
+        path = self.test_dir / 'schema.json'
+        path.write_text(json.dumps({'fields': [{'name': 'email', 'description': 'emails', 'unique': True},
+                                               {'name': 'name', 'description': 'full names'}]}))
+        schema = load_schema(path)
+        self.assertEqual(schema, {'email': {'description': 'emails', 'unique': True}, 'name': 'full names'})
+        self.assertEqual(schema_to_fields(schema), [{'col1': 'email', 'col2': 'emails', 'unique': True},
+                                                    {'col1': 'name', 'col2': 'full names'}])
+
+
+class TestGenerateToFile(unittest.TestCase):
+    """Test cases for generate_to_file function"""
+
+    def setUp(self):
+        """Create a temporary directory for tests"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Remove the temporary directory after tests"""
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    @patch('inference.batch.stream_dataset')
+    def test_streams_records_to_file(self, mock_stream):
+        """Test that streamed records are written to the output file"""
+        mock_stream.return_value = iter([{'name': 'John Doe'}, {'name': 'Jane Roe'}])
+        output = self.test_dir / 'out.ndjson'
+
+        count = generate_to_file({'name': 'full names'}, 2, output, concurrency=8, batch_size=20)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(output.read_text().splitlines(), ['{"name": "John Doe"}', '{"name": "Jane Roe"}'])
+        self.assertEqual(mock_stream.call_args.args, (2, "{'name': 'full names'}"))
+        self.assertEqual(mock_stream.call_args.kwargs['max_workers'], 8)
+        self.assertEqual(mock_stream.call_args.kwargs['batch_size'], 20)
+
+    @patch('inference.batch.compile_schema')
+    def test_compiled_mode(self, mock_compile):
+        """Test that compiled mode samples locally from the compiled spec"""
+        mock_compile.return_value = {'fields': {'id': {'type': 'sequence', 'start': 1}}}
+        output = self.test_dir / 'out.csv'
+
+        generate_to_file({'id': 'row ids'}, 3, output, fmt='csv', mode='compiled')
+        self.assertEqual(output.read_text().splitlines(), ['id', '1', '2', '3'])
+
+    @patch('inference.batch.PROGRESS_INTERVAL_RECORDS', 2)
+    @patch('inference.batch.compile_schema')
+    def test_compiled_mode_progress(self, mock_compile):
+        """Test that compiled mode reports progress as records are sampled"""
+        mock_compile.return_value = {'fields': {'id': {'type': 'sequence', 'start': 1}}}
+        progress = []
+
+        generate_to_file({'id': 'row ids'}, 5, self.test_dir / 'out.ndjson', mode='compiled',
+                         progress_callback=lambda completed, total: progress.append((completed, total)))
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+    @patch('inference.batch.iter_hybrid_dataset')
+    def test_hybrid_mode_progress(self, mock_hybrid):
+        """Test that hybrid mode reports its final count"""
+        mock_hybrid.return_value = iter([{'name': 'Ada'}, {'name': 'Grace'}])
+        progress = []
+
+        generate_to_file({'name': 'full names'}, 2, self.test_dir / 'out.ndjson', mode='hybrid',
+                         progress_callback=lambda completed, total: progress.append((completed, total)))
+        self.assertEqual(progress, [(2, 2)])
+
+    def test_invalid_mode(self):
+        """Test with an unknown generation mode"""
+        with self.assertRaises(ValueError):
+            generate_to_file({'name': 'full names'}, 2, self.test_dir / 'out.ndjson', mode='magic')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+
+# Add src and benchmarks to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from fake_llm import FakeChatModel, InjectedFailure
+from inference.prompts import build_prompt
+from inference.parser import parse_records
+
+
+PROMPT = build_prompt(5, "{'name': 'full name', 'age': 'integer'}")
+
+
+class TestFakeChatModel(unittest.TestCase):
+    """Test cases for FakeChatModel class"""
+
+    def test_invoke_matches_prompt(self):
+        """Test that the response holds the requested records and fields"""
+        llm = FakeChatModel(latency=0, tokens_per_second=1e9)
+        result = parse_records(llm.invoke(PROMPT).content, ['name', 'age'])
+        self.assertEqual(len(result.records), 5)
+        self.assertEqual(result.rejected, 0)
+
+    def test_deterministic(self):
+        """Test that identical prompts get identical responses, streamed or not"""
+        llm = FakeChatModel(latency=0, tokens_per_second=1e9)
+        content = llm.invoke(PROMPT).content
+        self.assertEqual(content, FakeChatModel(latency=0, tokens_per_second=1e9).invoke(PROMPT).content)
+        self.assertEqual(content, ''.join(chunk.content for chunk in llm.stream(PROMPT)))
+
+    def test_failure_injection(self):
+        """Test that every call fails at a failure rate of one"""
+        llm = FakeChatModel(latency=0, failure_rate=1.0)
+        with self.assertRaises(InjectedFailure):
+            llm.invoke(PROMPT)
+        with self.assertRaises(InjectedFailure):
+            list(llm.stream(PROMPT))
+        self.assertEqual(llm.failures, 2)
+
+    def test_truncation(self):
+        """Test that truncated output loses at least one record"""
+        llm = FakeChatModel(latency=0, tokens_per_second=1e9, truncate_rate=1.0)
+        result = parse_records(llm.invoke(PROMPT).content, ['name', 'age'])
+        self.assertLess(len(result.records), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import subprocess
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from inference.cli import main
+
+
+class TestCli(unittest.TestCase):
+    """Test cases for the command line entry point"""
+
+    @patch('inference.batch.generate_to_file')
+    def test_generate_command(self, mock_generate):
+        """Test that generate passes its options to the batch API"""
+        mock_generate.return_value = 500
+
+        exit_code = main(['generate', '--schema', 'schema.yaml', '-n', '500', '-o', 'out.csv',
+                          '--format', 'csv', '--concurrency', '8', '--quiet'])
+
+        self.assertEqual(exit_code, 0)
+        args, kwargs = mock_generate.call_args
+        self.assertEqual(args, ('schema.yaml', 500, 'out.csv'))
+        self.assertEqual(kwargs['fmt'], 'csv')
+        self.assertEqual(kwargs['concurrency'], 8)
+
+    @patch('inference.batch.generate_to_file')
+    def test_generate_error(self, mock_generate):
+        """Test that generation errors exit with a non-zero status"""
+        mock_generate.side_effect = ValueError('Schema file does not exist: schema.yaml')
+
+        with patch('sys.stderr'):
+            exit_code = main(['generate', '--schema', 'schema.yaml', '-n', '5', '-o', 'out.ndjson'])
+        self.assertEqual(exit_code, 1)
+
+    @patch('inference.relational.generate_tables')
+    def test_tables_command(self, mock_generate):
+        """Test that tables passes its options to the relational API"""
+        mock_generate.return_value = {'customers': 10, 'orders': 25}
+
+        exit_code = main(['tables', '--schema', 'shop.yaml', '-o', 'out', '--format', 'parquet',
+                          '--seed', '4', '--quiet'])
+
+        self.assertEqual(exit_code, 0)
+        args, kwargs = mock_generate.call_args
+        self.assertEqual(args, ('shop.yaml', 'out'))
+        self.assertEqual(kwargs['fmt'], 'parquet')
+        self.assertEqual(kwargs['seed'], 4)
+
+    @patch('inference.manifest.replay')
+    def test_replay_command(self, mock_replay):
+        """Test that replay restores the output named by a manifest"""
+        mock_replay.return_value = True
+
+        exit_code = main(['replay', 'out.ndjson.manifest.json', '--quiet'])
+
+        self.assertEqual(exit_code, 0)
+        mock_replay.assert_called_once_with('out.ndjson.manifest.json', None)
+
+    @patch('inference.jobs.run_job')
+    @patch('inference.jobs.get_job_store')
+    def test_generate_job(self, mock_store, mock_run):
+        """Test that generate --job creates a job and runs it"""
+        mock_store.return_value.create.return_value = 'job-1'
+        mock_run.return_value = {'status': 'completed', 'committed_records': 50, 'output_path': 'out.ndjson'}
+
+        exit_code = main(['generate', '--schema', 'schema.yaml', '-n', '50', '-o', 'out.ndjson', '--job', '--quiet'])
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(mock_store.return_value.create.call_args.args, ('schema.yaml', 50, 'out.ndjson'))
+        self.assertEqual(mock_run.call_args.args[0], 'job-1')
+
+    @patch('inference.jobs.get_job_store')
+    def test_jobs_commands(self, mock_store):
+        """Test that jobs lists and cancels jobs in the job store"""
+        store = MagicMock()
+        store.list.return_value = [{'id': 'job-1', 'status': 'failed', 'committed_records': 20,
+                                    'num_records': 50, 'output_path': 'out.ndjson'}]
+        mock_store.return_value = store
+
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(main(['jobs', 'list']), 0)
+        self.assertIn('job-1', mock_print.call_args.args[0])
+
+        with patch('sys.stderr'):
+            self.assertEqual(main(['jobs', 'cancel', 'job-1']), 0)
+        store.cancel.assert_called_once_with('job-1')
+
+    @patch('inference.distributed.wait_for_run')
+    @patch('inference.distributed.start_local_workers')
+    @patch('inference.distributed.submit_run')
+    def test_dist_submit(self, mock_submit, mock_start, mock_wait):
+        """Test that dist submit queues a run, starts local workers and stops them once it is merged"""
+        mock_submit.return_value = 'run-1'
+        worker = MagicMock()
+        mock_start.return_value = [worker]
+        mock_wait.return_value = {'status': 'completed', 'output_path': 'out.ndjson'}
+
+        with tempfile.TemporaryDirectory() as runs_dir, patch('sys.stderr'):
+            exit_code = main(['dist', '--dir', runs_dir, 'submit', '--schema', 'schema.yaml', '-n', '500',
+                              '-o', 'out.ndjson', '--local-workers', '2', '--quiet'])
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(mock_submit.call_args.args, ('schema.yaml', 500, 'out.ndjson'))
+        self.assertEqual(mock_start.call_args.args[:2], (2, 'run-1'))
+        self.assertEqual(mock_wait.call_args.args[0], 'run-1')
+        worker.terminate.assert_called_once()
+
+    def test_does_not_import_streamlit(self):
+        """Test that the CLI can start without loading streamlit"""
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, inference.cli; sys.exit('streamlit' in sys.modules)"],
+            cwd=SRC_DIR, capture_output=True
+        )
+        self.assertEqual(result.returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
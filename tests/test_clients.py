@@ -0,0 +1,103 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import threading
+import subprocess
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.clients import get_api_key, get_client, clear_clients
+from inference.config import load_environment
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+
+@patch('langchain_google_genai.ChatGoogleGenerativeAI')
+class TestGetClient(unittest.TestCase):
+    """Test cases for get_client function"""
+
+    def setUp(self):
+        """Start each test without cached clients"""
+        clear_clients()
+
+    def test_client_reused(self, mock_llm_class):
+        """Test that repeated calls share one client"""
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test_key'}):
+            first = get_client()
+            second = get_client()
+        self.assertIs(first, second)
+        mock_llm_class.assert_called_once()
+
+    def test_client_per_configuration(self, mock_llm_class):
+        """Test that each configuration gets its own client"""
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test_key'}):
+            get_client('model-a', 0.7)
+            get_client('model-b', 0.7)
+            get_client('model-a', 0.2)
+            get_client('model-a', 0.7)
+        self.assertEqual(mock_llm_class.call_count, 3)
+
+    def test_concurrent_callers_share_client(self, mock_llm_class):
+        """Test that threads racing on first use build a single client"""
+        results = []
+
+        def worker():
+            results.append(get_client())
+
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test_key'}):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_llm_class.assert_called_once()
+        self.assertEqual(len(set(map(id, results))), 1)
+
+    def test_missing_api_key(self, mock_llm_class):
+        """Test when API key is not set"""
+        with patch.dict(os.environ, {}, clear=True):
+            with self.assertRaises(ValueError) as context:
+                get_api_key()
+            self.assertIn('GEMINI_API_KEY not found', str(context.exception))
+        mock_llm_class.assert_not_called()
+
+
+class TestColdStart(unittest.TestCase):
+    """Test cases for lazy loading of the model SDK"""
+
+    def test_generator_does_not_import_sdk(self):
+        """Test that the generator can be imported without loading LangChain"""
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, inference.generator; sys.exit('langchain_google_genai' in sys.modules)"],
+            cwd=SRC_DIR, capture_output=True
+        )
+        self.assertEqual(result.returncode, 0)
+
+    def test_environment_loaded_once(self):
+        """Test that the .env file is only read on the first call"""
+        load_environment.cache_clear()
+        with patch('dotenv.load_dotenv', return_value=False) as mock_load:
+            load_environment()
+            load_environment()
+        mock_load.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
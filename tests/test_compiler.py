@@ -0,0 +1,177 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.compiler import (
+    validate_spec, compile_schema, save_spec, load_spec, iter_compiled_records
+)
+from inference.disk_cache import DiskCache
+
+SCHEMA = "{'id': 'row ids', 'name': 'full names', 'email': 'emails', 'age': 'ages between 25-65', " \
+         "'price': 'prices', 'in_stock': 'booleans', 'joined': 'dates', 'sku': 'product codes'}"
+
+SPEC = {
+    'fields': {
+        'id': {'type': 'sequence', 'start': 1},
+        'name': {'type': 'choice', 'values': ['Sarah Mitchell', 'James Rodriguez'], 'weights': [1, 3]},
+        'email': {'type': 'template', 'template': '{name:slug}@{domain}', 'parts': {'domain': ['techcorp.com']}},
+        'age': {'type': 'int', 'min': 25, 'max': 65, 'distribution': 'normal'},
+        'price': {'type': 'float', 'min': 10, 'max': 500, 'decimals': 2},
+        'in_stock': {'type': 'bool', 'p_true': 0.8},
+        'joined': {'type': 'date', 'start': '2020-01-01', 'end': '2024-12-31'},
+        'sku': {'type': 'pattern', 'pattern': 'SKU-###-??'},
+    }
+}
+
+
+class TestValidateSpec(unittest.TestCase):
+    """Test cases for validate_spec function"""
+
+    def test_valid_spec(self):
+        """Test that a well formed spec is accepted"""
+        self.assertIs(validate_spec(SPEC, list(SPEC['fields'])), SPEC)
+
+    def test_missing_field(self):
+        """Test a spec that does not cover every schema field"""
+        with self.assertRaises(ValueError) as context:
+            validate_spec(SPEC, ['id', 'phone'])
+        self.assertIn('missing fields: phone', str(context.exception))
+
+    def test_invalid_field_specs(self):
+        """Test specs with unsupported types or bad ranges"""
+        invalid = [
+            {'type': 'uuid'},
+            {'type': 'int', 'min': 10, 'max': 1},
+            {'type': 'choice', 'values': []},
+            {'type': 'choice', 'values': ['a'], 'weights': [1, 2]},
+            {'type': 'template', 'template': '{unknown}'},
+        ]
+        for field in invalid:
+            with self.assertRaises(ValueError):
+                validate_spec({'fields': {'x': field}})
+
+    def test_non_numeric_range(self):
+        """Test that a range given as text is rejected before sampling"""
+        with self.assertRaises(ValueError) as context:
+            validate_spec({'fields': {'x': {'type': 'int', 'min': '1', 'max': '5'}}})
+        self.assertIn('numeric min', str(context.exception))
+        with self.assertRaises(ValueError):
+            validate_spec({'fields': {'x': {'type': 'float', 'min': True, 'max': 5}}})
+
+    def test_non_integer_decimals(self):
+        """Test that decimals given as text are rejected"""
+        with self.assertRaises(ValueError) as context:
+            validate_spec({'fields': {'x': {'type': 'float', 'min': 1, 'max': 5, 'decimals': '2'}}})
+        self.assertIn('decimals', str(context.exception))
+
+    def test_weights_not_a_list_of_numbers(self):
+        """Test that weights given as text raise ValueError rather than TypeError"""
+        for weights in ('xy', ['1', '2']):
+            with self.assertRaises(ValueError) as context:
+                validate_spec({'fields': {'x': {'type': 'choice', 'values': ['a', 'b'], 'weights': weights}}})
+            self.assertIn('weights', str(context.exception))
+
+    def test_template_references_dropped_field(self):
+        """Test that a template cannot use a field beyond the schema, which compiling drops"""
+        spec = {'fields': {
+            'domain': {'type': 'choice', 'values': ['example.com']},
+            'email': {'type': 'template', 'template': 'user@{domain}'},
+        }}
+        self.assertIs(validate_spec(spec), spec)
+        with self.assertRaises(ValueError) as context:
+            validate_spec(spec, ['email'])
+        self.assertIn('unknown placeholder: domain', str(context.exception))
+
+
+class TestCompileSchema(unittest.TestCase):
+    """Test cases for compile_schema function"""
+
+    def setUp(self):
+        """Create a temporary cache directory for tests"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Remove the temporary directory after tests"""
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_compile_once_then_cached(self):
+        """Test that the model is called once and the spec is reused"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content='```json\n' + json.dumps(SPEC) + '\n```')
+        cache = DiskCache(self.test_dir)
+
+        first = compile_schema(SCHEMA, cache=cache, llm=mock_llm)
+        second = compile_schema(SCHEMA, cache=cache, llm=mock_llm)
+
+        self.assertEqual(first, SPEC)
+        self.assertEqual(second, SPEC)
+        mock_llm.invoke.assert_called_once()
+
+    def test_invalid_model_response(self):
+        """Test that an unparseable spec raises ValueError"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content='not json')
+
+        with self.assertRaises(ValueError):
+            compile_schema(SCHEMA, cache=DiskCache(self.test_dir), llm=mock_llm)
+
+    def test_save_and_load(self):
+        """Test that a spec round-trips through a file"""
+        path = save_spec(SPEC, self.test_dir / 'spec.json')
+        self.assertEqual(load_spec(path), SPEC)
+
+
+class TestIterCompiledRecords(unittest.TestCase):
+    """Test cases for iter_compiled_records function"""
+
+    def test_records_follow_spec(self):
+        """Test that sampled values respect each field spec"""
+        records = list(iter_compiled_records(SPEC, 500, seed=7, chunk_size=128))
+
+        self.assertEqual(len(records), 500)
+        self.assertEqual([r['id'] for r in records], list(range(1, 501)))
+        for record in records:
+            self.assertEqual(list(record), list(SPEC['fields']))
+            self.assertIn(record['name'], SPEC['fields']['name']['values'])
+            self.assertEqual(record['email'], record['name'].lower().replace(' ', '.') + '@techcorp.com')
+            self.assertTrue(25 <= record['age'] <= 65)
+            self.assertTrue(10 <= record['price'] <= 500)
+            self.assertIsInstance(record['in_stock'], bool)
+            self.assertTrue('2020-01-01' <= record['joined'] <= '2024-12-31')
+            self.assertRegex(record['sku'], r'^SKU-\d{3}-[A-Z]{2}$')
+
+    def test_records_are_json_serializable(self):
+        """Test that records hold plain Python values"""
+        json.dumps(list(iter_compiled_records(SPEC, 10, seed=1)))
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed produces the same records"""
+        self.assertEqual(list(iter_compiled_records(SPEC, 50, seed=3)),
+                         list(iter_compiled_records(SPEC, 50, seed=3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
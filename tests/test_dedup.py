@@ -0,0 +1,127 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.dedup import BloomFilter, UniqueIndex, validate_unique_fields, _digest
+from inference.compiler import iter_compiled_records
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Test cases for BloomFilter class"""
+
+    def test_no_false_negatives(self):
+        """Test that every added value is reported as present"""
+        bloom = BloomFilter(10_000)
+        digests = [_digest(f"user{i}@example.com") for i in range(10_000)]
+        for digest in digests:
+            bloom.add(digest)
+        self.assertTrue(all(digest in bloom for digest in digests))
+
+    def test_false_positive_rate(self):
+        """Test that unseen values are rarely reported as present at capacity"""
+        bloom = BloomFilter(10_000, false_positive_rate=0.01)
+        for i in range(10_000):
+            bloom.add(_digest(i))
+        false_positives = sum(_digest(-i - 1) in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)
+
+    def test_invalid_settings(self):
+        """Test with invalid capacity and error rate"""
+        with self.assertRaises(ValueError):
+            BloomFilter(0)
+        with self.assertRaises(ValueError):
+            BloomFilter(10, false_positive_rate=1.5)
+
+
+class TestUniqueIndex(unittest.TestCase):
+    """Test cases for UniqueIndex class"""
+
+    def test_rejects_repeated_values(self):
+        """Test that a record repeating any unique value is rejected"""
+        index = UniqueIndex(['email', 'id'], capacity=10)
+        self.assertTrue(index.add({'email': 'a@x.com', 'id': 1}))
+        self.assertFalse(index.add({'email': 'a@x.com', 'id': 2}))
+        self.assertFalse(index.add({'email': 'b@x.com', 'id': 1}))
+        self.assertTrue(index.add({'email': 'b@x.com', 'id': 2}))
+        self.assertEqual((index.accepted, index.duplicates), (2, 2))
+
+    def test_rejected_record_not_indexed(self):
+        """Test that values of a rejected record stay available"""
+        index = UniqueIndex(['email', 'id'], capacity=10)
+        index.add({'email': 'a@x.com', 'id': 1})
+        self.assertFalse(index.add({'email': 'a@x.com', 'id': 2}))
+        self.assertTrue(index.add({'email': 'c@x.com', 'id': 2}))
+
+    def test_types_are_distinct(self):
+        """Test that a number and its string form are different values"""
+        index = UniqueIndex(['id'], capacity=10)
+        self.assertTrue(index.add({'id': 1}))
+        self.assertTrue(index.add({'id': '1'}))
+
+    def test_large_runs_use_bloom_filter(self):
+        """Test that runs above the exact limit switch to a Bloom filter"""
+        index = UniqueIndex(['email'], capacity=1000, exact_limit=100)
+        self.assertFalse(index.exact)
+        records = [{'email': f"user{i}@example.com"} for i in range(1000)]
+        accepted = list(index.filter(records + records))
+        self.assertLessEqual(len(accepted), 1000)
+        self.assertGreater(len(accepted), 990)
+
+    def test_no_fields(self):
+        """Test with no unique fields"""
+        with self.assertRaises(ValueError):
+            UniqueIndex([], capacity=10)
+
+
+class TestValidateUniqueFields(unittest.TestCase):
+    """Test cases for validate_unique_fields function"""
+
+    def test_unknown_field(self):
+        """Test with a unique field that is not in the schema"""
+        with self.assertRaises(ValueError) as context:
+            validate_unique_fields(['phone'], ['name', 'email'])
+        self.assertIn('phone', str(context.exception))
+
+    def test_duplicates_removed(self):
+        """Test that repeated names are collapsed in order"""
+        self.assertEqual(validate_unique_fields(['email', 'email', 'name'], ['name', 'email']), ['email', 'name'])
+
+
+class TestUniqueCompiledRecords(unittest.TestCase):
+    """Test cases for unique fields in compiled sampling"""
+
+    SPEC = {'fields': {'code': {'type': 'pattern', 'pattern': '##'},
+                       'name': {'type': 'choice', 'values': ['a', 'b']}}}
+
+    def test_resamples_duplicates(self):
+        """Test that duplicates are resampled until every value is distinct"""
+        records = list(iter_compiled_records(self.SPEC, 80, seed=1, chunk_size=16, unique_fields=['code']))
+        self.assertEqual(len(records), 80)
+        self.assertEqual(len({record['code'] for record in records}), 80)
+
+    def test_value_space_too_small(self):
+        """Test that sampling gives up when there are not enough distinct values"""
+        with self.assertRaises(RuntimeError) as context:
+            list(iter_compiled_records(self.SPEC, 3, seed=1, unique_fields=['name']))
+        self.assertIn('Only 2 of 3', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
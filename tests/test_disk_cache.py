@@ -0,0 +1,137 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.disk_cache import (
+    canonicalize_schema, make_content_key, DiskCache, get_default_cache, main
+)
+
+
+class TestMakeContentKey(unittest.TestCase):
+    """Test cases for canonicalize_schema and make_content_key functions"""
+
+    def test_equivalent_schemas_share_key(self):
+        """Test that formatting differences do not change the key"""
+        self.assertEqual(canonicalize_schema("{'name': 'test'}"), canonicalize_schema('{"name":"test"}'))
+        self.assertEqual(make_content_key("{'name': 'test'}", 10, 'prompt', 'model'),
+                         make_content_key("{'name':'test'}", 10, 'prompt', 'model'))
+
+    def test_inputs_change_key(self):
+        """Test that each key component changes the key"""
+        base = make_content_key("{'name': 'test'}", 10, 'prompt', 'model')
+        self.assertNotEqual(base, make_content_key("{'email': 'test'}", 10, 'prompt', 'model'))
+        self.assertNotEqual(base, make_content_key("{'name': 'test'}", 11, 'prompt', 'model'))
+        self.assertNotEqual(base, make_content_key("{'name': 'test'}", 10, 'other prompt', 'model'))
+        self.assertNotEqual(base, make_content_key("{'name': 'test'}", 10, 'prompt', 'other-model'))
+        self.assertNotEqual(base, make_content_key("{'name': 'test'}", 10, 'prompt', 'model', seed=1))
+
+
+class TestDiskCache(unittest.TestCase):
+    """Test cases for DiskCache class"""
+
+    def setUp(self):
+        """Create a temporary cache directory for tests"""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.key = make_content_key("{'name': 'test'}", 2, 'prompt', 'model')
+
+    def tearDown(self):
+        """Remove the temporary directory after tests"""
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_put_and_get(self):
+        """Test storing and reading back an entry"""
+        cache = DiskCache(self.test_dir)
+        self.assertIsNone(cache.get(self.key))
+        cache.put(self.key, '{"name": "a"}\n{"name": "b"}')
+        self.assertEqual(cache.get(self.key), '{"name": "a"}\n{"name": "b"}')
+
+    def test_persists_across_instances(self):
+        """Test that entries survive a new cache instance"""
+        DiskCache(self.test_dir).put(self.key, '{"name": "a"}')
+        self.assertEqual(DiskCache(self.test_dir).get(self.key), '{"name": "a"}')
+
+    def test_stream(self):
+        """Test streaming an entry line by line"""
+        cache = DiskCache(self.test_dir)
+        self.assertIsNone(cache.stream(self.key))
+        cache.put(self.key, '{"name": "a"}\n{"name": "b"}\n')
+        self.assertEqual(list(cache.stream(self.key)), ['{"name": "a"}', '{"name": "b"}'])
+
+    def test_lru_eviction(self):
+        """Test that least recently used entries are evicted over the size cap"""
+        cache = DiskCache(self.test_dir, max_bytes=25)
+        keys = [make_content_key("{'name': 'test'}", n, 'prompt', 'model') for n in range(3)]
+
+        cache.put(keys[0], 'x' * 10)
+        cache.put(keys[1], 'y' * 10)
+        os.utime(cache._path(keys[0]), (1, 1))
+        os.utime(cache._path(keys[1]), (2, 2))
+        cache.put(keys[2], 'z' * 10)
+
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertEqual(cache.get(keys[1]), 'y' * 10)
+        self.assertEqual(cache.get(keys[2]), 'z' * 10)
+
+    def test_stats_and_purge(self):
+        """Test inspecting and purging the cache"""
+        cache = DiskCache(self.test_dir)
+        cache.put(self.key, 'abc')
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.stats()['total_bytes'], 3)
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_invalid_key(self):
+        """Test that keys must be hex digests"""
+        with self.assertRaises(ValueError):
+            DiskCache(self.test_dir).get('../escape')
+
+    def test_default_cache_disabled(self):
+        """Test that no cache is used unless a directory is configured"""
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_default_cache())
+        with patch.dict(os.environ, {'DATA_GENERATOR_CACHE_DIR': str(self.test_dir)}):
+            self.assertIsInstance(get_default_cache(), DiskCache)
+
+    def test_default_cache_shared(self):
+        """Test that the default cache is built once per directory"""
+        other_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, other_dir, ignore_errors=True)
+        with patch.dict(os.environ, {'DATA_GENERATOR_CACHE_DIR': str(self.test_dir)}):
+            cache = get_default_cache()
+            self.assertIs(get_default_cache(), cache)
+        with patch.dict(os.environ, {'DATA_GENERATOR_CACHE_DIR': str(other_dir)}):
+            self.assertIsNot(get_default_cache(), cache)
+
+    def test_admin_purge_command(self):
+        """Test the purge admin command"""
+        DiskCache(self.test_dir).put(self.key, 'abc')
+        with patch('builtins.print'):
+            self.assertEqual(main(['--dir', str(self.test_dir), 'purge']), 0)
+        self.assertEqual(DiskCache(self.test_dir).stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.distributed import TaskQueue, merge_run, run_worker, start_local_workers, submit_run, wait_for_run
+
+SCHEMA = {'name': 'full names', 'city': 'cities'}
+
+
+def fake_generate(num_records, schema, seed=None, **kwargs):
+    """Stands in for the model with names numbered by request seed"""
+    return '\n'.join(json.dumps({'name': f"{seed}-{i}", 'city': 'Austin'}) for i in range(num_records))
+
+
+def read_output(path) -> list[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class TestDistributedRun(unittest.TestCase):
+    """Test cases for distributed runs"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.test_dir, ignore_errors=True)
+        self.queue = TaskQueue(self.test_dir / 'runs')
+        self.output = self.test_dir / 'out.ndjson'
+        patcher = patch('inference.manifest.get_default_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_workers_share_tasks(self):
+        """Test that concurrent workers claim each task once and the merge keeps batch order"""
+        run_id = submit_run(SCHEMA, 95, self.output, batch_size=10, seed=7, queue=self.queue)
+
+        completed = run_worker(self.queue, 'w', concurrency=3, generate_fn=fake_generate)
+        run = wait_for_run(run_id, self.queue, poll_interval=0.01)
+
+        self.assertEqual(completed, 10)
+        self.assertEqual(run['status'], 'completed')
+        records = read_output(self.output)
+        self.assertEqual(len(records), 95)
+        self.assertEqual(len({record['name'] for record in records}), 95)
+
+        # Seeds follow the batch, not the worker, so a rerun writes the same records
+        self.output.unlink()
+        run_id = submit_run(SCHEMA, 95, self.output, batch_size=10, seed=7, queue=self.queue)
+        run_worker(self.queue, 'other', generate_fn=fake_generate)
+        merge_run(run_id, self.queue)
+        self.assertEqual(read_output(self.output), records)
+
+    def test_expired_lease_requeued(self):
+        """Test that a task is given to another worker once its lease runs out"""
+        now = [1e12]
+        queue = TaskQueue(self.test_dir / 'runs', lease=60, clock=lambda: now[0])
+        run_id = submit_run(SCHEMA, 5, self.output, batch_size=5, queue=queue)
+
+        stale = queue.claim('slow', run_id)
+        self.assertIsNone(queue.claim('fast', run_id))
+        self.assertEqual(queue.requeue_expired(run_id), 1)
+
+        task = queue.claim('fast', run_id)
+        self.assertEqual(task['index'], stale['index'])
+        self.assertFalse(queue.complete(stale, [{'name': 'late', 'city': 'Austin'}] * 5))
+        self.assertTrue(queue.complete(task, [{'name': 'on time', 'city': 'Austin'}] * 5))
+
+        merge_run(run_id, queue)
+        self.assertEqual({record['name'] for record in read_output(self.output)}, {'on time'})
+
+    def test_stale_failure_ignored(self):
+        """Test that a worker failing a task it has lost does not queue it a second time"""
+        queue = TaskQueue(self.test_dir / 'runs', lease=0, clock=lambda: 1e12)
+        run_id = submit_run(SCHEMA, 5, self.output, batch_size=5, queue=queue)
+
+        stale = queue.claim('a', run_id)
+        queue.requeue_expired(run_id)
+        task = queue.claim('b', run_id)
+        queue.fail(stale, 'timed out')
+
+        self.assertIsNone(queue.claim('c', run_id))
+        self.assertTrue(queue.complete(task, [{'name': 'b', 'city': 'Austin'}] * 5))
+        self.assertEqual(queue.status(run_id)['tasks'], {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 0})
+
+    def test_lease_renewed_while_generating(self):
+        """Test that a batch slower than the lease is not given to another worker"""
+        queue = TaskQueue(self.test_dir / 'runs', lease=0.3)
+        run_id = submit_run(SCHEMA, 5, self.output, batch_size=5, queue=queue)
+        requeued = []
+
+        def slow_generate(num_records, schema, **kwargs):
+            for _ in range(4):
+                time.sleep(0.2)
+                requeued.append(queue.requeue_expired(run_id))
+            return fake_generate(num_records, schema, **kwargs)
+
+        self.assertEqual(run_worker(queue, 'w', generate_fn=slow_generate), 1)
+        self.assertEqual(requeued, [0, 0, 0, 0])
+
+    def test_failing_task(self):
+        """Test that a task failing every attempt fails the run"""
+        run_id = submit_run(SCHEMA, 5, self.output, batch_size=5, queue=self.queue)
+
+        def broken(*args, **kwargs):
+            raise ValueError('API key not found')
+
+        run_worker(self.queue, 'w', generate_fn=broken)
+        self.assertEqual(self.queue.status(run_id)['tasks']['failed'], 1)
+        with self.assertRaises(RuntimeError) as context:
+            wait_for_run(run_id, self.queue, poll_interval=0.01)
+        self.assertIn('API key not found', str(context.exception))
+
+    def test_unique_repeats_topped_up(self):
+        """Test that repeats across shards are dropped and the shortfall is queued again"""
+        def repeating(num_records, schema, seed=None, **kwargs):
+            # Every full batch starts with the same name
+            return '\n'.join(json.dumps({'name': 'Ada' if i == 0 and num_records == 10 else f"{seed}-{i}",
+                                          'city': 'Austin'})
+                             for i in range(num_records))
+
+        run_id = submit_run(SCHEMA, 30, self.output, batch_size=10, unique_fields=['name'], queue=self.queue)
+        run_worker(self.queue, 'w', generate_fn=repeating)
+        run = merge_run(run_id, self.queue)
+        self.assertEqual(run['status'], 'running')
+        self.assertEqual(self.queue.status(run_id)['tasks']['pending'], 1)
+
+        run_worker(self.queue, 'w', generate_fn=repeating)
+        run = wait_for_run(run_id, self.queue, poll_interval=0.01)
+        names = [record['name'] for record in read_output(self.output)]
+        self.assertEqual(len(names), 30)
+        self.assertEqual(len(set(names)), 30)
+
+    def test_cancelled_run_not_claimed(self):
+        """Test that workers skip a cancelled run"""
+        run_id = submit_run(SCHEMA, 5, self.output, batch_size=5, queue=self.queue)
+        self.queue.cancel(run_id)
+        self.assertIsNone(self.queue.claim('w'))
+        self.assertEqual(wait_for_run(run_id, self.queue)['status'], 'cancelled')
+
+    def test_local_worker_processes(self):
+        """Test a run split across several worker processes on this machine"""
+        run_id = submit_run(SCHEMA, 200, self.output, batch_size=10, queue=self.queue)
+        with patch.dict(os.environ, {'DATA_GENERATOR_BACKENDS': 'stub'}):
+            workers = start_local_workers(3, run_id, self.queue)
+        try:
+            run = wait_for_run(run_id, self.queue, poll_interval=0.05, timeout=60)
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.wait()
+
+        self.assertEqual(run['status'], 'completed')
+        self.assertEqual(len(read_output(self.output)), 200)
+        self.assertEqual(self.queue.status(run_id)['tasks']['done'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
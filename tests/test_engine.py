@@ -0,0 +1,284 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import json
+import sys
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.engine import plan_batches, generate_batch, generate_records, generate_dataset, stream_dataset
+
+
+class TestPlanBatches(unittest.TestCase):
+    """Test cases for plan_batches function"""
+
+    def test_even_split(self):
+        """Test a count that divides evenly into batches"""
+        self.assertEqual(plan_batches(100, 25), [25, 25, 25, 25])
+
+    def test_remainder(self):
+        """Test that the final batch holds the remainder"""
+        self.assertEqual(plan_batches(105, 50), [50, 50, 5])
+
+    def test_smaller_than_batch(self):
+        """Test a count smaller than a single batch"""
+        self.assertEqual(plan_batches(7, 50), [7])
+
+    def test_invalid_batch_size(self):
+        """Test batch sizes outside the per-request limit"""
+        with self.assertRaises(ValueError):
+            plan_batches(10, 0)
+        with self.assertRaises(ValueError):
+            plan_batches(10, 101)
+
+
+class TestGenerateDataset(unittest.TestCase):
+    """Test cases for generate_dataset function"""
+
+    def test_merges_in_batch_order(self):
+        """Test that output order follows batch order, not completion order"""
+        def fake_generate(size, schema):
+            # The short final batch finishes first
+            time.sleep(0.05 if size == 50 else 0)
+            return f'{{"name": "batch of {size}"}}\n' * size
+
+        result = generate_dataset(230, "{'name': 'test'}", batch_size=50, max_workers=5,
+                                  generate_fn=fake_generate)
+        self.assertEqual(result.split('\n'), ['{"name": "batch of 50"}'] * 200 + ['{"name": "batch of 30"}'] * 30)
+
+    def test_runs_batches_concurrently(self):
+        """Test that batches overlap when workers are available"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_generate(size, schema):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return '{"name": "x"}\n' * size
+
+        generate_dataset(400, "{'name': 'test'}", batch_size=100, max_workers=4, generate_fn=fake_generate)
+        self.assertGreater(max(peak), 1)
+
+    def test_retries_failed_batch(self):
+        """Test that a transient batch failure is retried"""
+        fake_generate = MagicMock(side_effect=[RuntimeError('boom'), '{"name": "ok"}\n' * 10])
+
+        result = generate_dataset(10, "{'name': 'test'}", batch_size=10, retry_delay=0,
+                                  generate_fn=fake_generate)
+        self.assertEqual(result.split('\n'), ['{"name": "ok"}'] * 10)
+        self.assertEqual(fake_generate.call_count, 2)
+
+    def test_retries_exhausted(self):
+        """Test that a batch failing every attempt raises RuntimeError"""
+        fake_generate = MagicMock(side_effect=RuntimeError('boom'))
+
+        with self.assertRaises(RuntimeError) as context:
+            generate_dataset(10, "{'name': 'test'}", batch_size=10, max_retries=2, retry_delay=0,
+                             generate_fn=fake_generate)
+        self.assertIn('failed after 3 attempts', str(context.exception))
+
+    def test_salvages_and_requests_shortfall(self):
+        """Test that valid records are kept and only the missing count is re-requested"""
+        responses = [
+            '```json\n{"name": "a"}\n{"wrong": "b"}\n{"name": "c"}\n{"name": "tru',
+            '{"name": "d"}\n{"name": "e"}\n',
+        ]
+        fake_generate = MagicMock(side_effect=responses)
+
+        records = generate_records(4, "{'name': 'test'}", batch_size=4, retry_delay=0,
+                                   generate_fn=fake_generate)
+        self.assertEqual(records, [{'name': 'a'}, {'name': 'c'}, {'name': 'd'}, {'name': 'e'}])
+        self.assertEqual([c.args[0] for c in fake_generate.call_args_list], [4, 2])
+
+    def test_shortfall_retries_exhausted(self):
+        """Test that a batch that never returns enough valid records fails"""
+        fake_generate = MagicMock(return_value='{"name": "a"}')
+
+        with self.assertRaises(RuntimeError) as context:
+            generate_records(3, "{'name': 'test'}", batch_size=3, max_retries=1, retry_delay=0,
+                             generate_fn=fake_generate)
+        self.assertIn('1 of 3 records missing', str(context.exception))
+
+    def test_unique_fields_across_batches(self):
+        """Test that repeated unique values are dropped and only the shortfall is re-requested"""
+        requested = []
+        counter = iter(range(1000))
+
+        def fake_generate(size, schema, unique_fields):
+            requested.append(size)
+            # Full batches repeat one email
+            return '\n'.join(json.dumps({'email': 'same@x.com' if i == 0 and size == 10 else f"u{next(counter)}@x.com"})
+                             for i in range(size))
+
+        records = generate_records(20, "{'email': 'emails'}", batch_size=10, max_workers=1, retry_delay=0,
+                                   generate_fn=fake_generate, unique_fields=['email'])
+        self.assertEqual(len(records), 20)
+        self.assertEqual(len({record['email'] for record in records}), 20)
+        self.assertEqual(requested, [10, 10, 1])
+
+    def test_unknown_unique_field(self):
+        """Test that a unique field missing from the schema is rejected"""
+        with self.assertRaises(ValueError):
+            generate_records(10, "{'name': 'test'}", generate_fn=MagicMock(), unique_fields=['email'])
+
+    def test_value_error_not_retried(self):
+        """Test that configuration errors fail immediately"""
+        fake_generate = MagicMock(side_effect=ValueError('bad schema'))
+
+        with self.assertRaises(ValueError):
+            generate_dataset(10, "{'name': 'test'}", batch_size=10, generate_fn=fake_generate)
+        fake_generate.assert_called_once()
+
+    def test_progress_reported(self):
+        """Test that progress reaches the requested total"""
+        progress = []
+
+        generate_dataset(120, "{'name': 'test'}", batch_size=50,
+                         progress_callback=lambda done, total: progress.append((done, total)),
+                         generate_fn=lambda size, schema: '{"name": "x"}\n' * size)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(progress[-1], (120, 120))
+
+    def test_record_budget(self):
+        """Test that requests beyond the record budget are rejected"""
+        with self.assertRaises(ValueError) as context:
+            generate_dataset(1001, "{'name': 'test'}", max_records=1000, generate_fn=MagicMock())
+        self.assertIn('between 1 and 1000', str(context.exception))
+
+    def test_seeded_batches(self):
+        """Test that each batch gets its own seed, repeated across runs and advanced after a short response"""
+        def run():
+            seeds = []
+
+            def fake_generate(size, schema, seed):
+                seeds.append(seed)
+                count = size - 1 if len(seeds) == 1 else size
+                return '\n'.join('{"name": "a"}' for _ in range(count))
+
+            generate_records(20, "{'name': 'test'}", batch_size=10, max_workers=1, retry_delay=0, seed=5,
+                             generate_fn=fake_generate)
+            return seeds
+
+        seeds = run()
+        self.assertEqual(len(set(seeds)), 3)
+        self.assertEqual(seeds, run())
+
+    def test_batch_generated_alone(self):
+        """Test that a batch generated on its own gets the seed it has in a whole run"""
+        def record_seeds(seeds):
+            def fake_generate(size, schema, seed):
+                seeds.append(seed)
+                return '\n'.join('{"name": "a"}' for _ in range(size))
+            return fake_generate
+
+        run_seeds = []
+        generate_records(30, "{'name': 'test'}", batch_size=10, max_workers=1, seed=5,
+                         generate_fn=record_seeds(run_seeds))
+        batch_seeds = []
+        records = generate_batch(2, 10, "{'name': 'test'}", seed=5, generate_fn=record_seeds(batch_seeds))
+
+        self.assertEqual(len(records), 10)
+        self.assertEqual(batch_seeds, [run_seeds[2]])
+
+
+class TestStreamDataset(unittest.TestCase):
+    """Test cases for stream_dataset function"""
+
+    def test_yields_in_batch_order(self):
+        """Test that records arrive in batch order with the requested count"""
+        counter = iter(range(1000))
+        lock = threading.Lock()
+
+        def fake_stream(size, schema):
+            # Later batches are faster than earlier ones
+            time.sleep(0.05 if size == 50 else 0)
+            for _ in range(size):
+                with lock:
+                    yield {'size': size, 'n': next(counter)}
+
+        records = list(stream_dataset(130, "{'name': 'test'}", batch_size=50, max_workers=3,
+                                      stream_fn=fake_stream))
+        self.assertEqual(len(records), 130)
+        self.assertEqual([r['size'] for r in records], [50] * 100 + [30] * 30)
+
+    def test_retries_only_missing_records(self):
+        """Test that a batch cut short re-requests only the shortfall"""
+        requested = []
+
+        def fake_stream(size, schema):
+            requested.append(size)
+            yield {'n': 1}
+            if len(requested) == 1:
+                raise RuntimeError('stream dropped')
+            for _ in range(size - 1):
+                yield {'n': 1}
+
+        records = list(stream_dataset(10, "{'name': 'test'}", batch_size=10, retry_delay=0,
+                                      stream_fn=fake_stream))
+        self.assertEqual(len(records), 10)
+        self.assertEqual(requested, [10, 9])
+
+    def test_unique_fields_streamed(self):
+        """Test that streamed duplicates are skipped and the shortfall re-requested"""
+        requested = []
+
+        def fake_stream(size, schema, unique_fields):
+            requested.append(size)
+            for i in range(size):
+                yield {'id': i % 5 + 5 * (len(requested) - 1)}
+
+        records = list(stream_dataset(10, "{'id': 'ids'}", batch_size=10, retry_delay=0,
+                                      stream_fn=fake_stream, unique_fields=['id']))
+        self.assertEqual(sorted(record['id'] for record in records), list(range(10)))
+        self.assertEqual(requested, [10, 5])
+
+    def test_failure_raised_to_consumer(self):
+        """Test that a batch failing every attempt raises RuntimeError"""
+        def fake_stream(size, schema):
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError) as context:
+            list(stream_dataset(10, "{'name': 'test'}", batch_size=10, max_retries=1, retry_delay=0,
+                                stream_fn=fake_stream))
+        self.assertIn('failed after 2 attempts', str(context.exception))
+
+    def test_first_record_before_batch_completes(self):
+        """Test that the first record is yielded while its batch is still streaming"""
+        release = threading.Event()
+
+        def fake_stream(size, schema):
+            yield {'n': 0}
+            release.wait(timeout=5)
+            for n in range(1, size):
+                yield {'n': n}
+
+        records = stream_dataset(5, "{'name': 'test'}", batch_size=5, stream_fn=fake_stream)
+        self.assertEqual(next(records), {'n': 0})
+        release.set()
+        self.assertEqual(len(list(records)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,12 +15,18 @@
 import unittest
 import sys
 import os
+import tempfile
+import shutil
 from unittest.mock import patch, MagicMock
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from inference.generator import format_user_input, generate_data_sample
+from inference.generator import format_user_input, generate_data_sample, stream_data_sample
+from inference.disk_cache import DiskCache
+from inference.engine import generate_records
+from inference.clients import clear_clients
+from inference.scheduler import RequestScheduler
 
 
 class TestFormatUserInput(unittest.TestCase):
@@ -84,6 +90,10 @@ class TestFormatUserInput(unittest.TestCase):
 class TestGenerateDataSample(unittest.TestCase):
     """Test cases for generate_data_sample function"""
 
+    def setUp(self):
+        """Start each test without cached clients"""
+        clear_clients()
+
     def test_missing_api_key(self):
         """Test when API key is not set"""
         with patch.dict(os.environ, {}, clear=True):
@@ -112,7 +122,7 @@ class TestGenerateDataSample(unittest.TestCase):
                 generate_data_sample(10, "")
             self.assertIn('Schema cannot be empty', str(context.exception))
 
-    @patch('inference.generator.ChatGoogleGenerativeAI')
+    @patch('langchain_google_genai.ChatGoogleGenerativeAI')
     def test_successful_generation(self, mock_llm_class):
         """Test successful data generation"""
         # Mock the LLM response
@@ -127,6 +137,145 @@ class TestGenerateDataSample(unittest.TestCase):
             self.assertEqual(result, '{"name": "John Doe"}')
             mock_llm.invoke.assert_called_once()
 
+    @patch('langchain_google_genai.ChatGoogleGenerativeAI')
+    def test_cache_hit_skips_model(self, mock_llm_class):
+        """Test that a cached batch is served without calling the model"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content='{"name": "John Doe"}')
+        mock_llm_class.return_value = mock_llm
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = DiskCache(cache_dir)
+
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test_key'}):
+            first = generate_data_sample(10, "{'name': 'test'}", cache=cache, seed=1)
+            second = generate_data_sample(10, "{'name': 'test'}", cache=cache, seed=1)
+
+        self.assertEqual(first, second)
+        mock_llm.invoke.assert_called_once()
+
+    def test_unseeded_requests_skip_cache(self):
+        """Test that unseeded requests, unique or not, bypass the cache"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content='{"name": "John Doe"}')
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = DiskCache(cache_dir)
+
+        generate_data_sample(10, "{'name': 'test'}", cache=cache, llm=mock_llm)
+        generate_data_sample(10, "{'name': 'test'}", cache=cache, llm=mock_llm)
+        generate_data_sample(10, "{'name': 'test'}", cache=cache, llm=mock_llm, unique_fields=['name'])
+
+        self.assertEqual(mock_llm.invoke.call_count, 3)
+        self.assertIn('different value for: name', mock_llm.invoke.call_args.args[0])
+        self.assertEqual(cache.entries(), [])
+
+    def test_seeded_unique_requests_cached(self):
+        """Test that seeded unique requests are cached per seed"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(content='{"name": "John Doe"}')
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = DiskCache(cache_dir)
+
+        for seed in (1, 2, 1):
+            generate_data_sample(10, "{'name': 'test'}", cache=cache, llm=mock_llm, unique_fields=['name'], seed=seed)
+
+        self.assertEqual(mock_llm.invoke.call_count, 2)
+        self.assertIn('Variation: 2', mock_llm.invoke.call_args.args[0])
+        self.assertEqual(len(cache.entries()), 2)
+
+    @patch('langchain_google_genai.ChatGoogleGenerativeAI')
+    def test_cache_keyed_by_backend(self, mock_llm_class):
+        """Test that a stub run and a Gemini run with the same seed do not share a cache entry"""
+        mock_llm_class.return_value.invoke.return_value = MagicMock(content='{"name": "Ada Lovelace"}')
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = DiskCache(cache_dir)
+
+        with patch('inference.backends.BACKENDS', ['stub']), patch('inference.backends._default_llm', None):
+            stub = generate_data_sample(1, "{'name': 'test'}", cache=cache, seed=1)
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test_key'}):
+            gemini = generate_data_sample(1, "{'name': 'test'}", cache=cache, seed=1)
+
+        self.assertIn('name-1-0', stub)
+        self.assertEqual(gemini, '{"name": "Ada Lovelace"}')
+        self.assertEqual(len(cache.entries()), 2)
+
+    def test_cached_run_batches_differ(self):
+        """Test that the batches of a run stay distinct with the on-disk cache on"""
+        calls = []
+
+        def invoke(prompt):
+            calls.append(prompt)
+            return MagicMock(content='\n'.join(f'{{"name": "{len(calls)}-{i}"}}' for i in range(50)))
+
+        mock_llm = MagicMock()
+        mock_llm.invoke.side_effect = invoke
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        with patch.dict(os.environ, {'DATA_GENERATOR_CACHE_DIR': cache_dir}), \
+                patch('inference.generator.get_default_llm', return_value=mock_llm):
+            for seed in (None, 3):
+                records = generate_records(200, "{'name': 'test'}", batch_size=50, max_workers=1, seed=seed)
+                self.assertEqual(len({record['name'] for record in records}), 200)
+
+            # A seeded rerun is served from the cache batch by batch
+            rerun = generate_records(200, "{'name': 'test'}", batch_size=50, max_workers=1, seed=3)
+
+        self.assertEqual(len(calls), 8)
+        self.assertEqual(rerun, records)
+        self.assertEqual(len(DiskCache(cache_dir).entries()), 4)
+
+    def test_throttled_request_retried(self):
+        """Test that a 429 from the model is retried through the scheduler"""
+        mock_llm = MagicMock()
+        mock_llm.invoke.side_effect = [Exception("429 Resource has been exhausted"),
+                                       MagicMock(content='{"name": "John Doe"}')]
+        scheduler = RequestScheduler(requests_per_minute=600, sleep=lambda delay: None)
+
+        with patch('inference.generator.get_scheduler', return_value=scheduler):
+            result = generate_data_sample(10, "{'name': 'test'}", llm=mock_llm)
+
+        self.assertEqual(result, '{"name": "John Doe"}')
+        self.assertEqual(mock_llm.invoke.call_count, 2)
+        self.assertEqual(scheduler.throttled, 1)
+
+
+class TestStreamDataSample(unittest.TestCase):
+    """Test cases for stream_data_sample function"""
+
+    def setUp(self):
+        """Start each test without cached clients"""
+        clear_clients()
+
+    def test_invalid_num_records(self):
+        """Test that invalid input is rejected before streaming starts"""
+        with self.assertRaises(ValueError):
+            stream_data_sample(0, "{'name': 'test'}", llm=MagicMock())
+
+    def test_streams_records(self):
+        """Test that records are parsed from the token stream"""
+        mock_llm = MagicMock()
+        mock_llm.stream.return_value = iter([
+            MagicMock(content='{"name": "Jo'),
+            MagicMock(content='hn"}\n{"name": "Jane"}\n'),
+        ])
+
+        records = list(stream_data_sample(2, "{'name': 'test'}", llm=mock_llm))
+        self.assertEqual(records, [{'name': 'John'}, {'name': 'Jane'}])
+
+    def test_stream_failure(self):
+        """Test that model errors surface as RuntimeError"""
+        mock_llm = MagicMock()
+        mock_llm.stream.side_effect = Exception('connection reset')
+
+        with self.assertRaises(RuntimeError) as context:
+            list(stream_data_sample(2, "{'name': 'test'}", llm=mock_llm))
+        self.assertIn('Failed to generate data', str(context.exception))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,146 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference import hybrid
+from inference.hybrid import ValuePool, clear_pools, get_pool, iter_hybrid_records, iter_hybrid_dataset
+from inference.result_cache import ResultCache
+
+SCHEMA = "{'city': 'cities', 'state': 'states', 'tier': 'gold or silver'}"
+
+POOL_RECORDS = [
+    {'city': 'Austin', 'state': 'TX', 'tier': 'gold'},
+    {'city': 'Denver', 'state': 'CO', 'tier': 'silver'},
+    {'city': 'Boston', 'state': 'MA', 'tier': 'silver'},
+    {'city': 'Tampa', 'state': 'FL', 'tier': 'silver'},
+]
+
+
+def fake_generate(num_records, schema, **kwargs):
+    """Stands in for the model with numbered cities"""
+    fake_generate.calls += 1
+    return '\n'.join(json.dumps({'city': f"City {fake_generate.calls}-{i}", 'state': 'TX', 'tier': 'gold'})
+                     for i in range(num_records))
+
+
+class TestIterHybridRecords(unittest.TestCase):
+    """Test cases for iter_hybrid_records function"""
+
+    def setUp(self):
+        self.pool = ValuePool(POOL_RECORDS, ['city', 'state', 'tier'])
+
+    def test_values_come_from_pool(self):
+        """Test that every value is one the model wrote for that field"""
+        records = list(iter_hybrid_records(self.pool, 500, seed=1))
+        self.assertEqual(len(records), 500)
+        self.assertEqual(list(records[0]), ['city', 'state', 'tier'])
+        for field in ('city', 'state', 'tier'):
+            self.assertTrue({r[field] for r in records} <= {r[field] for r in POOL_RECORDS})
+
+    def test_values_recombined(self):
+        """Test that uncorrelated fields produce combinations not in the pool"""
+        records = list(iter_hybrid_records(self.pool, 500, seed=1))
+        pairs = {(r['city'], r['state']) for r in records}
+        self.assertGreater(len(pairs), len(POOL_RECORDS))
+
+    def test_correlated_fields_stay_together(self):
+        """Test that a correlated group keeps the values of one pool record"""
+        records = list(iter_hybrid_records(self.pool, 500, seed=1, correlated=[['city', 'state']]))
+        pairs = {(r['city'], r['state']) for r in records}
+        self.assertEqual(pairs, {(r['city'], r['state']) for r in POOL_RECORDS})
+
+    def test_frequency_and_weights(self):
+        """Test that values follow the pool's frequencies unless weighted"""
+        tiers = Counter(r['tier'] for r in iter_hybrid_records(self.pool, 4000, seed=2))
+        self.assertGreater(tiers['silver'], tiers['gold'] * 2)
+
+        tiers = Counter(r['tier'] for r in iter_hybrid_records(self.pool, 4000, seed=2,
+                                                               weights={'tier': {'gold': 1, 'silver': 0}}))
+        self.assertEqual(tiers, {'gold': 4000})
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed samples the same records"""
+        self.assertEqual(list(iter_hybrid_records(self.pool, 50, seed=5)),
+                         list(iter_hybrid_records(self.pool, 50, seed=5)))
+
+    def test_unique_limited_by_pool(self):
+        """Test that a unique field cannot have more rows than distinct pool values"""
+        records = list(iter_hybrid_records(self.pool, 4, seed=1, unique_fields=['city']))
+        self.assertEqual(len({r['city'] for r in records}), 4)
+
+        with self.assertRaises(RuntimeError):
+            list(iter_hybrid_records(self.pool, 5, seed=1, unique_fields=['city']))
+
+    def test_invalid_groups(self):
+        """Test with unknown or overlapping correlated fields"""
+        with self.assertRaises(ValueError):
+            list(iter_hybrid_records(self.pool, 5, correlated=[['city', 'zip']]))
+        with self.assertRaises(ValueError):
+            list(iter_hybrid_records(self.pool, 5, correlated=[['city', 'state'], ['state', 'tier']]))
+
+
+class TestGetPool(unittest.TestCase):
+    """Test cases for shared value pools"""
+
+    def setUp(self):
+        clear_pools()
+        fake_generate.calls = 0
+        self.addCleanup(clear_pools)
+
+    def test_pool_reused_until_stale(self):
+        """Test that model calls depend on pool age, not on the records sampled"""
+        first = get_pool(SCHEMA, 50, generate_fn=fake_generate)
+        calls = fake_generate.calls
+        self.assertEqual(first.size, 50)
+
+        for _ in range(3):
+            list(iter_hybrid_dataset(SCHEMA, 10000, pool_records=50, generate_fn=fake_generate))
+        self.assertEqual(fake_generate.calls, calls)
+
+        get_pool(SCHEMA, 50, generate_fn=fake_generate, max_age=0)
+        self.assertGreater(fake_generate.calls, calls)
+
+    def test_least_recently_used_pool_evicted(self):
+        """Test that only the most recently used pools are kept"""
+        with patch('inference.hybrid._pools', ResultCache(max_entries=2, name='pool')):
+            others = [SCHEMA.replace('cities', description) for description in ('towns', 'villages')]
+            for schema in (SCHEMA, others[0], SCHEMA, others[1]):
+                get_pool(schema, 10, generate_fn=fake_generate)
+            calls = fake_generate.calls
+
+            get_pool(SCHEMA, 10, generate_fn=fake_generate)
+            self.assertEqual(fake_generate.calls, calls)
+            get_pool(others[0], 10, generate_fn=fake_generate)
+            self.assertGreater(fake_generate.calls, calls)
+        self.assertEqual(hybrid._pool_locks, {})
+
+    def test_small_request_uses_small_pool(self):
+        """Test that a request smaller than the pool only asks the model for its own size"""
+        generate = MagicMock(side_effect=fake_generate)
+        records = list(iter_hybrid_dataset(SCHEMA, 5, pool_records=200, generate_fn=generate))
+        self.assertEqual(len(records), 5)
+        self.assertEqual(generate.call_args.args[0], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from itertools import count
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.jobs import JobStore, run_job
+from inference.manifest import manifest_path
+
+
+def fake_generator(start:int = 0, fail_on:int = 0):
+    """Returns a generate_fn giving numbered names, raising on call number fail_on"""
+    names = count(start)
+    calls = count(1)
+
+    def generate(size, schema, **kwargs):
+        if next(calls) == fail_on:
+            raise ValueError('Quota exceeded')
+        return '\n'.join(json.dumps({'name': f"n{next(names)}"}) for _ in range(size))
+
+    return generate
+
+
+class TestJobs(unittest.TestCase):
+    """Test cases for JobStore and run_job"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.store = JobStore(self.test_dir / 'jobs')
+        self.output = self.test_dir / 'out.ndjson'
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create(self, num_records:int = 50, **settings) -> str:
+        return self.store.create({'name': 'full names'}, num_records, self.output, concurrency=1,
+                                 batch_size=10, **settings)
+
+    def read_output(self) -> list[dict]:
+        return [json.loads(line) for line in self.output.read_text().splitlines()]
+
+    def test_run_to_completion(self):
+        """Test that a job writes its output and manifest"""
+        job_id = self.create()
+        job = run_job(job_id, self.store, generate_fn=fake_generator())
+
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['committed_batches'], 5)
+        self.assertEqual(len(self.read_output()), 50)
+        self.assertTrue(manifest_path(self.output).exists())
+
+    def test_resume_after_failure(self):
+        """Test that a resumed job only generates the batches that were not committed"""
+        job_id = self.create()
+        with self.assertRaises(ValueError):
+            run_job(job_id, self.store, generate_fn=fake_generator(fail_on=3))
+
+        job = self.store.get(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['committed_records'], 20)
+        self.assertFalse(self.output.exists())
+
+        resume = fake_generator(start=20)
+        job = run_job(job_id, self.store, generate_fn=resume)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual([r['name'] for r in self.read_output()], [f"n{i}" for i in range(50)])
+
+    def test_partial_write_discarded(self):
+        """Test that records written after the last committed batch are dropped on resume"""
+        job_id = self.create()
+        with self.assertRaises(ValueError):
+            run_job(job_id, self.store, generate_fn=fake_generator(fail_on=2))
+
+        with open(self.store.records_path(job_id), 'a') as f:
+            f.write('{"name": "partial"}\n{"na')
+
+        run_job(job_id, self.store, generate_fn=fake_generator(start=10))
+        names = [r['name'] for r in self.read_output()]
+        self.assertEqual(len(names), 50)
+        self.assertNotIn('partial', names)
+
+    def test_partial_index_line_discarded(self):
+        """Test that batches committed after a partly written index line survive a second crash"""
+        job_id = self.create()
+        with self.assertRaises(ValueError):
+            run_job(job_id, self.store, generate_fn=fake_generator(fail_on=2))
+
+        with open(self.store.records_path(job_id).with_name('batches.idx'), 'a') as f:
+            f.write('{"batch": 1, "off')
+
+        with self.assertRaises(ValueError):
+            run_job(job_id, self.store, generate_fn=fake_generator(start=10, fail_on=3))
+        self.assertEqual(self.store.get(job_id)['committed_batches'], 3)
+
+        run_job(job_id, self.store, generate_fn=fake_generator(start=30))
+        self.assertEqual([r['name'] for r in self.read_output()], [f"n{i}" for i in range(50)])
+
+    def test_finish_idempotent(self):
+        """Test that running a completed job again does not regenerate or rewrite its output"""
+        job_id = self.create()
+        run_job(job_id, self.store, generate_fn=fake_generator())
+        modified = self.output.stat().st_mtime_ns
+
+        def fail(*args, **kwargs):
+            raise AssertionError('model called')
+
+        job = run_job(job_id, self.store, generate_fn=fail)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(self.output.stat().st_mtime_ns, modified)
+
+        self.output.unlink()
+        run_job(job_id, self.store, generate_fn=fail)
+        self.assertEqual(len(self.read_output()), 50)
+
+    def test_cancel_stops_after_batch(self):
+        """Test that a cancel request stops a running job after its next batch"""
+        job_id = self.create()
+        generate = fake_generator()
+
+        def cancel_after_first(completed, total):
+            self.store.cancel(job_id)
+
+        job = run_job(job_id, self.store, progress_callback=cancel_after_first, generate_fn=generate)
+        self.assertEqual(job['status'], 'cancelled')
+        self.assertEqual(job['committed_records'], 10)
+
+        job = run_job(job_id, self.store, generate_fn=fake_generator(start=10))
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(len(self.read_output()), 50)
+
+    def test_unique_values_kept_on_resume(self):
+        """Test that values committed before a failure count towards uniqueness after resuming"""
+        job_id = self.create(unique_fields=['name'])
+        with self.assertRaises(ValueError):
+            run_job(job_id, self.store, generate_fn=fake_generator(fail_on=2))
+
+        # Starts inside the committed range, so the first values are duplicates
+        run_job(job_id, self.store, generate_fn=fake_generator(start=5))
+        names = [r['name'] for r in self.read_output()]
+        self.assertEqual(len(names), 50)
+        self.assertEqual(len(set(names)), 50)
+
+    def test_list_and_interrupted(self):
+        """Test that jobs are listed and a running job without a process is reported as interrupted"""
+        first = self.create()
+        second = self.create()
+        self.store.update(first, status='running')
+
+        jobs = {job['id']: job for job in self.store.list()}
+        self.assertEqual(set(jobs), {first, second})
+        self.assertEqual(jobs[first]['status'], 'interrupted')
+        self.assertEqual(jobs[second]['status'], 'pending')
+
+    def test_cancel_completed(self):
+        """Test that a completed job cannot be cancelled"""
+        job_id = self.create(num_records=10)
+        run_job(job_id, self.store, generate_fn=fake_generator())
+        with self.assertRaises(ValueError):
+            self.store.cancel(job_id)
+
+    def test_unknown_job(self):
+        """Test with a job ID that does not exist"""
+        with self.assertRaises(ValueError):
+            self.store.get('missing')
+        with self.assertRaises(ValueError):
+            self.store.get('../jobs')
+
+
+if __name__ == '__main__':
+    unittest.main()
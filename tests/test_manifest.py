@@ -0,0 +1,132 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.manifest import build_manifest, load_manifest, manifest_path, record_run, replay
+from inference.disk_cache import DiskCache
+from inference.batch import generate_to_file
+
+
+class ManifestTestCase(unittest.TestCase):
+    """Creates an output file and a cache in a temporary directory"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.cache = DiskCache(self.test_dir / 'cache')
+        self.output = self.test_dir / 'out.ndjson'
+        self.output.write_text('{"name": "a"}\n{"name": "b"}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+class TestBuildManifest(ManifestTestCase):
+    """Test cases for build_manifest function"""
+
+    def test_contents(self):
+        """Test that the manifest records the settings, batch plan and checksum"""
+        manifest = build_manifest("{'name': 'x'}", 250, self.output, 'ndjson', None, 2, seed=7, batch_size=100)
+        self.assertEqual(manifest['seed'], 7)
+        self.assertEqual(manifest['batch_plan'], {'batch_size': 100, 'batches': 3})
+        self.assertEqual(manifest['output']['path'], 'out.ndjson')
+        self.assertEqual(len(manifest['output']['sha256']), 64)
+
+    def test_model_of_configured_backends(self):
+        """Test that the manifest names the backends that generated the run"""
+        with patch('inference.backends.BACKENDS', ['stub']), patch('inference.backends._default_llm', None):
+            manifest = build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, seed=1)
+        self.assertEqual(manifest['model'], 'stub')
+        self.assertNotEqual(manifest['run_key'],
+                            build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, seed=1)['run_key'])
+
+    def test_run_key(self):
+        """Test that the run key follows the settings and ignores formatting of the schema"""
+        key = build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, seed=1)['run_key']
+        self.assertEqual(key, build_manifest('{"name":"x"}', 2, self.output, 'ndjson', None, 2, seed=1)['run_key'])
+        self.assertNotEqual(key, build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, seed=2)['run_key'])
+
+    def test_unseeded_runs_keyed_apart(self):
+        """Test that unseeded runs with the same settings do not share a run key"""
+        first = build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2)
+        second = build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2)
+        self.assertNotEqual(first['run_key'], second['run_key'])
+        self.assertNotIn('run_id', build_manifest("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, seed=1))
+
+
+class TestReplay(ManifestTestCase):
+    """Test cases for replay function"""
+
+    def test_matching_output_left_alone(self):
+        """Test that an output matching its manifest needs no work"""
+        record_run("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, cache=self.cache, seed=1)
+        self.assertFalse(replay(manifest_path(self.output), cache=self.cache))
+
+    def test_restores_from_cache(self):
+        """Test that a missing or changed output is restored byte-for-byte"""
+        original = self.output.read_bytes()
+        record_run("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, cache=self.cache, seed=1)
+        self.output.write_text('changed\n')
+
+        self.assertTrue(replay(manifest_path(self.output), cache=self.cache))
+        self.assertEqual(self.output.read_bytes(), original)
+
+    def test_not_cached(self):
+        """Test that replay fails rather than calling the model"""
+        record_run("{'name': 'x'}", 2, self.output, 'ndjson', None, 2, cache=self.cache, seed=1)
+        self.cache.purge()
+        self.output.unlink()
+
+        with self.assertRaises(RuntimeError):
+            replay(manifest_path(self.output), cache=self.cache)
+        self.assertEqual(sorted(p.name for p in self.test_dir.iterdir()), ['cache', 'out.ndjson.manifest.json'])
+
+    def test_invalid_manifest(self):
+        """Test with a file that is not a manifest"""
+        path = self.test_dir / 'bad.json'
+        path.write_text(json.dumps({'version': 99}))
+        with self.assertRaises(ValueError):
+            load_manifest(path)
+
+
+class TestGenerateToFileManifest(ManifestTestCase):
+    """Test cases for manifests written by generate_to_file"""
+
+    @patch('inference.batch.stream_dataset')
+    def test_manifest_written(self, mock_stream):
+        """Test that a run writes its manifest and passes the seed on"""
+        mock_stream.return_value = iter([{'name': 'a'}, {'name': 'b'}])
+
+        with patch.dict(os.environ, {'DATA_GENERATOR_CACHE_DIR': str(self.test_dir / 'cache')}):
+            generate_to_file({'name': 'full names'}, 2, self.output, seed=3, batch_size=20)
+
+        self.assertEqual(mock_stream.call_args.kwargs['seed'], 3)
+        manifest = load_manifest(manifest_path(self.output))
+        self.assertEqual(manifest['output']['records'], 2)
+        self.assertEqual(manifest['batch_plan']['batch_size'], 20)
+        self.assertEqual([entry['key'] for entry in self.cache.entries()], [manifest['run_key']])
+
+
+if __name__ == '__main__':
+    unittest.main()
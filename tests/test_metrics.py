@@ -0,0 +1,161 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import tempfile
+import shutil
+import urllib.request
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference import metrics
+from inference.metrics import MetricsRegistry, span, recent_spans, snapshot, start_http_server, write_openmetrics
+from inference.engine import generate_records
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry class"""
+
+    def test_counter_labels(self):
+        """Test that counters add up per label combination"""
+        registry = MetricsRegistry()
+        counter = registry.counter('requests', 'Requests', ('outcome',))
+        counter.inc(outcome='success')
+        counter.inc(2, outcome='success')
+        counter.inc(outcome='error')
+
+        self.assertEqual(counter.value(outcome='success'), 3)
+        self.assertEqual(counter.total(), 4)
+        with self.assertRaises(ValueError):
+            counter.inc(other='x')
+
+    def test_same_name_returns_same_metric(self):
+        """Test that registering a name twice returns the existing metric"""
+        registry = MetricsRegistry()
+        self.assertIs(registry.counter('a', 'A'), registry.counter('a', 'A'))
+        with self.assertRaises(ValueError):
+            registry.gauge('a', 'A')
+
+    def test_render_prometheus(self):
+        """Test the Prometheus text format for counters and histograms"""
+        registry = MetricsRegistry()
+        registry.counter('records', 'Records', ('source',)).inc(5, source='model')
+        registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(0.5)
+
+        text = registry.render_prometheus()
+        self.assertIn('# TYPE records_total counter', text)
+        self.assertIn('records_total{source="model"} 5.0', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('latency_seconds_count 1', text)
+        self.assertNotIn('# EOF', text)
+
+    def test_render_openmetrics(self):
+        """Test that OpenMetrics names counter families without the suffix and ends with EOF"""
+        registry = MetricsRegistry()
+        registry.counter('records', 'Records').inc()
+
+        text = registry.render_openmetrics()
+        self.assertIn('# TYPE records counter', text)
+        self.assertIn('records_total 1.0', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+    def test_label_escaping(self):
+        """Test that quotes in label values are escaped"""
+        registry = MetricsRegistry()
+        registry.counter('c', 'C', ('name',)).inc(name='say "hi"')
+        self.assertIn('c_total{name="say \\"hi\\""} 1.0', registry.render_prometheus())
+
+
+class TestSpans(unittest.TestCase):
+    """Test cases for span timing"""
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_span_records_stage_and_parent(self):
+        """Test that spans feed the stage histogram and record their parent"""
+        with span('write'):
+            with span('parse'):
+                pass
+
+        spans = recent_spans()
+        self.assertEqual([s.stage for s in spans], ['parse', 'write'])
+        self.assertEqual(spans[0].parent, 'write')
+        self.assertIsNone(spans[1].parent)
+        self.assertEqual(snapshot()['stages']['parse']['count'], 1)
+
+    def test_span_timed_on_error(self):
+        """Test that a failing stage is still timed"""
+        with self.assertRaises(RuntimeError):
+            with span('model'):
+                raise RuntimeError("failed")
+        self.assertEqual(snapshot()['stages']['model']['count'], 1)
+
+    def test_engine_counts_records_and_retries(self):
+        """Test that generation updates the record and retry counters"""
+        calls = []
+
+        def fake_generate(size, schema):
+            calls.append(size)
+            if len(calls) == 1:
+                return '{"name": "a"}'
+            return '\n'.join('{"name": "b"}' for _ in range(size))
+
+        generate_records(3, "{'name': 'test'}", batch_size=3, max_workers=1, retry_delay=0,
+                         generate_fn=fake_generate)
+
+        stats = snapshot()
+        self.assertEqual(stats['records'], 3)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['stages']['parse']['count'], 2)
+
+
+class TestExport(unittest.TestCase):
+    """Test cases for metrics export"""
+
+    def test_write_openmetrics(self):
+        """Test writing metrics to a file"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = MetricsRegistry()
+        registry.counter('records', 'Records').inc()
+
+        path = write_openmetrics(os.path.join(directory, 'metrics.txt'), registry)
+        self.assertTrue(path.read_text().endswith('# EOF\n'))
+
+    def test_http_server(self):
+        """Test serving metrics over HTTP"""
+        registry = MetricsRegistry()
+        registry.counter('records', 'Records').inc()
+        server = start_http_server(0, registry=registry)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url) as response:
+            self.assertIn('text/plain', response.headers['Content-Type'])
+            self.assertIn('records_total 1.0', response.read().decode('utf-8'))
+
+        request = urllib.request.Request(url, headers={'Accept': 'application/openmetrics-text'})
+        with urllib.request.urlopen(request) as response:
+            self.assertTrue(response.read().decode('utf-8').endswith('# EOF\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
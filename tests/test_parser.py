@@ -0,0 +1,140 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.parser import (
+    schema_fields, validate_record, RecordScanner, iter_records, parse_records
+)
+
+
+class TestSchemaFields(unittest.TestCase):
+    """Test cases for schema_fields and validate_record functions"""
+
+    def test_schema_fields(self):
+        """Test reading field names from a formatted schema"""
+        self.assertEqual(schema_fields("{'name': 'full names', 'age': 'ages'}"), ['name', 'age'])
+
+    def test_invalid_schema(self):
+        """Test with a schema that is not a field dictionary"""
+        with self.assertRaises(ValueError):
+            schema_fields('realistic names')
+
+    def test_validate_record(self):
+        """Test that records keep only schema fields, in schema order"""
+        self.assertEqual(validate_record({'age': 3, 'name': 'a', 'extra': 1}, ['name', 'age']),
+                         {'name': 'a', 'age': 3})
+        self.assertIsNone(validate_record({'name': 'a'}, ['name', 'age']))
+
+
+class TestRecordScanner(unittest.TestCase):
+    """Test cases for RecordScanner class"""
+
+    def test_objects_split_across_chunks(self):
+        """Test that objects split across chunk boundaries are rejoined"""
+        scanner = RecordScanner()
+        self.assertEqual(scanner.feed('{"name": "Jo'), [])
+        self.assertEqual(scanner.feed('hn"}\n{"name"'), [{'name': 'John'}])
+        self.assertEqual(scanner.feed(': "Jane"}\n'), [{'name': 'Jane'}])
+
+    def test_braces_and_escapes_in_strings(self):
+        """Test that braces and escaped quotes inside strings do not end an object"""
+        scanner = RecordScanner()
+        records = scanner.feed('{"note": "a } and \\" {"}')
+        self.assertEqual(records, [{'note': 'a } and " {'}])
+
+    def test_escape_at_chunk_boundary(self):
+        """Test an escape character that ends a chunk"""
+        scanner = RecordScanner()
+        self.assertEqual(scanner.feed('{"note": "say \\'), [])
+        self.assertEqual(scanner.feed('"hi\\""}'), [{'note': 'say "hi"'}])
+
+    def test_nested_objects(self):
+        """Test that nested objects are part of their record"""
+        self.assertEqual(RecordScanner().feed('{"a": {"b": 1}}'), [{'a': {'b': 1}}])
+
+    def test_truncated_final_object(self):
+        """Test that an object still open at the end is counted as truncated"""
+        scanner = RecordScanner()
+        self.assertEqual(scanner.feed('{"a": 1}\n{"a": '), [{'a': 1}])
+        scanner.finish()
+        self.assertEqual(scanner.truncated, 1)
+
+
+    def test_unclosed_object_mid_output(self):
+        """Test that records after an unclosed object on an earlier line are kept"""
+        scanner = RecordScanner()
+        records = scanner.feed('{"a":1}\n{"a":2,\n{"a":3}\n{"a":4}')
+        self.assertEqual(records, [{'a': 1}, {'a': 3}, {'a': 4}])
+        self.assertEqual(scanner.truncated, 1)
+
+        # The same output with the newline ending a chunk
+        scanner = RecordScanner()
+        self.assertEqual(scanner.feed('{"a":1}\n{"a":2,\n'), [{'a': 1}])
+        self.assertEqual(scanner.feed('{"a":3}'), [{'a': 3}])
+        self.assertEqual(scanner.rejected, 1)
+
+    def test_indented_nested_objects(self):
+        """Test that pretty-printed nested objects on their own lines stay in their record"""
+        records = RecordScanner().feed('{\n  "a": [\n    {"b": 1}\n  ]\n}')
+        self.assertEqual(records, [{'a': [{'b': 1}]}])
+
+class TestIterRecords(unittest.TestCase):
+    """Test cases for iter_records function"""
+
+    def test_records_from_chunks(self):
+        """Test parsing records out of streamed chunks"""
+        chunks = ['```json\n{"a": 1}\n{"a"', ': 2}\nnot json\n```']
+        self.assertEqual(list(iter_records(chunks)), [{'a': 1}, {'a': 2}])
+
+    def test_records_yielded_incrementally(self):
+        """Test that a record is yielded before later chunks are read"""
+        def chunks():
+            yield '{"a": 1}\n'
+            raise AssertionError('Read past the first record')
+
+        self.assertEqual(next(iter_records(chunks())), {'a': 1})
+
+
+class TestParseRecords(unittest.TestCase):
+    """Test cases for parse_records function"""
+
+    def test_salvages_valid_records(self):
+        """Test that valid records are kept and the rest are counted"""
+        content = (
+            '```json\n'
+            '{"name": "John", "age": 34}\n'
+            '{"name": "Jane"}\n'
+            '{"name": "Bad", "age": }\n'
+            '{"name": "Ann", "age": 29}\n'
+            '{"name": "Trunc'
+        )
+        result = parse_records(content, ['name', 'age'])
+
+        self.assertEqual(result.records, [{'name': 'John', 'age': 34}, {'name': 'Ann', 'age': 29}])
+        self.assertEqual(result.rejected, 3)
+
+    def test_json_array(self):
+        """Test a pretty-printed JSON array response"""
+        content = '[\n  {\n    "name": "John"\n  },\n  {\n    "name": "Jane"\n  }\n]'
+        self.assertEqual(parse_records(content, ['name']).records, [{'name': 'John'}, {'name': 'Jane'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.prompts import (build_prompt, choose_batch_size, estimate_record_tokens, output_token_limit,
+                               ESTIMATED_TOKENS_PER_RECORD)
+from inference.engine import generate_records, resolve_batch_size
+
+
+class TestBuildPrompt(unittest.TestCase):
+    """Test cases for build_prompt function"""
+
+    def test_compact_schema(self):
+        """Test that the schema is embedded as compact JSON in field order"""
+        prompt = build_prompt(5, "{'name': 'full names',   'age': 'ages'}")
+        self.assertIn('Fields: {"name":"full names","age":"ages"}', prompt)
+        self.assertIn('Generate 5 records', prompt)
+
+    def test_equivalent_schemas_same_prompt(self):
+        """Test that formatting differences do not change the prompt"""
+        self.assertEqual(build_prompt(5, "{'name': 'x'}"), build_prompt(5, '{"name":"x"}'))
+
+    def test_unique_fields(self):
+        """Test that unique fields are named in the prompt"""
+        self.assertIn('different value for: email', build_prompt(5, "{'email': 'x'}", ['email']))
+
+
+class TestEstimateRecordTokens(unittest.TestCase):
+    """Test cases for estimate_record_tokens function"""
+
+    def test_prose_fields_are_larger(self):
+        """Test that fields asking for prose are sized larger than short values"""
+        short = estimate_record_tokens("{'name': 'full names'}")
+        prose = estimate_record_tokens("{'name': 'a paragraph about the product'}")
+        self.assertGreater(prose, short)
+
+    def test_sample_uses_largest_record(self):
+        """Test that a sample is sized by its largest record"""
+        sample = [{'name': 'a'}, {'name': 'a' * 400}]
+        self.assertGreater(estimate_record_tokens("{'name': 'x'}", sample), 100)
+
+    def test_unparseable_schema(self):
+        """Test that an unparseable schema falls back to the default size"""
+        self.assertEqual(estimate_record_tokens('not a schema'), ESTIMATED_TOKENS_PER_RECORD)
+
+
+class TestChooseBatchSize(unittest.TestCase):
+    """Test cases for choose_batch_size function"""
+
+    def test_capped_at_maximum(self):
+        """Test that small records fill batches up to the maximum"""
+        self.assertEqual(choose_batch_size("{'name': 'x'}", 100, model='gemini-2.5-flash'), 100)
+
+    def test_fits_output_limit(self):
+        """Test that wide records get smaller batches on models with a small output window"""
+        schema = str({f'field{i}': 'a sentence of text' for i in range(20)})
+        size = choose_batch_size(schema, 100, model='gemini-2.0-flash')
+        self.assertLess(size, 100)
+        self.assertLessEqual(size * estimate_record_tokens(schema), output_token_limit('gemini-2.0-flash'))
+
+    def test_at_least_one(self):
+        """Test that a record larger than the output window still gets a batch of one"""
+        self.assertEqual(choose_batch_size("{'a': 'x'}", 100, sample=[{'a': 'x' * 100_000}]), 1)
+
+    @patch.dict(os.environ, {'GEMINI_MAX_OUTPUT_TOKENS': '1000'})
+    def test_output_limit_override(self):
+        """Test that the environment overrides the model's output limit"""
+        self.assertEqual(output_token_limit('gemini-2.5-flash'), 1000)
+
+
+class TestResolveBatchSize(unittest.TestCase):
+    """Test cases for batch sizing in the engine"""
+
+    def test_default_is_fitted(self):
+        """Test that runs without a batch size use the fitted size"""
+        sizes = []
+
+        def fake_generate(size, schema):
+            sizes.append(size)
+            return '\n'.join('{"name": "a"}' for _ in range(size))
+
+        generate_records(250, "{'name': 'x'}", max_workers=1, generate_fn=fake_generate)
+        self.assertEqual(sizes, [100, 100, 50])
+
+    def test_explicit_size_kept(self):
+        """Test that an explicit batch size is used even if it may not fit"""
+        schema = str({f'field{i}': 'a paragraph' for i in range(50)})
+        with patch.dict(os.environ, {'GEMINI_MAX_OUTPUT_TOKENS': '8192'}):
+            with self.assertLogs('inference.engine', level='WARNING'):
+                self.assertEqual(resolve_batch_size(100, schema), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.relational import load_tables, plan_order, plan_tables, generate_tables
+
+
+SCHEMA = {'tables': {
+    'line_items': {'parent': 'orders', 'per_parent': [1, 4], 'references': {'sku': 'products'},
+                   'fields': {'quantity': 'quantities between 1 and 5'}},
+    'orders': {'key': 'order_id', 'parent': 'customers', 'per_parent': [0, 5],
+               'fields': {'total': 'order totals in dollars'}},
+    'customers': {'rows': 20, 'key': 'customer_id', 'key_format': 'C{:05d}',
+                  'fields': {'name': 'full names', 'email': {'description': 'emails', 'unique': True}}},
+    'products': {'rows': 8, 'key': 'sku', 'key_format': 'SKU-{}', 'fields': {'title': 'product names'}},
+}}
+
+
+def fake_records(formatted_schema, num_records, *args, **kwargs):
+    """Stands in for model generation with one numbered value per record"""
+    return iter({'value': i} for i in range(num_records))
+
+
+def read_ndjson(path:Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestLoadTables(unittest.TestCase):
+    """Test cases for load_tables and plan_order functions"""
+
+    def test_parents_ordered_first(self):
+        """Test that every table is planned after the tables it refers to"""
+        order = plan_order(load_tables(SCHEMA))
+        self.assertLess(order.index('customers'), order.index('orders'))
+        self.assertLess(order.index('orders'), order.index('line_items'))
+        self.assertLess(order.index('products'), order.index('line_items'))
+
+    def test_cycle(self):
+        """Test that tables referring to each other are rejected"""
+        schema = {'tables': {'a': {'key': 'a_id', 'parent': 'b'}, 'b': {'key': 'b_id', 'parent': 'a'}}}
+        with self.assertRaises(ValueError) as context:
+            plan_order(load_tables(schema))
+        self.assertIn('cycle', str(context.exception))
+
+    def test_unknown_table(self):
+        """Test with a reference to a table that does not exist"""
+        schema = {'tables': {'orders': {'rows': 5, 'references': {'customer_id': 'customers'}}}}
+        with self.assertRaises(ValueError) as context:
+            load_tables(schema)
+        self.assertIn('unknown table customers', str(context.exception))
+
+    def test_referenced_table_needs_key(self):
+        """Test that a parent table must have a key field"""
+        schema = {'tables': {'customers': {'rows': 5}, 'orders': {'parent': 'customers'}}}
+        with self.assertRaises(ValueError):
+            load_tables(schema)
+
+    def test_key_clash(self):
+        """Test that a generated field cannot reuse a key field name"""
+        schema = {'tables': {'customers': {'rows': 5, 'key': 'id', 'fields': {'id': 'ids'}}}}
+        with self.assertRaises(ValueError):
+            load_tables(schema)
+
+    def test_invalid_cardinality(self):
+        """Test with a per_parent range whose minimum is above its maximum"""
+        schema = {'tables': {'customers': {'rows': 5, 'key': 'id'},
+                             'orders': {'parent': 'customers', 'per_parent': [3, 1]}}}
+        with self.assertRaises(ValueError):
+            load_tables(schema)
+
+
+class TestPlanTables(unittest.TestCase):
+    """Test cases for plan_tables function"""
+
+    def test_child_counts_within_range(self):
+        """Test that every parent gets a child count inside its range"""
+        tables = load_tables(SCHEMA)
+        _, index = plan_tables(tables, seed=3)
+
+        per_customer = Counter(index.parent_row('orders', row) for row in range(index.rows('orders')))
+        self.assertTrue(all(0 <= count <= 5 for count in per_customer.values()))
+        self.assertTrue(all(0 <= row < 20 for row in per_customer))
+
+    def test_seeded_plan_repeats(self):
+        """Test that the same seed plans the same row counts"""
+        tables = load_tables(SCHEMA)
+        counts = [plan_tables(tables, seed=7)[1].rows('line_items') for _ in range(2)]
+        self.assertEqual(counts[0], counts[1])
+
+    def test_row_limit(self):
+        """Test that a plan larger than the record budget is rejected"""
+        with self.assertRaises(ValueError):
+            plan_tables(load_tables(SCHEMA), seed=1, max_records=10)
+
+
+@patch('inference.relational.iter_generated_records', side_effect=fake_records)
+class TestGenerateTables(unittest.TestCase):
+    """Test cases for generate_tables function"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_foreign_keys_valid(self, mock_records):
+        """Test that every foreign key refers to an existing row"""
+        counts = generate_tables(SCHEMA, self.test_dir, seed=1)
+
+        customers = read_ndjson(self.test_dir / 'customers.ndjson')
+        orders = read_ndjson(self.test_dir / 'orders.ndjson')
+        line_items = read_ndjson(self.test_dir / 'line_items.ndjson')
+        products = read_ndjson(self.test_dir / 'products.ndjson')
+
+        self.assertEqual(counts['orders'], len(orders))
+        self.assertEqual(customers[0]['customer_id'], 'C00001')
+        self.assertTrue({o['customer_id'] for o in orders} <= {c['customer_id'] for c in customers})
+        self.assertTrue({i['order_id'] for i in line_items} <= {o['order_id'] for o in orders})
+        self.assertTrue({i['sku'] for i in line_items} <= {p['sku'] for p in products})
+        self.assertEqual(list(orders[0]), ['order_id', 'customer_id', 'value'])
+
+    def test_unique_fields_passed(self, mock_records):
+        """Test that unique fields of a table are enforced during generation"""
+        generate_tables(SCHEMA, self.test_dir, seed=1)
+        unique = {call.args[0]: call.args[-1] for call in mock_records.call_args_list}
+        self.assertIn(['email'], unique.values())
+
+    def test_missing_output_dir(self, mock_records):
+        """Test with an output directory that does not exist"""
+        with self.assertRaises(ValueError):
+            generate_tables(SCHEMA, self.test_dir / 'missing')
+
+    def test_schema_file(self, mock_records):
+        """Test reading the relational schema from a JSON file"""
+        path = self.test_dir / 'schema.json'
+        path.write_text(json.dumps(SCHEMA))
+        counts = generate_tables(path, self.test_dir, seed=1)
+        self.assertEqual(counts['customers'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.result_cache import make_cache_key, map_fields, remap_records, ResultCache
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMakeCacheKey(unittest.TestCase):
+    """Test cases for make_cache_key function"""
+
+    def test_whitespace_normalized(self):
+        """Test that surrounding whitespace does not change the key"""
+        self.assertEqual(make_cache_key("{'name': 'test'}", 10),
+                         make_cache_key("  {'name': 'test'}\n", 10))
+
+    def test_settings_change_key(self):
+        """Test that record count, model, temperature, mode and unique fields are part of the key"""
+        base = make_cache_key("{'name': 'test'}", 10)
+        self.assertNotEqual(base, make_cache_key("{'name': 'test'}", 11))
+        self.assertNotEqual(base, make_cache_key("{'name': 'test'}", 10, model='other-model'))
+        self.assertNotEqual(base, make_cache_key("{'name': 'test'}", 10, temperature=0.1))
+        self.assertNotEqual(base, make_cache_key("{'name': 'test'}", 10, mode='compiled'))
+        self.assertNotEqual(base, make_cache_key("{'name': 'test'}", 10, unique_fields=['name']))
+
+    def test_near_duplicates_share_key(self):
+        """Test that field order, whitespace and casing do not change the key"""
+        self.assertEqual(make_cache_key("{'name': 'Realistic  names', 'age': 'ages'}", 10, unique_fields=['Name']),
+                         make_cache_key("{'age': 'ages', 'Name ': 'realistic names'}", 10, unique_fields=['name']))
+        self.assertNotEqual(make_cache_key("{'name': 'realistic names'}", 10),
+                            make_cache_key("{'name': 'realistic full names'}", 10))
+
+    def test_names_differing_by_case_kept(self):
+        """Test that a schema using the same name in two casings is not folded"""
+        self.assertNotEqual(make_cache_key("{'Name': 'names', 'name': 'nicknames'}", 10),
+                            make_cache_key("{'name': 'names', 'Name': 'nicknames'}", 10))
+
+    def test_empty_schema(self):
+        """Test with empty schema"""
+        with self.assertRaises(ValueError):
+            make_cache_key("  ", 10)
+
+
+class TestRemapRecords(unittest.TestCase):
+    """Test cases for remap_records and map_fields functions"""
+
+    def test_renamed_and_reordered(self):
+        """Test that records take the caller's field names and order"""
+        records = [{'name': 'Ada', 'Age': 36}]
+        self.assertEqual(remap_records(records, ['age', 'Name']), [{'age': 36, 'Name': 'Ada'}])
+
+    def test_matching_records_unchanged(self):
+        """Test that records already in the caller's form are returned as is"""
+        records = [{'name': 'Ada'}]
+        self.assertIs(remap_records(records, ['name']), records)
+
+    def test_map_fields(self):
+        """Test that each field is matched to the source field it was generated as"""
+        self.assertIsNone(map_fields(['name', 'age'], ['name', 'age']))
+        self.assertEqual(map_fields(['name', 'Age'], ['age', 'Name']), {'Age': 'age', 'name': 'Name'})
+
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for ResultCache class"""
+
+    def test_get_and_put(self):
+        """Test storing and retrieving a result"""
+        cache = ResultCache()
+        key = make_cache_key("{'name': 'test'}", 10)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, '{"name": "John Doe"}')
+        self.assertEqual(cache.get(key), '{"name": "John Doe"}')
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResultCache(max_entries=2)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        cache.get('a')
+        cache.put('c', '3')
+
+        self.assertEqual(cache.get('a'), '1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), '3')
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        clock = FakeClock()
+        cache = ResultCache(ttl_seconds=10, clock=clock)
+        cache.put('a', '1')
+
+        clock.now = 5
+        self.assertEqual(cache.get('a'), '1')
+        clock.now = 11
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_capacity(self):
+        """Test with a capacity below one entry"""
+        with self.assertRaises(ValueError):
+            ResultCache(max_entries=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import threading
+import time
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.scheduler import (PRIORITY_BULK, PRIORITY_INTERACTIVE, RequestScheduler, TokenBucket,
+                                 is_rate_limit_error)
+
+
+class FakeClock:
+    """Manually advanced clock for refill tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    """Error carrying an HTTP status code"""
+
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+class TestIsRateLimitError(unittest.TestCase):
+    """Test cases for is_rate_limit_error function"""
+
+    def test_status_codes(self):
+        """Test that 429 and 503 codes are throttling errors"""
+        self.assertTrue(is_rate_limit_error(StatusError(429)))
+        self.assertTrue(is_rate_limit_error(StatusError(503)))
+        self.assertFalse(is_rate_limit_error(StatusError(400)))
+
+    def test_messages(self):
+        """Test detection from the error message"""
+        self.assertTrue(is_rate_limit_error(Exception("429 Resource has been exhausted (e.g. check quota).")))
+        self.assertFalse(is_rate_limit_error(Exception("API Error")))
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for TokenBucket class"""
+
+    def test_refill(self):
+        """Test that an empty bucket refills at the per-minute rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.wait_time(1), 1.0)
+
+        clock.now = 1.0
+        self.assertEqual(bucket.wait_time(1), 0.0)
+
+    def test_oversized_request(self):
+        """Test that a request above the capacity waits for a full bucket only"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+        self.assertEqual(bucket.wait_time(1000), 0.0)
+
+    def test_invalid_rate(self):
+        """Test with a rate of zero"""
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class TestRequestScheduler(unittest.TestCase):
+    """Test cases for RequestScheduler class"""
+
+    def test_run_returns_result(self):
+        """Test a request that succeeds first time"""
+        scheduler = RequestScheduler(requests_per_minute=600)
+        self.assertEqual(scheduler.run(lambda: 'ok'), 'ok')
+        self.assertEqual(scheduler.queue_depth, 0)
+
+    def test_retries_throttled_requests(self):
+        """Test that 429 errors are retried with backoff and lower the rate"""
+        delays = []
+        scheduler = RequestScheduler(requests_per_minute=600, sleep=delays.append)
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) < 3:
+                raise StatusError(429)
+            return 'ok'
+
+        self.assertEqual(scheduler.run(call), 'ok')
+        self.assertEqual(len(delays), 2)
+        self.assertEqual(scheduler.throttled, 2)
+        self.assertLess(scheduler.requests_per_minute, 600)
+
+    def test_other_errors_not_retried(self):
+        """Test that errors other than throttling are raised immediately"""
+        scheduler = RequestScheduler(requests_per_minute=600, sleep=lambda delay: None)
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise Exception("API Error")
+
+        with self.assertRaises(Exception):
+            scheduler.run(call)
+        self.assertEqual(len(calls), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that throttling is raised once attempts run out"""
+        scheduler = RequestScheduler(requests_per_minute=600, max_attempts=3, sleep=lambda delay: None)
+
+        def call():
+            raise StatusError(503)
+
+        with self.assertRaises(StatusError):
+            scheduler.run(call)
+        self.assertEqual(scheduler.throttled, 3)
+
+    def test_rate_recovers(self):
+        """Test that the rate climbs back to the quota after successes"""
+        scheduler = RequestScheduler(requests_per_minute=600)
+        scheduler.on_throttled()
+        self.assertEqual(scheduler.requests_per_minute, 300)
+
+        for _ in range(20):
+            scheduler.on_success()
+        self.assertEqual(scheduler.requests_per_minute, 600)
+
+    def test_backoff_grows(self):
+        """Test that the backoff ceiling doubles per attempt and is capped"""
+        scheduler = RequestScheduler(base_delay=1.0, max_delay=4.0)
+        for _ in range(50):
+            self.assertLessEqual(scheduler.backoff_delay(1), 2.0)
+            self.assertLessEqual(scheduler.backoff_delay(10), 4.0)
+
+    def test_interactive_served_first(self):
+        """Test that waiting interactive requests are admitted ahead of bulk ones"""
+        # One request per 100ms with no burst
+        scheduler = RequestScheduler(requests_per_minute=600, burst=1)
+        scheduler.acquire()
+        order = []
+
+        def worker(name, priority):
+            scheduler.acquire(priority)
+            order.append(name)
+
+        threads = [threading.Thread(target=worker, args=(f'bulk{i}', PRIORITY_BULK)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        while scheduler.queue_depth < 2:
+            time.sleep(0.001)
+
+        interactive = threading.Thread(target=worker, args=('interactive', PRIORITY_INTERACTIVE))
+        interactive.start()
+        threads.append(interactive)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order[0], 'interactive')
+        self.assertEqual(scheduler.stats()['queue_depth'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
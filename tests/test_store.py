@@ -0,0 +1,97 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import json
+import threading
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.store import RecordStore
+
+RECORDS = [
+    {'name': 'Ada', 'tier': 'gold', 'age': 36, 'active': True, 'score': 1.0, 'tags': ['a', 'b']},
+    {'name': 'Grace', 'tier': 'silver', 'age': 1, 'active': False, 'score': None, 'tags': []},
+    {'name': 'Zoë', 'tier': 'gold', 'age': 36, 'active': True, 'score': 1, 'tags': ['a', 'b']},
+]
+
+
+class TestRecordStore(unittest.TestCase):
+    """Test cases for RecordStore class"""
+
+    def test_round_trip(self):
+        """Test that records read back with the same values and types"""
+        for compact in (False, True):
+            store = RecordStore()
+            store.extend(RECORDS)
+            if compact:
+                store.compact()
+
+            self.assertEqual(store.fields, list(RECORDS[0]))
+            self.assertEqual(len(store), 3)
+            self.assertEqual(store.rows(), RECORDS)
+            self.assertEqual(store.rows(1, 2), RECORDS[1:2])
+            # 1, 1.0 and True are kept apart
+            self.assertEqual([type(r['score']) for r in store.rows()], [float, type(None), int])
+
+    def test_ndjson_matches_json_dumps(self):
+        """Test that downloads are the text json.dumps would write"""
+        store = RecordStore.from_records(RECORDS * 5)
+        expected = '\n'.join(json.dumps(record) for record in RECORDS * 5)
+        self.assertEqual(''.join(store.iter_chunks(chunk_rows=4)), expected)
+        self.assertEqual(list(store.iter_lines(1, 2)), [json.dumps(RECORDS[1])])
+
+    def test_dictionary_encoding(self):
+        """Test that repeated values are stored once"""
+        store = RecordStore.from_records([{'tier': 'gold' if i % 2 else 'silver'} for i in range(10000)])
+        self.assertLess(store.nbytes, 10000 * 5)
+
+    def test_missing_fields_and_growth(self):
+        """Test that columns grow past their first allocation and missing fields read as null"""
+        store = RecordStore(['id', 'note'])
+        for i in range(3000):
+            store.append({'id': i})
+        self.assertEqual(store.rows(2999), [{'id': 2999, 'note': None}])
+
+    def test_renamed_shares_columns(self):
+        """Test that a renamed store reorders fields without copying values"""
+        store = RecordStore.from_records(RECORDS)
+        renamed = store.renamed({'tier': 'Tier', 'name': 'Name'})
+
+        self.assertEqual(renamed.rows(0, 1), [{'Tier': 'gold', 'Name': 'Ada'}])
+        self.assertIs(renamed._columns[1], store._columns[0])
+
+    def test_compacted_is_read_only(self):
+        """Test that records cannot be added once the store is compacted"""
+        store = RecordStore.from_records(RECORDS)
+        with self.assertRaises(ValueError):
+            store.append(RECORDS[0])
+
+    def test_concurrent_reads(self):
+        """Test that pages read while records are appended are complete records"""
+        store = RecordStore()
+        writer = threading.Thread(target=lambda: [store.append({'id': i, 'half': i // 2}) for i in range(5000)])
+        writer.start()
+        while writer.is_alive():
+            for record in store.rows(max(0, len(store) - 50)):
+                self.assertEqual(record['half'], record['id'] // 2)
+        writer.join()
+        self.assertEqual(len(store), 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,8 @@
 import unittest
 import sys
 import os
+import json
+import gzip
 import tempfile
 import shutil
 from pathlib import Path
@@ -23,7 +25,17 @@ from unittest.mock import patch
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from utils import get_default_download_folder, write_string_to_file, write_string_to_downloads
+from utils import (
+    get_default_download_folder, write_string_to_file, write_string_to_downloads, write_records,
+    register_writer, infer_compression, RECORD_WRITERS
+)
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 
 class TestGetDefaultDownloadFolder(unittest.TestCase):
@@ -92,6 +104,15 @@ class TestWriteStringToFile(unittest.TestCase):
             written_content = f.read()
         self.assertEqual(written_content, content)
 
+    def test_write_chunks(self):
+        """Test that an iterable of strings is written in order"""
+        file_path = write_string_to_file(self.test_dir, iter(['{"id": 0}\n', '{"id": 1}']))
+        with open(file_path, 'r') as f:
+            self.assertEqual(f.read(), '{"id": 0}\n{"id": 1}')
+
+        with self.assertRaises(ValueError):
+            write_string_to_file(self.test_dir, iter([]))
+
     def test_empty_content(self):
         """Test with empty content"""
         with self.assertRaises(ValueError) as context:
@@ -134,5 +155,138 @@ class TestWriteStringToDownloads(unittest.TestCase):
         self.assertEqual(result, str(mock_folder / 'sample_123.json'))
 
 
+class TestWriteRecords(unittest.TestCase):
+    """Test cases for write_records function"""
+
+    def setUp(self):
+        """Create a temporary directory for tests"""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.records = [{'name': 'John Doe', 'age': 34}, {'name': 'Jane Roe', 'age': 29}]
+
+    def tearDown(self):
+        """Remove the temporary directory after tests"""
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_ndjson(self):
+        """Test writing one JSON object per line"""
+        path = self.test_dir / 'out.ndjson'
+        self.assertEqual(write_records(iter(self.records), path), 2)
+        self.assertEqual([json.loads(line) for line in path.read_text().splitlines()], self.records)
+
+    def test_json(self):
+        """Test writing a JSON array"""
+        path = self.test_dir / 'out.json'
+        write_records(iter(self.records), path, 'json')
+        self.assertEqual(json.loads(path.read_text()), self.records)
+
+    def test_csv(self):
+        """Test writing a header and one row per record"""
+        path = self.test_dir / 'out.csv'
+        write_records(iter(self.records), path, 'csv')
+        self.assertEqual(path.read_text().splitlines(), ['name,age', 'John Doe,34', 'Jane Roe,29'])
+
+    def test_gzip_compression(self):
+        """Test writing gzip-compressed NDJSON"""
+        path = self.test_dir / 'out.ndjson.gz'
+        write_records(iter(self.records), path, compression='gzip')
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual([json.loads(line) for line in f], self.records)
+
+    def test_gzip_output_reproducible(self):
+        """Test that the same records compress to identical bytes"""
+        first, second = self.test_dir / 'a.ndjson.gz', self.test_dir / 'b.ndjson.gz'
+        write_records(iter(self.records), first, compression='gzip')
+        write_records(iter(self.records), second, compression='gzip')
+        self.assertEqual(first.read_bytes(), second.read_bytes())
+
+    def test_zstd_compression(self):
+        """Test writing zstd-compressed CSV"""
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest('zstandard is not installed')
+
+        path = self.test_dir / 'out.csv.zst'
+        write_records(iter(self.records), path, 'csv', compression='zstd')
+        with zstandard.open(path, 'rt') as f:
+            self.assertEqual(f.read().splitlines()[0], 'name,age')
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_parquet_row_groups(self):
+        """Test that Parquet output has one row group per chunk"""
+        path = self.test_dir / 'out.parquet'
+        records = [{'id': i, 'name': f'user {i}'} for i in range(25)]
+
+        self.assertEqual(write_records(iter(records), path, 'parquet', chunk_size=10), 25)
+
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().to_pylist(), records)
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_arrow_ipc(self):
+        """Test writing a zstd-compressed Arrow IPC file"""
+        path = self.test_dir / 'out.arrow'
+        write_records(iter(self.records), path, 'arrow', compression='zstd', chunk_size=1)
+
+        with pyarrow.ipc.open_file(path) as reader:
+            self.assertEqual(reader.num_record_batches, 2)
+            self.assertEqual(reader.read_all().to_pylist(), self.records)
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_columnar_types_promoted(self):
+        """Test that columns changing type between chunks are widened for every row"""
+        records = [{'a': None, 'n': 1, 'v': 2}] * 3 + [{'a': 'x', 'n': 1.5, 'v': 'unknown', 'extra': True}]
+
+        for fmt in ('parquet', 'arrow'):
+            path = self.test_dir / f'out.{fmt}'
+            self.assertEqual(write_records(iter(records), path, fmt, chunk_size=2), 4)
+
+            if fmt == 'parquet':
+                table = pyarrow.parquet.read_table(path)
+            else:
+                with pyarrow.ipc.open_file(path) as reader:
+                    table = reader.read_all()
+            self.assertEqual(table.schema.field('a').type, pyarrow.string())
+            self.assertEqual(table.column('n').to_pylist(), [1.0, 1.0, 1.0, 1.5])
+            self.assertEqual(table.column('v').to_pylist(), ['2', '2', '2', 'unknown'])
+            self.assertEqual(table.column('extra').to_pylist(), [None, None, None, True])
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_columnar_mixed_chunk(self):
+        """Test that values with no common type within a chunk are written as text"""
+        path = self.test_dir / 'out.parquet'
+        write_records(iter([{'age': 34}, {'age': 'unknown'}, {'age': {'years': 2}}]), path, 'parquet')
+        self.assertEqual(pyarrow.parquet.read_table(path).column('age').to_pylist(),
+                         ['34', 'unknown', '{"years": 2}'])
+
+    def test_register_writer(self):
+        """Test adding a custom output format"""
+        def write_count(records, file_path, compression, chunk_size):
+            count = sum(1 for _ in records)
+            file_path.write_text(str(count))
+            return count
+
+        register_writer('count', write_count)
+        self.addCleanup(RECORD_WRITERS.pop, 'count')
+
+        path = self.test_dir / 'out.txt'
+        self.assertEqual(write_records(iter(self.records), path, 'count'), 2)
+        self.assertEqual(path.read_text(), '2')
+
+    def test_infer_compression(self):
+        """Test compression inferred from the file extension"""
+        self.assertEqual(infer_compression('out.ndjson.gz'), 'gzip')
+        self.assertEqual(infer_compression('out.csv.zst'), 'zstd')
+        self.assertIsNone(infer_compression('out.parquet'))
+
+    def test_unsupported_format(self):
+        """Test with an unknown output format"""
+        with self.assertRaises(ValueError) as context:
+            write_records(iter(self.records), self.test_dir / 'out.xml', 'xml')
+        self.assertIn('Unsupported output format', str(context.exception))
+
+
 if __name__ == '__main__':
     unittest.main()
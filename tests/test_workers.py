@@ -0,0 +1,224 @@
+# Copyright 2025 Kyle Walkley
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os
+import time
+import threading
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from inference.workers import WorkerPool
+
+
+def wait_for(pool:WorkerPool, task_id:str, statuses=('completed', 'failed', 'cancelled'), timeout:float = 5.0) -> dict:
+    """Polls a task until it reaches one of the given statuses"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = pool.poll(task_id)
+        if state['status'] in statuses:
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"Task {task_id} did not finish")
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test cases for WorkerPool class"""
+
+    def setUp(self):
+        self.pool = WorkerPool(max_workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_runs_in_background(self):
+        """Test that submit returns at once and the records arrive in order"""
+        release = threading.Event()
+
+        def make_records():
+            release.wait(5)
+            return iter({'id': i} for i in range(5))
+
+        task_id = self.pool.submit(make_records, 5)
+        self.assertIn(self.pool.poll(task_id)['status'], ('queued', 'running'))
+
+        release.set()
+        state = wait_for(self.pool, task_id)
+        self.assertEqual(state['status'], 'completed')
+        self.assertEqual(state['records'], [{'id': i} for i in range(5)])
+
+    def test_partial_results(self):
+        """Test that a poll sees the records produced so far and only the new ones after an offset"""
+        step = threading.Semaphore(0)
+
+        def make_records():
+            for i in range(4):
+                step.acquire()
+                yield {'id': i}
+
+        task_id = self.pool.submit(make_records, 4)
+        step.release()
+        step.release()
+        deadline = time.monotonic() + 5
+        while self.pool.poll(task_id)['completed'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        state = self.pool.poll(task_id)
+        self.assertEqual(state['status'], 'running')
+        self.assertEqual(state['completed'], 2)
+
+        step.release()
+        step.release()
+        wait_for(self.pool, task_id)
+        self.assertEqual(self.pool.poll(task_id, offset=2)['records'], [{'id': 2}, {'id': 3}])
+
+    def test_cancel_closes_records(self):
+        """Test that cancelling stops the task and closes its record iterator"""
+        closed = threading.Event()
+        started = threading.Event()
+
+        def make_records():
+            try:
+                for i in range(1000):
+                    started.set()
+                    time.sleep(0.01)
+                    yield {'id': i}
+            finally:
+                closed.set()
+
+        task_id = self.pool.submit(make_records, 1000)
+        started.wait(5)
+        self.pool.cancel(task_id)
+
+        state = wait_for(self.pool, task_id)
+        self.assertEqual(state['status'], 'cancelled')
+        self.assertLess(state['completed'], 1000)
+        self.assertTrue(closed.is_set())
+
+    def test_failure_reported(self):
+        """Test that an error in a task is kept for the session to show"""
+        def make_records():
+            yield {'id': 0}
+            raise RuntimeError('Batch 1 failed after 3 attempts')
+
+        state = wait_for(self.pool, self.pool.submit(make_records, 2))
+        self.assertEqual(state['status'], 'failed')
+        self.assertIn('Batch 1 failed', state['error'])
+        self.assertEqual(state['completed'], 1)
+
+    def test_call_reports_progress(self):
+        """Test that work without records is polled by the progress it reports"""
+        reported = threading.Event()
+        proceed = threading.Event()
+
+        def call(progress_callback):
+            progress_callback(40, 100)
+            reported.set()
+            proceed.wait(5)
+            progress_callback(100, 100)
+
+        task_id = self.pool.submit_call(call, 100)
+        reported.wait(5)
+        self.assertEqual(self.pool.poll(task_id)['completed'], 40)
+        proceed.set()
+
+        state = wait_for(self.pool, task_id)
+        self.assertEqual(state['status'], 'completed')
+        self.assertEqual(state['completed'], 100)
+        self.assertEqual(state['records'], [])
+
+    def test_call_failure_reported(self):
+        """Test that an error raised by submitted work fails its task"""
+        def call(progress_callback):
+            raise RuntimeError('Job abc is already running')
+
+        state = wait_for(self.pool, self.pool.submit_call(call, 10))
+        self.assertEqual(state['status'], 'failed')
+        self.assertIn('already running', state['error'])
+
+    def test_release_and_unknown_task(self):
+        """Test that a released task is forgotten"""
+        task_id = self.pool.submit(lambda: iter([{'id': 0}]), 1)
+        wait_for(self.pool, task_id)
+        self.pool.release(task_id)
+
+        with self.assertRaises(ValueError):
+            self.pool.poll(task_id)
+
+    def test_finished_tasks_pruned(self):
+        """Test that finished tasks nobody collects are dropped after their TTL"""
+        now = [0.0]
+        pool = WorkerPool(max_workers=1, finished_ttl=10, clock=lambda: now[0])
+        try:
+            task_id = pool.submit(lambda: iter([]), 0)
+            wait_for(pool, task_id)
+
+            now[0] = 11.0
+            pool.submit(lambda: iter([]), 0)
+            with self.assertRaises(ValueError):
+                pool.poll(task_id)
+        finally:
+            pool.shutdown()
+
+    def test_same_key_shares_task(self):
+        """Test that a submit with the key of a running task joins it"""
+        release = threading.Event()
+        calls = []
+
+        def make_records():
+            calls.append(1)
+            release.wait(5)
+            return iter([{'id': 0}])
+
+        first = self.pool.submit(make_records, 1, key='schema')
+        second = self.pool.submit(make_records, 1, key='schema')
+        other = self.pool.submit(lambda: iter([]), 0, key='other')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+        release.set()
+        self.assertEqual(wait_for(self.pool, first)['records'], [{'id': 0}])
+        self.assertEqual(len(calls), 1)
+
+        # Only dropped once every caller has released it
+        self.pool.release(first)
+        self.assertEqual(self.pool.poll(first)['status'], 'completed')
+        self.pool.release(first)
+        with self.assertRaises(ValueError):
+            self.pool.poll(first)
+        self.assertNotEqual(self.pool.submit(lambda: iter([]), 0, key='schema'), first)
+
+    def test_cancel_shared_task(self):
+        """Test that cancelling a shared task only releases the caller's share"""
+        release = threading.Event()
+        task_id = self.pool.submit(lambda: iter([release.wait(5) and {'id': 0}]), 1, key='schema')
+        self.pool.submit(lambda: iter([]), 1, key='schema')
+
+        self.assertFalse(self.pool.cancel(task_id))
+        release.set()
+        self.assertEqual(wait_for(self.pool, task_id)['status'], 'completed')
+
+        self.assertTrue(self.pool.cancel(task_id))
+        self.assertNotEqual(self.pool.submit(lambda: iter([]), 1, key='schema'), task_id)
+
+    def test_invalid_size(self):
+        """Test that a pool needs at least one worker"""
+        with self.assertRaises(ValueError):
+            WorkerPool(max_workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()